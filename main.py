@@ -1,39 +1,47 @@
-from apscheduler.schedulers.background import BackgroundScheduler
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.services.db import init_db
-from src.routers import ingestion, status
-from src.services.process import process_vessel_data, process_passes
-from src.services.ingestion import ingest_AIS_data, fetch_tles
-import pandas as pd
+from src.services.db import init_db, get_async_engine
+from src.config.settings import get_settings
+from src.logger import configure_logging
+from src.services.prediction import shutdown_executor
+from src.routers import ingestion, status, vessels, passes, tiles, metrics
 import uvicorn
-from datetime import datetime, timedelta
-#from alive_progress import alive_bar
-import time
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     '''
     Context manager to handle the lifespan of the FastAPI app
 
+    The jobs run in worker.py, unless RUN_SCHEDULER_IN_API is set
+
     Args:
         app (FastAPI): FastAPI app instance
     '''
     init_db()
 
-    # Background scheduler
-    scheduler = BackgroundScheduler()
-    # Schedule the job
-    scheduler.add_job(ingest_AIS_data, "interval", minutes=30, next_run_time=datetime.now()) # This looks fine 
-    scheduler.add_job(process_vessel_data, "interval", minutes=30, next_run_time=datetime.now() + timedelta(minutes=2)) # This looks fine
-    scheduler.add_job(process_passes, "interval", minutes=30, next_run_time=datetime.now() + timedelta(minutes=4)) # TODO The code for this from the eofusion repo looks odd with typos and missing code
-    scheduler.add_job(fetch_tles, "interval", days=1, next_run_time=datetime.now()) # This one looks fine 
+    scheduler = None
+    if settings.RUN_SCHEDULER_IN_API:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from worker import create_scheduler
 
-    # Start the scheduler
-    scheduler.start()
+        # Background scheduler
+        scheduler = create_scheduler(BackgroundScheduler)
+        scheduler.start()
 
     yield
-    scheduler.shutdown()
+    if scheduler is not None:
+        scheduler.shutdown()
+    shutdown_executor()
+    await get_async_engine().dispose()
+
+settings = get_settings()
+configure_logging(
+    level=settings.LOG_LEVEL,
+    json_format=settings.LOG_JSON,
+    use_queue=settings.LOG_QUEUE,
+    sample_rate=settings.LOG_CALL_SAMPLE_RATE,
+    max_arg_length=settings.LOG_MAX_ARG_LENGTH
+)
 
 # FastAPI app instance
 app = FastAPI(title="Processing API", lifespan=lifespan)
@@ -41,6 +49,10 @@ app = FastAPI(title="Processing API", lifespan=lifespan)
 # Include routers
 app.include_router(ingestion.router, prefix="/ingest", tags=["Ingestion"])
 app.include_router(status.router, prefix="/status", tags=["Status"])
+app.include_router(vessels.router, prefix="/vessels", tags=["Vessels"])
+app.include_router(passes.router, prefix="/passes", tags=["Passes"])
+app.include_router(tiles.router, prefix="/tiles", tags=["Tiles"])
+app.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
 
 
 @app.get("/")
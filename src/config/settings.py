@@ -4,7 +4,7 @@ from functools import lru_cache
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 
-from typing import Literal
+from typing import Literal, Optional
 
 class Settings(BaseSettings):
     """
@@ -12,9 +12,25 @@ class Settings(BaseSettings):
     Utilizes the BaseSettings from pydantic for environment variables.
     """
     # Environment
-    ENVIRONMENT: Literal["local", "dev", "prod"] = "local"
+    ENVIRONMENT: Literal["local", "dev", "prod", "harness"] = "local"
     DATABASE_URL: str = "sqlite:///./Data.db"
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POSTGIS: bool = True # Add geometry columns and GiST indexes when the database is PostgreSQL
+    SQLITE_BUSY_TIMEOUT_MS: int = 30000
+    SQLITE_MMAP_SIZE: int = 268435456
     DEBUG: bool = False
+
+
+    # Logging Settings
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = False
+    LOG_QUEUE: bool = False
+    LOG_CALL_SAMPLE_RATE: float = 1.0
+    LOG_MAX_ARG_LENGTH: int = 200
     
     
     # Copernicus Settings
@@ -30,13 +46,113 @@ class Settings(BaseSettings):
     AISHUB_URL: str 
     
     
+    # AIS Stream Settings
+    AIS_STREAM_URL: Optional[str] = None # tcp://host:port or udp://host:port, replaces the AISHub polling when set
+    AIS_STREAM_BATCH_SIZE: int = 500 # Buffered vessels triggering a flush
+    AIS_STREAM_FLUSH_SECONDS: float = 10.0
+    AIS_STREAM_STATIC_CACHE_SIZE: int = 100000 # Vessels whose IMO, name and dimensions are kept
+    AIS_STREAM_PROCESS_ON_FLUSH: bool = True # Update the vessel statuses after each flush
+    AIS_STREAM_RECONNECT_SECONDS: float = 5.0
+
+
     # N2YO Settings
     N2YO_API_KEY: str 
+    N2YO_URL: str = "https://api.n2yo.com/rest/v1/satellite"
+    N2YO_REQUESTS_PER_HOUR: int = 1000
+    TLE_FETCH_WORKERS: int = 8
+    TLE_MAX_AGE_HOURS: float = 24.0
+
+
+    # Bulk Ingestion Settings
+    BULK_CHUNK_SIZE: int = 1000 # NDJSON records validated and upserted at a time
+
+
+    # Pipeline Settings
+    RUN_SCHEDULER_IN_API: bool = False # Run the jobs in the API process instead of worker.py
+    PIPELINE_WORKERS: int = 4
+    PIPELINE_MAX_ATTEMPTS: int = 3
+    PASS_CANDIDATES: int = 10
+    PASS_SEARCH_DAYS: int = 3
+    PRODUCTS_PER_PASS: int = 1 # Products covering the vessel downloaded per pass, closest in time first
+    PASS_RECOMPUTE_DISTANCE_KM: float = 5.0
+    PASS_RECOMPUTE_MAX_AGE_HOURS: float = 12.0
+    PASS_VESSEL_CHUNK: int = 256 # Vessels matched against a ground track at a time
+    PASS_TIME_BUCKET_HOURS: float = 6.0 # Spread of report times sharing a propagation
+    PASS_POSITION_ERROR_KM: float = 1.0 # Uncertainty of a reported position
+    PASS_SPEED_ERROR: float = 0.1 # Uncertainty growth as a fraction of the distance dead reckoned
+    PASS_UNKNOWN_SPEED_KNOTS: float = 12.0 # Uncertainty growth when the speed is not available
+
+
+    # Track Settings
+    TRACK_TOLERANCE_M: float = 100.0 # Maximum distance between a dropped fix and the interpolated track
+    TRACK_BATCH_SIZE: int = 200 # Vessels updated per transaction
+
+
+    # Retention Settings
+    RETENTION_RAW_DAYS: int = 7 # Older AIS rows are moved to the archive
+    RETENTION_DOWNSAMPLE_DAYS: int = 7 # Older vessel statuses are downsampled
+    RETENTION_DOWNSAMPLE_MINUTES: int = 60 # One status kept per vessel per period
+    RETENTION_BATCH_SIZE: int = 5000
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_COMPRESSION: str = "zstd"
+
+
+    # Raster Settings
+    RASTER_CACHE_STRIPS: int = 8
+    RASTER_TILE_COMPRESS: Optional[str] = "deflate"
+
+
+    # Masking Settings
+    MAX_CLOUD_COVER: float = 80.0 # Scene cloud cover (%) accepted by the catalogue query
+    LAND_MASK_PATH: Optional[str] = None # Static raster, non zero over land
+    MIN_VISIBLE_WATER_FRACTION: float = 0.05 # Tiles with less cloud free water are not sent to detection
+    MASK_GRID_SIZE: int = 64
+
+
+    # Map Tile Settings
+    TILE_CACHE_SIZE: int = 4096
+    TILE_MAX_AGE_SECONDS: int = 60
+    TILE_TRACK_HOURS: float = 2.0
+    TILE_TRACK_REFRESH_SECONDS: int = 600
+
+
+    # Pass Prediction Settings
+    PREDICTION_WORKERS: int = 2
+    PREDICTION_MAX_HOURS: float = 240.0
+    PREDICTION_CACHE_SIZE: int = 1024
+    PREDICTION_CACHE_TTL_SECONDS: int = 3600
+    PREDICTION_LOCATION_DECIMALS: int = 2
+    PREDICTION_TIME_BUCKET_MINUTES: int = 15
+
+
+    # Observability Settings
+    OTEL_ENABLED: bool = False # Needs opentelemetry-api and a configured SDK/exporter
+    WORKER_METRICS_PORT: Optional[int] = 9100 # worker.py serves its Prometheus metrics here, 0 to disable
+
+
+    # Harness Settings
+    HARNESS_URL: str = "http://127.0.0.1:8001" # Local stand-in for the external services, see src/harness
     model_config = ConfigDict(extra="ignore" , env_file = ".env")
         
     
 
 
+def harness_overrides(harness_url: str) -> dict:
+    """Settings pointing every external service at the local stand-in server of the harness"""
+    return {
+        "HARNESS_URL": harness_url,
+        "CATALOGUE_URL": f"{harness_url}/odata/v1",
+        "AUTH_URL": f"{harness_url}/auth/token",
+        "AISHUB_URL": f"{harness_url}/aishub",
+        "N2YO_URL": f"{harness_url}/n2yo",
+        "COLLECTION_NAME": "SENTINEL-2",
+        "PRODUCT_TYPE": "S2MSI1C",
+        "USERNAME": "harness",
+        "PASSWORD": "harness",
+        "N2YO_API_KEY": "harness",
+    }
+
+
 @lru_cache(maxsize=None)
 def get_settings() -> Settings:
     """Function to get and cache settings.
@@ -49,6 +165,8 @@ def get_settings() -> Settings:
         settings_file = ".env.dev"
     elif environment == "prod":
         settings_file = ".env.prod"
+    elif environment == "harness":
+        return Settings(_env_file=".env.harness", **harness_overrides(os.getenv("HARNESS_URL", "http://127.0.0.1:8001")))
     else:
         raise ValueError(f"Invalid environment: {environment}")
 
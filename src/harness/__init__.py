@@ -0,0 +1 @@
+from .server import StandIn, create_app
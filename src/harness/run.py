@@ -0,0 +1,184 @@
+"""
+Run the processing cycle offline against the stand-in server
+
+    python -m src.harness.run --cycles 2 --vessels 50 --latency 0.05 --failure-rate 0.02 --stub-model
+
+The stand-in server runs in a background thread and the settings are switched to the harness
+environment, so every external call (CDSE, N2YO, AISHub) stays local. The database defaults to
+a fresh SQLite file in the work directory.
+"""
+from types import SimpleNamespace
+from pathlib import Path
+import argparse
+import threading
+import time
+import os
+
+
+class StubModel:
+    """Stands in for the YOLO weights, finds no ships"""
+
+    def __call__(self, image_path):
+        return [SimpleNamespace(orig_shape=(1024, 1024), obb=[], save=lambda filename: Path(filename).touch())]
+
+
+def start_server(app, port):
+    """
+    Serve an app with uvicorn in a daemon thread
+
+    Args:
+        app (FastAPI): App to serve
+        port (int): Local port
+
+    Returns:
+        uvicorn.Server: Running server
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    while not server.started:
+        time.sleep(0.05)
+
+    return server
+
+
+def seed_satellites(stand_in):
+    """
+    Create the satellites served by the stand-in server, their TLEs are fetched by fetch_tles
+
+    Args:
+        stand_in (StandIn): Stand-in responses
+    """
+    from src.services.db import get_session
+    from src.schemas.data_schema import Satellite
+
+    with next(get_session()) as session:
+        for index in range(stand_in.satellites):
+            norad_id = stand_in.first_norad_id + index
+            if session.get(Satellite, norad_id) is None:
+                session.add(Satellite(
+                    id=norad_id, name=f"HARNESS-{index}", orbit=[], sensor="MSI", swath_width_km=290.0,
+                    collection_name="SENTINEL-2", product_type="S2MSI1C"
+                ))
+        session.commit()
+
+
+def stage_totals():
+    """
+    Seconds and number of runs of each pipeline stage so far
+
+    Returns:
+        dict: Stage -> (seconds, count)
+    """
+    from prometheus_client import REGISTRY
+
+    totals = {}
+    for metric in REGISTRY.collect():
+        if metric.name != "pipeline_stage_seconds":
+            continue
+        for sample in metric.samples:
+            seconds, count = totals.get(sample.labels["stage"], (0.0, 0))
+            if sample.name.endswith("_sum"):
+                totals[sample.labels["stage"]] = (sample.value, count)
+            elif sample.name.endswith("_count"):
+                totals[sample.labels["stage"]] = (seconds, int(sample.value))
+
+    return totals
+
+
+def run_cycle():
+    """
+    Run every scheduled job once, in the order the scheduler starts them
+
+    Returns:
+        dict: Job name -> wall clock seconds
+    """
+    from src.services.ingestion import ingest_AIS_data, fetch_tles
+    from src.services.process import process_vessel_data, process_passes
+
+    timings = {}
+    for name, job in (("ingest_AIS_data", ingest_AIS_data), ("fetch_tles", fetch_tles),
+                      ("process_vessel_data", process_vessel_data), ("process_passes", process_passes)):
+        start = time.perf_counter()
+        job()
+        timings[name] = time.perf_counter() - start
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the processing cycle against local stand-ins of the external services")
+    parser.add_argument("--cycles", type=int, default=1)
+    parser.add_argument("--vessels", type=int, default=50)
+    parser.add_argument("--satellites", type=int, default=4)
+    parser.add_argument("--products-per-day", type=int, default=1)
+    parser.add_argument("--band-size", type=int, default=2048, help="Width and height of the served bands in pixels")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random seconds added on top of the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of the requests answered with a 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Override PIPELINE_WORKERS")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workdir", default="harness-run", help="Directory holding the database and the downloaded files")
+    parser.add_argument("--stub-model", action="store_true", help="Replace the YOLO weights with a model finding no ships")
+    parser.add_argument("--profile", default=None, help="Write cProfile stats of the cycles to this file")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    # The settings are read when the services are imported
+    os.environ["ENVIRONMENT"] = "harness"
+    os.environ["HARNESS_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir / 'harness.db'}")
+    os.chdir(workdir)
+
+    from src.config.settings import get_settings
+    from src.harness.server import StandIn, create_app
+    from src.services.db import init_db
+    import src.schemas.data_schema  # registers the tables created by init_db
+
+    settings = get_settings()
+    if args.workers is not None:
+        settings.PIPELINE_WORKERS = args.workers
+
+    if args.stub_model:
+        from src.services.inference import set_model
+        set_model(StubModel())
+
+    stand_in = StandIn(
+        vessels=args.vessels, satellites=args.satellites, products_per_day=args.products_per_day,
+        band_size=args.band_size, seed=args.seed
+    )
+    app = create_app(stand_in, latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=args.seed)
+    server = start_server(app, args.port)
+
+    init_db()
+    seed_satellites(stand_in)
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        for cycle in range(1, args.cycles + 1):
+            timings = run_cycle()
+            print(f"Cycle {cycle}: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        server.should_exit = True
+
+    print(f"Stand-in server: {app.state.requests} requests, {app.state.failures} injected failures")
+    print(f"{'stage':<12} {'runs':>8} {'seconds':>10}")
+    for stage, (seconds, count) in sorted(stage_totals().items(), key=lambda item: -item[1][0]):
+        print(f"{stage:<12} {count:>8} {seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+from datetime import datetime, timedelta
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import threading
+import tempfile
+import asyncio
+import hashlib
+import random
+import uuid
+import json
+import bz2
+import re
+
+BANDS = ("B02", "B03", "B04")
+LATITUDE_BANDS = "CDEFGHJKLMNPQRSTUVWX"
+
+
+def _encode_jp2(data, transform, crs="EPSG:32631"):
+    """
+    Encode an array as a georeferenced JP2, written through a file since the georeferencing of a
+    JP2 in a MemoryFile is lost
+
+    Args:
+        data (np.ndarray): (bands, height, width) array
+        transform (Affine): Transform of the raster
+        crs (str): CRS of the raster
+
+    Returns:
+        bytes: JP2 file
+    """
+    import rasterio
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "band.jp2"
+        with rasterio.open(
+            path, "w", driver="JP2OpenJPEG", width=data.shape[2], height=data.shape[1], count=data.shape[0],
+            dtype=data.dtype, crs=crs, transform=transform
+        ) as dst:
+            dst.write(data)
+        return path.read_bytes()
+
+
+class StandIn:
+    """
+    Canned responses of the external services (CDSE auth and catalogue, N2YO, AISHub)
+
+    Args:
+        vessels (int): Number of vessels in the AISHub feed
+        satellites (int): Number of satellites served by N2YO, their NORAD ids start at first_norad_id
+        products_per_day (int): Number of products returned by each daily catalogue query
+        band_size (int): Width and height of the JP2 bands in pixels
+        seed (int): Seed of the generated fleet
+        first_norad_id (int): NORAD id of the first satellite
+    """
+    def __init__(self, vessels=100, satellites=4, products_per_day=1, band_size=2048, seed=0, first_norad_id=90000):
+        self.products_per_day = products_per_day
+        self.band_size = band_size
+        self.first_norad_id = first_norad_id
+        self.satellites = satellites
+        self.started = datetime.utcnow()
+
+        rng = np.random.default_rng(seed)
+        self.fleet = pd.DataFrame({
+            "mmsi": 200000000 + np.arange(vessels),
+            "imo": 9000000 + np.arange(vessels),
+            "latitude": rng.uniform(-60, 60, vessels),
+            "longitude": rng.uniform(-180, 180, vessels),
+            "cog": rng.uniform(0, 360, vessels),
+            "sog": rng.uniform(5, 20, vessels),
+        })
+
+        self._bands = {}
+        self._bands_lock = threading.Lock()
+
+    def tle(self, norad_id):
+        """
+        TLE of a harness satellite, sun-synchronous orbits spread over the planes with an epoch at start-up
+
+        Args:
+            norad_id (int): NORAD id
+
+        Returns:
+            tuple: (line1, line2), None for an unknown satellite
+        """
+        from src.services.tle import omm_to_tles
+
+        index = norad_id - self.first_norad_id
+        if not 0 <= index < self.satellites:
+            return None
+
+        omm = pd.DataFrame([{
+            "OBJECT_NAME": f"HARNESS-{index}",
+            "OBJECT_ID": f"2025-{index + 1:03d}A",
+            "EPOCH": self.started.isoformat(),
+            "MEAN_MOTION": 14.3,
+            "ECCENTRICITY": 0.0001,
+            "INCLINATION": 98.6,
+            "RA_OF_ASC_NODE": 360 * index / self.satellites,
+            "ARG_OF_PERICENTER": 90.0,
+            "MEAN_ANOMALY": 360 * index / self.satellites,
+            "NORAD_CAT_ID": norad_id,
+            "BSTAR": 0.0001,
+            "MEAN_MOTION_DOT": 0.0,
+            "MEAN_MOTION_DDOT": 0.0,
+        }])
+        tles = omm_to_tles(omm)
+
+        return tles["line1"].iloc[0], tles["line2"].iloc[0]
+
+    def aishub(self, now=None):
+        """
+        AISHub feed (format 1, bz2 compressed JSON) with the vessels dead reckoned to now
+
+        Args:
+            now (datetime): Time of the feed
+
+        Returns:
+            bytes: Feed
+        """
+        now = now or datetime.utcnow()
+        hours = (now - self.started).total_seconds() / 3600
+
+        distance = self.fleet["sog"] * 1.852 * hours / 111.32
+        course = np.radians(self.fleet["cog"])
+        latitude = np.clip(self.fleet["latitude"] + distance * np.cos(course), -85, 85)
+        longitude = (self.fleet["longitude"] + distance * np.sin(course) / np.cos(np.radians(latitude)) + 180) % 360 - 180
+
+        ships = [
+            {
+                "MMSI": int(mmsi), "TIME": now.strftime("%Y-%m-%d %H:%M:%S GMT"),
+                "LONGITUDE": float(lon), "LATITUDE": float(lat), "COG": float(cog), "SOG": float(sog),
+                "HEADING": int(cog), "ROT": 0, "NAVSTAT": 0, "IMO": int(imo), "NAME": f"HARNESS {imo}",
+                "CALLSIGN": f"H{imo}", "TYPE": 70, "A": 150, "B": 30, "C": 15, "D": 15, "DRAUGHT": 9.5,
+                "DEST": "ROTTERDAM", "ETA": "01-01 00:00",
+            }
+            for mmsi, imo, lat, lon, cog, sog in zip(
+                self.fleet["mmsi"], self.fleet["imo"], latitude, longitude, self.fleet["cog"], self.fleet["sog"]
+            )
+        ]
+        header = {"ERROR": False, "USERNAME": "harness", "FORMAT": "HUMAN", "RECORDS": len(ships)}
+
+        return bz2.compress(json.dumps([header, ships]).encode())
+
+    def products(self, start, latitude, longitude):
+        """
+        Catalogue entries of the products sensed on a day over a location, the same day and MGRS-like
+        tile always give the same products
+
+        Args:
+            start (datetime): Day queried
+            latitude (float): Latitude of the area of interest
+            longitude (float): Longitude of the area of interest, the footprints cover 0.5 degrees around it
+
+        Returns:
+            list: OData product entries
+        """
+        zone = int((longitude + 180) // 6) % 60 + 1
+        tile = f"T{zone:02d}{LATITUDE_BANDS[min(max(int((latitude + 80) // 8), 0), 19)]}AA"
+
+        # Square of about 110 km around the area of interest
+        ring = [
+            (longitude - 0.5, latitude - 0.5), (longitude + 0.5, latitude - 0.5),
+            (longitude + 0.5, latitude + 0.5), (longitude - 0.5, latitude + 0.5), (longitude - 0.5, latitude - 0.5),
+        ]
+        wkt = ", ".join(f"{lon} {lat}" for lon, lat in ring)
+
+        products = []
+        for i in range(self.products_per_day):
+            sensing = start.replace(hour=10, minute=30) + timedelta(minutes=i)
+            name = f"S2A_MSIL1C_{sensing:%Y%m%dT%H%M%S}_N0511_R008_{tile}_{sensing:%Y%m%dT%H%M%S}.SAFE"
+            products.append({
+                "Id": str(uuid.uuid5(uuid.NAMESPACE_URL, name)),
+                "Name": name,
+                "ContentDate": {"Start": sensing.isoformat() + "Z", "End": sensing.isoformat() + "Z"},
+                "Footprint": f"geography'SRID=4326;POLYGON (({wkt}))'",
+                "GeoFootprint": {"type": "Polygon", "coordinates": [[list(vertex) for vertex in ring]]},
+            })
+        return products
+
+    def manifest(self, product_name):
+        """
+        MTD_MSIL1C.xml manifest laid out the way parse_manifest reads it
+
+        Args:
+            product_name (str): Product name
+
+        Returns:
+            bytes: Manifest
+        """
+        sensing, tile = product_name.split("_")[2], product_name.split("_")[5]
+        granule = f"L1C_{tile}_A000000_{sensing}"
+        files = "".join(
+            f"<IMAGE_FILE>GRANULE/{granule}/IMG_DATA/{tile}_{sensing}_{band}.jp2</IMAGE_FILE>"
+            for band in BANDS
+        )
+        # parse_manifest reads the image files at root[0][0][12][0][0]
+        padding = "".join(f"<FIELD_{i}/>" for i in range(12))
+        return (
+            f"<Level-1C_User_Product><General_Info><Product_Info>{padding}"
+            f"<Product_Organisation><Granule_List><Granule>{files}</Granule></Granule_List></Product_Organisation>"
+            f"</Product_Info></General_Info></Level-1C_User_Product>"
+        ).encode()
+
+    def band(self, band):
+        """
+        JP2 band, generated once per band name
+
+        Args:
+            band (str): Band name (B02, B03 or B04)
+
+        Returns:
+            bytes: JP2 file
+        """
+        with self._bands_lock:
+            if band not in self._bands:
+                from rasterio.transform import from_origin
+
+                seed = int(hashlib.sha256(band.encode()).hexdigest()[:8], 16)
+                data = np.random.default_rng(seed).integers(0, 3000, (1, self.band_size, self.band_size), dtype=np.uint16)
+                self._bands[band] = _encode_jp2(data, from_origin(600000, 5600040, 10, 10))
+
+        return self._bands[band]
+
+    def cloud_mask(self):
+        """
+        MSK_CLASSI_B00.jp2 classification mask at 60 m, opaque clouds over the top left quarter of the scene
+
+        Returns:
+            bytes: JP2 file
+        """
+        with self._bands_lock:
+            if "MSK_CLASSI" not in self._bands:
+                from rasterio.transform import from_origin
+
+                size = max(self.band_size // 6, 1)
+                data = np.zeros((3, size, size), dtype=np.uint8)
+                data[0, :size // 2, :size // 2] = 1
+                self._bands["MSK_CLASSI"] = _encode_jp2(data, from_origin(600000, 5600040, 60, 60))
+
+        return self._bands["MSK_CLASSI"]
+
+
+def create_app(stand_in=None, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+    """
+    Create the stand-in server of the external services
+
+    Args:
+        stand_in (StandIn): Canned responses, a default StandIn if None
+        latency (float): Seconds added to every response
+        jitter (float): Maximum random seconds added on top of latency
+        failure_rate (float): Fraction of the requests answered with a 503
+        seed (int): Seed of the latency and failure draws
+
+    Returns:
+        FastAPI: Stand-in server
+    """
+    stand_in = stand_in or StandIn()
+    rng = random.Random(seed)
+    app = FastAPI(title="Harness stand-in server")
+    app.state.stand_in = stand_in
+    app.state.requests = 0
+    app.state.failures = 0
+
+    @app.middleware("http")
+    async def degrade(request: Request, call_next):
+        app.state.requests += 1
+
+        delay = latency + rng.uniform(0, jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if rng.random() < failure_rate:
+            app.state.failures += 1
+            return JSONResponse({"detail": "Injected failure"}, status_code=503)
+
+        return await call_next(request)
+
+    @app.post("/auth/token")
+    async def token():
+        return {"access_token": "harness-token", "expires_in": 600, "token_type": "Bearer"}
+
+    @app.get("/aishub")
+    def aishub():
+        return Response(stand_in.aishub(), media_type="application/x-bzip2")
+
+    @app.get("/n2yo/tle/{query:path}")
+    async def n2yo_tle(query: str):
+        # N2YO takes the API key in the path: /tle/{id}&apiKey={key}
+        norad_id = int(query.split("&")[0])
+        tle = stand_in.tle(norad_id)
+        if tle is None:
+            return JSONResponse({"error": "Unknown satellite"}, status_code=404)
+
+        return {"info": {"satid": norad_id, "satname": f"HARNESS-{norad_id}", "transactionscount": 0}, "tle": "\r\n".join(tle)}
+
+    @app.get("/odata/v1/Products")
+    async def catalogue(request: Request):
+        query = request.query_params.get("$filter", "")
+        date = re.search(r"ContentDate/Start gt (\d{4}-\d{2}-\d{2})", query)
+        corner = re.search(r"POLYGON\(\((\S+) (\S+),", query)
+        if date is None or corner is None:
+            return JSONResponse({"detail": "Unsupported filter"}, status_code=400)
+
+        longitude, latitude = float(corner.group(1)), float(corner.group(2))
+        return {"value": stand_in.products(datetime.strptime(date.group(1), "%Y-%m-%d"), latitude, longitude)}
+
+    @app.get("/odata/v1/{path:path}")
+    def nodes(path: str):
+        # Products('{id}')/Nodes({name})/Nodes(MTD_MSIL1C.xml)/$value or .../Nodes({band or mask file})/$value
+        names = re.findall(r"Nodes\(([^)]*)\)", path)
+        if not names:
+            return JSONResponse({"detail": "Not found"}, status_code=404)
+
+        if names[-1] == "MTD_MSIL1C.xml":
+            return Response(stand_in.manifest(names[0]), media_type="application/xml")
+
+        if names[-1] == "MSK_CLASSI_B00.jp2":
+            return Response(stand_in.cloud_mask(), media_type="application/octet-stream")
+
+        band = re.search(r"_(B\d{2})\.jp2$", names[-1])
+        if band is None or band.group(1) not in BANDS:
+            return JSONResponse({"detail": "Not found"}, status_code=404)
+
+        return Response(stand_in.band(band.group(1)), media_type="application/octet-stream")
+
+    return app
@@ -1 +1 @@
-from .logger import get_logger , log_function_call_debug 
\ No newline at end of file
+from .logger import get_logger , log_function_call_debug , configure_logging 
\ No newline at end of file
@@ -1,26 +1,104 @@
 import functools
 import logging
+import logging.handlers
+import atexit
+import reprlib
+import random
+import queue
+import json
 import sys
 from uvicorn.logging import ColourizedFormatter
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 # Custom colorized formatter to apply colors specifically to log levels
 class CustomColourizedFormatter(ColourizedFormatter):
-    def format(self, record: logging.LogRecord) -> str:
-        level_color_map = {
-            "DEBUG": "\033[34m",    # Blue
-            "INFO": "\033[32m",     # Green
-            "WARNING": "\033[33m",  # Yellow
-            "ERROR": "\033[31m",    # Red
-            "CRITICAL": "\033[41m", # Red background
-        }
+    level_color_map = {
+        "DEBUG": "\033[34m",    # Blue
+        "INFO": "\033[32m",     # Green
+        "WARNING": "\033[33m",  # Yellow
+        "ERROR": "\033[31m",    # Red
+        "CRITICAL": "\033[41m", # Red background
+    }
 
+    def format(self, record: logging.LogRecord) -> str:
         reset = "\033[0m"
 
-        record.levelname = f"{level_color_map.get(record.levelname, '')}{record.levelname}{reset}"
+        # Colour a copy so the other handlers of the record still see the plain level name
+        record = logging.makeLogRecord(record.__dict__)
+        record.levelname = f"{self.level_color_map.get(record.levelname, '')}{record.levelname}{reset}"
 
         return super().format(record)
 
+# Attributes every LogRecord has, the others were passed through extra
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "color_message"}
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, extra fields are added to the object"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES})
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+class ArgumentRepr(reprlib.Repr):
+    """Size capped repr that summarises arrays and data frames instead of rendering them"""
+
+    def __init__(self, max_length: int = 200):
+        super().__init__()
+        self.maxstring = max_length
+        self.maxother = max_length
+        self.maxlist = self.maxtuple = self.maxdict = self.maxset = 10
+
+    def repr_ndarray(self, obj, level):
+        return f"ndarray(shape={obj.shape}, dtype={obj.dtype})"
+
+    def repr_DataFrame(self, obj, level):
+        return f"DataFrame(shape={obj.shape})"
+
+    def repr_Series(self, obj, level):
+        return f"Series(name={obj.name!r}, length={len(obj)})"
+
+class _LazyRepr:
+    """Defers the repr of a value until the record is actually formatted"""
+
+    __slots__ = ("value", "repr")
+
+    def __init__(self, value: Any, repr: ArgumentRepr):
+        self.value = value
+        self.repr = repr
+
+    def __str__(self) -> str:
+        return self.repr.repr(self.value)
+
+# Output shared by the loggers, replaced by configure_logging
+_config = {
+    "level": logging.INFO,
+    "handler": None,
+    "sample_rate": 1.0,
+    "repr": ArgumentRepr(),
+}
+_loggers = {}
+_listener = None
+
+def _default_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(CustomColourizedFormatter(
+        "{asctime} | {levelname:<8} | {message}",
+        style="{",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        use_colors=True
+    ))
+    return handler
+
 def get_logger(name: str) -> logging.Logger:
     """Creates a logger object
 
@@ -28,43 +106,105 @@ def get_logger(name: str) -> logging.Logger:
         name (str): name given to the logger
 
     Returns:
-        logging.Logger: logger object to be used for logging 
+        logging.Logger: logger object to be used for logging
     """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(_config["level"])
 
-    if not logger.hasHandlers():
-        ch = logging.StreamHandler(sys.stdout)
-        ch.setLevel(logging.DEBUG)
+    if name not in _loggers and not logger.hasHandlers():
+        if _config["handler"] is None:
+            _config["handler"] = _default_handler()
+        logger.addHandler(_config["handler"])
+        _loggers[name] = logger
 
-        formatter = CustomColourizedFormatter(
-            "{asctime} | {levelname:<8} | {message}",
-            style="{",
-            datefmt="%Y-%m-%d %H:%M:%S",
-            use_colors=True
-        )
+    return logger
 
-        ch.setFormatter(formatter)
+def configure_logging(
+    level: str = "DEBUG",
+    json_format: bool = False,
+    use_queue: bool = False,
+    sample_rate: float = 1.0,
+    max_arg_length: int = 200
+) -> None:
+    """Configures the output of the loggers created with get_logger
 
-        logger.addHandler(ch)
+    Args:
+        level (str): minimum level logged
+        json_format (bool): write one JSON object per line instead of coloured text
+        use_queue (bool): hand the records to a background thread so logging never blocks on the output
+        sample_rate (float): fraction of the calls logged by log_function_call_debug
+        max_arg_length (int): maximum length of each argument or result logged by log_function_call_debug
+    """
+    global _listener
 
-    return logger
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    if json_format:
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter())
+    else:
+        output = _default_handler()
+
+    handler = output
+    if use_queue:
+        handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
 
-def log_function_call_debug(logger: logging.Logger) -> Callable:
+    previous = _config["handler"]
+    _config.update(
+        level=logging.getLevelName(level.upper()) if isinstance(level, str) else level,
+        handler=handler,
+        sample_rate=sample_rate,
+        repr=ArgumentRepr(max_arg_length),
+    )
+
+    for logger in _loggers.values():
+        if previous is not None:
+            logger.removeHandler(previous)
+        logger.addHandler(handler)
+        logger.setLevel(_config["level"])
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+atexit.register(_stop_listener)
+
+def log_function_call_debug(logger: logging.Logger, sample_rate: Optional[float] = None) -> Callable:
     """A decorator that logs the function calls and results.
 
+    Nothing is formatted unless DEBUG is enabled, only a sample of the calls is logged and the
+    arguments are size capped (see configure_logging).
+
     Args:
         logger (logging.Logger): The logger instance to use for logging.
-    
+        sample_rate (float): fraction of the calls logged, defaults to the configured rate
+
     Returns:
         Callable: A wrapper function that logs the execution details.
     """
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            logger.debug(f"Calling {func.__name__} with args: {args} and kwargs: {kwargs}")
+            if not logger.isEnabledFor(logging.DEBUG):
+                return func(*args, **kwargs)
+
+            rate = _config["sample_rate"] if sample_rate is None else sample_rate
+            if rate < 1 and random.random() >= rate:
+                return func(*args, **kwargs)
+
+            argument_repr = _config["repr"]
+            extra = {"function": func.__qualname__}
+
+            logger.debug(
+                "Calling %s with args: %s and kwargs: %s",
+                func.__name__, _LazyRepr(args, argument_repr), _LazyRepr(kwargs, argument_repr), extra=extra
+            )
             result = func(*args, **kwargs)
-            logger.debug(f"{func.__name__} returned {result}")
+            logger.debug("%s returned %s", func.__name__, _LazyRepr(result, argument_repr), extra=extra)
             return result
         return wrapper
     return decorator
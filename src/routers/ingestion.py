@@ -1,20 +1,107 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session
-from src.services.db import get_session
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.services.db import get_async_session
+from src.services.bulk import is_ndjson, parse_ndjson_lines, parse_records, prepare_records, upsert_records
 from src.schemas.data_schema import Vessel, Satellite
+from src.config.settings import get_settings
 
+settings = get_settings()
 router = APIRouter()
 
 @router.post("/vessels/")
-async def ingest_vessel(vessel: Vessel, session: Session = Depends(get_session)):
+async def ingest_vessel(vessel: Vessel, session: AsyncSession = Depends(get_async_session)):
     session.add(vessel)
-    session.commit()
-    session.refresh(vessel)
+    await session.commit()
+    await session.refresh(vessel)
     return vessel
 
 @router.post("/satellites/")
-async def ingest_satellite(satellite: Satellite, session: Session = Depends(get_session)):
+async def ingest_satellite(satellite: Satellite, session: AsyncSession = Depends(get_async_session)):
     session.add(satellite)
-    session.commit()
-    session.refresh(satellite)
+    await session.commit()
+    await session.refresh(satellite)
     return satellite
+
+def _prepare(model, body, content_type):
+    records, parse_errors = parse_records(body, content_type)
+    rows, errors = prepare_records(model, records)
+    return len(records), rows, parse_errors + errors
+
+def _prepare_lines(model, lines, offset):
+    records, parse_errors = parse_ndjson_lines(lines, offset)
+    rows, errors = prepare_records(model, records, offset=offset)
+    return len(records), rows, parse_errors + errors
+
+async def _line_chunks(request: Request, size):
+    """
+    Read the lines of a request body as it arrives, in chunks of at most size non-blank lines
+
+    Args:
+        request (Request): Incoming request
+        size (int): Lines per chunk
+
+    Yields:
+        list: Lines as bytes
+    """
+    lines = []
+    partial = b""
+
+    async for data in request.stream():
+        *complete, partial = (partial + data).split(b"\n")
+        for line in complete:
+            if line.strip():
+                lines.append(line)
+                if len(lines) == size:
+                    yield lines
+                    lines = []
+
+    if partial.strip():
+        lines.append(partial)
+    if lines:
+        yield lines
+
+async def _bulk_ingest(model, request: Request, session: AsyncSession):
+    """
+    Parse and validate a JSON array or NDJSON body in the threadpool, then upsert its records
+    in a single transaction on the async session
+
+    NDJSON bodies are read as a stream and upserted every BULK_CHUNK_SIZE records, so memory stays
+    bounded whatever the size of the upload. A JSON array can only be parsed whole.
+
+    Args:
+        model (SQLModel): Table model of the records
+        request (Request): Incoming request
+        session (AsyncSession): Database session
+
+    Returns:
+        dict: Number of records received, inserted and updated, and the errors of the rejected records
+    """
+    content_type = request.headers.get("content-type")
+    received, counts, errors = 0, {"inserted": 0, "updated": 0}, []
+
+    if is_ndjson(content_type):
+        async for lines in _line_chunks(request, settings.BULK_CHUNK_SIZE):
+            chunk_received, rows, chunk_errors = await run_in_threadpool(_prepare_lines, model, lines, received)
+            chunk_counts = await session.run_sync(upsert_records, model, rows)
+
+            received += chunk_received
+            errors += chunk_errors
+            counts = {key: counts[key] + chunk_counts[key] for key in counts}
+    else:
+        body = await request.body()
+        received, rows, errors = await run_in_threadpool(_prepare, model, body, content_type)
+        counts = await session.run_sync(upsert_records, model, rows)
+
+    await session.commit()
+
+    errors.sort(key=lambda e: e["index"] if e["index"] is not None else -1)
+    return {"received": received, **counts, "errors": errors}
+
+@router.post("/vessels/bulk")
+async def ingest_vessels_bulk(request: Request, session: AsyncSession = Depends(get_async_session)):
+    return await _bulk_ingest(Vessel, request, session)
+
+@router.post("/satellites/bulk")
+async def ingest_satellites_bulk(request: Request, session: AsyncSession = Depends(get_async_session)):
+    return await _bulk_ingest(Satellite, request, session)
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from src.services.metrics import latest_metrics
+
+router = APIRouter()
+
+@router.get("")
+async def metrics():
+    """Prometheus metrics of the pipeline stages"""
+    return Response(content=latest_metrics(), media_type=CONTENT_TYPE_LATEST)
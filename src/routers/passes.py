@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import select, cast, String, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.services.db import get_async_session
+from src.services.query import bbox_filter, time_filter
+from src.services.prediction import prediction_cache, cache_key, predict_passes, get_executor
+from src.services.tle import latest_tle_subquery
+from src.config.settings import get_settings
+from src.routers.utils import paginated_response, bbox_param
+from src.schemas.data_schema import SatPass, Detection, VesselStatus, Vessel, Satellite, TLE
+
+settings = get_settings()
+
+router = APIRouter()
+
+@router.get("/")
+async def list_passes(
+    bbox: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    satellite: Optional[str] = None,
+    imo: Optional[int] = None,
+    vessel_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    stream: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Satellite passes recorded over the vessels"""
+    stmt = (
+        select(*SatPass.__table__.columns, VesselStatus.imo)
+        .join(VesselStatus, VesselStatus.id == SatPass.status_id)
+        .where(*time_filter(SatPass.timestamp, start, end))
+    )
+    if bbox is not None:
+        stmt = stmt.where(bbox_filter(SatPass.latitude, SatPass.longitude, bbox_param(bbox)))
+    if satellite is not None:
+        stmt = stmt.where(SatPass.satellite == satellite)
+    if imo is not None:
+        stmt = stmt.where(VesselStatus.imo == imo)
+    if vessel_type is not None:
+        stmt = stmt.join(Vessel, Vessel.imo == VesselStatus.imo).where(Vessel.vessel_type == vessel_type)
+
+    return await paginated_response(session, stmt, SatPass.id, cursor, limit, stream)
+
+@router.get("/detections")
+async def list_detections(
+    pass_id: Optional[int] = None,
+    bbox: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    stream: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Ships detected in the imagery of the passes"""
+    stmt = (
+        select(*Detection.__table__.columns, SatPass.satellite, SatPass.timestamp)
+        .join(SatPass, SatPass.id == Detection.pass_id)
+        .where(*time_filter(SatPass.timestamp, start, end))
+    )
+    if pass_id is not None:
+        stmt = stmt.where(Detection.pass_id == pass_id)
+    if bbox is not None:
+        stmt = stmt.where(bbox_filter(SatPass.latitude, SatPass.longitude, bbox_param(bbox)))
+
+    return await paginated_response(session, stmt, Detection.id, cursor, limit, stream)
+
+@router.get("/predict")
+async def predict(
+    lat: float = Query(ge=-90, le=90),
+    lon: float = Query(ge=-180, le=180),
+    start: Optional[datetime] = None,
+    hours: float = Query(24, gt=0, le=settings.PREDICTION_MAX_HOURS),
+    sats: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Predict the passes whose swath covers a location, for all satellites or the comma separated
+    names/ids in sats
+
+    Predictions run in the prediction pool and are cached by rounded location, time bucket and
+    TLE version.
+    """
+    latest = latest_tle_subquery()
+    stmt = (
+        select(
+            Satellite.id, Satellite.name, Satellite.swath_width_km, Satellite.max_off_nadir_deg,
+            TLE.id.label("tle_id"), TLE.line1, TLE.line2
+        )
+        .join(latest, latest.c.satellite_id == cast(Satellite.id, String))
+        .join(TLE, TLE.id == latest.c.id)
+    )
+    if sats:
+        requested = [sat.strip() for sat in sats.split(",") if sat.strip()]
+        ids = [int(sat) for sat in requested if sat.isdigit()]
+        stmt = stmt.where(or_(Satellite.name.in_(requested), Satellite.id.in_(ids)))
+
+    satellites = [dict(row._mapping) for row in await session.execute(stmt)]
+    if not satellites:
+        raise HTTPException(status_code=404, detail="No TLE found for the requested satellites")
+
+    key, lat, lon, start = cache_key(lat, lon, start or datetime.utcnow(), hours, satellites)
+    passes = prediction_cache.get(key)
+    cached = passes is not None
+
+    if not cached:
+        loop = asyncio.get_running_loop()
+        passes = await loop.run_in_executor(get_executor(), predict_passes, lat, lon, start, hours, satellites)
+        prediction_cache.set(key, passes)
+
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "start": start.isoformat(),
+        "hours": hours,
+        "cached": cached,
+        "passes": passes,
+    }
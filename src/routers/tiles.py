@@ -0,0 +1,105 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.config.settings import get_settings
+from src.services.cache import LRUCache
+from src.services.db import get_async_session
+from src.services.query import bbox_filter
+from src.services.tiles import tile_bounds, encode_mvt, encode_arrow, position_features, track_features, ground_tracks
+from src.schemas.data_schema import Vessel, VesselStatus
+
+settings = get_settings()
+
+router = APIRouter()
+
+tile_cache = LRUCache(maxsize=settings.TILE_CACHE_SIZE)
+track_cache = LRUCache(maxsize=4)
+
+MEDIA_TYPES = {
+    "mvt": "application/vnd.mapbox-vector-tile",
+    "pbf": "application/vnd.mapbox-vector-tile",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def _render(z, x, y, fmt, positions, track_bucket):
+    """
+    Encode the positions (and ground tracks) of a tile
+
+    Args:
+        z (int): Zoom level
+        x (int): Tile column
+        y (int): Tile row
+        fmt (str): mvt/pbf or arrow
+        positions (list): Latest positions on the tile
+        track_bucket (int): Time bucket of the ground tracks, None to leave them out
+
+    Returns:
+        bytes: Encoded tile
+    """
+    if fmt == "arrow":
+        return encode_arrow({key: [p[key] for p in positions] for key in (positions[0] if positions else {"imo": []})})
+
+    layers = {"vessels": position_features(z, x, y, positions)}
+
+    if track_bucket is not None:
+        tracks = track_cache.get(track_bucket)
+        if tracks is None:
+            tracks = ground_tracks(datetime.utcfromtimestamp(track_bucket * settings.TILE_TRACK_REFRESH_SECONDS), settings.TILE_TRACK_HOURS)
+            track_cache.set(track_bucket, tracks)
+        layers["ground_tracks"] = track_features(z, x, y, tracks)
+
+    return encode_mvt(layers)
+
+@router.get("/{z}/{x}/{y}.{fmt}")
+async def get_tile(
+    z: int,
+    x: int,
+    y: int,
+    fmt: str,
+    request: Request,
+    tracks: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Latest vessel positions on a XYZ tile, as a Mapbox Vector Tile (layers vessels and, with tracks,
+    ground_tracks) or an Arrow IPC stream of the positions
+
+    Tiles are cached until a new vessel status is stored.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown tile format {fmt}")
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    if tracks and fmt == "arrow":
+        raise HTTPException(status_code=400, detail="Ground tracks are only served as vector tiles")
+
+    # Any new status changes the version, which invalidates the cached tiles
+    version = (await session.execute(select(func.max(VesselStatus.id)))).scalar() or 0
+    track_bucket = int(datetime.utcnow().timestamp() // settings.TILE_TRACK_REFRESH_SECONDS) if tracks else None
+
+    etag = f'"{version}-{track_bucket}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.TILE_MAX_AGE_SECONDS}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    key = (z, x, y, fmt, version, track_bucket)
+    content = tile_cache.get(key)
+
+    if content is None:
+        min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+        result = await session.execute(
+            select(
+                Vessel.imo, Vessel.vessel_name, Vessel.vessel_type, VesselStatus.freshness,
+                VesselStatus.latitude, VesselStatus.longitude, VesselStatus.speed, VesselStatus.course
+            )
+            .join(VesselStatus, VesselStatus.id == Vessel.latest_status_id)
+            .where(bbox_filter(VesselStatus.latitude, VesselStatus.longitude, (min_lon, min_lat, max_lon, max_lat)))
+        )
+        positions = [dict(row._mapping) for row in result]
+
+        content = await run_in_threadpool(_render, z, x, y, fmt, positions, track_bucket)
+        tile_cache.set(key, content)
+
+    return Response(content=content, media_type=MEDIA_TYPES[fmt], headers=headers)
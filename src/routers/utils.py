@@ -0,0 +1,41 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from src.services.query import parse_bbox, decode_cursor, fetch_page, stream_ndjson
+
+async def paginated_response(session, stmt, key_column, cursor, limit, stream):
+    """
+    Return a page of the query, or stream all of it as NDJSON
+
+    Args:
+        session (AsyncSession): Database session
+        stmt (Select): Query selecting the columns to return
+        key_column (Column): Unique column used for keyset pagination
+        cursor (str): Cursor returned with the previous page
+        limit (int): Page size
+        stream (bool): Stream every row instead of returning a page
+
+    Returns:
+        dict | StreamingResponse: Page of results or NDJSON stream
+    """
+    try:
+        decode_cursor(cursor)
+        if stream:
+            return StreamingResponse(stream_ndjson(stmt, key_column, cursor, limit), media_type="application/x-ndjson")
+        return await fetch_page(session, stmt, key_column, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def bbox_param(bbox):
+    """
+    Parse a bbox query parameter, answering 400 if it is malformed
+
+    Args:
+        bbox (str): Bounding box as min_lon,min_lat,max_lon,max_lat
+
+    Returns:
+        tuple: (min_lon, min_lat, max_lon, max_lat)
+    """
+    try:
+        return parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
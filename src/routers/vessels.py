@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, HTTPException
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.services.db import get_async_session
+from src.services.query import bbox_filter, time_filter
+from src.routers.utils import paginated_response, bbox_param
+from src.schemas.data_schema import Vessel, VesselStatus, Track
+from src.services.tracks import load_track, position_at
+
+router = APIRouter()
+
+@router.get("/")
+async def list_vessels(
+    vessel_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    stream: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    stmt = select(*Vessel.__table__.columns)
+    if vessel_type is not None:
+        stmt = stmt.where(Vessel.vessel_type == vessel_type)
+
+    return await paginated_response(session, stmt, Vessel.imo, cursor, limit, stream)
+
+@router.get("/positions")
+async def latest_positions(
+    bbox: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    vessel_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    stream: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Latest position of each vessel"""
+    stmt = (
+        select(
+            VesselStatus.id, Vessel.imo, Vessel.mmsi, Vessel.vessel_name, Vessel.vessel_type,
+            VesselStatus.freshness, VesselStatus.latitude, VesselStatus.longitude,
+            VesselStatus.speed, VesselStatus.course, VesselStatus.status
+        )
+        .join(VesselStatus, VesselStatus.id == Vessel.latest_status_id)
+        .where(*time_filter(VesselStatus.freshness, start, end))
+    )
+    if bbox is not None:
+        stmt = stmt.where(bbox_filter(VesselStatus.latitude, VesselStatus.longitude, bbox_param(bbox)))
+    if vessel_type is not None:
+        stmt = stmt.where(Vessel.vessel_type == vessel_type)
+
+    return await paginated_response(session, stmt, VesselStatus.id, cursor, limit, stream)
+
+@router.get("/statuses")
+async def list_statuses(
+    imo: Optional[int] = None,
+    bbox: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    vessel_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    stream: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Position history of the vessels"""
+    stmt = select(*VesselStatus.__table__.columns).where(*time_filter(VesselStatus.freshness, start, end))
+    if imo is not None:
+        stmt = stmt.where(VesselStatus.imo == imo)
+    if bbox is not None:
+        stmt = stmt.where(bbox_filter(VesselStatus.latitude, VesselStatus.longitude, bbox_param(bbox)))
+    if vessel_type is not None:
+        stmt = stmt.join(Vessel, Vessel.imo == VesselStatus.imo).where(Vessel.vessel_type == vessel_type)
+
+    return await paginated_response(session, stmt, VesselStatus.id, cursor, limit, stream)
+
+@router.get("/{imo}/track")
+async def vessel_track(
+    imo: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Compressed track of a vessel, interpolating between its points stays within TRACK_TOLERANCE_M of the fixes"""
+    track = await session.get(Track, imo)
+    if track is None:
+        raise HTTPException(status_code=404, detail="No track for this vessel")
+
+    times, lats, lons = load_track(track, start, end)
+
+    return {
+        "imo": imo,
+        "points": [
+            {"timestamp": str(timestamp).replace("T", " "), "latitude": lat, "longitude": lon}
+            for timestamp, lat, lon in zip(times.astype("datetime64[s]"), lats.tolist(), lons.tolist())
+        ]
+    }
+
+@router.get("/{imo}/position")
+async def vessel_position(imo: int, at: datetime, session: AsyncSession = Depends(get_async_session)):
+    """Position of a vessel at a time, interpolated on its track"""
+    track = await session.get(Track, imo)
+    position = position_at(track, at) if track is not None else None
+    if position is None:
+        raise HTTPException(status_code=404, detail="No position for this vessel at this time")
+
+    return {"imo": imo, "at": at.isoformat(), "latitude": position[0], "longitude": position[1]}
@@ -1 +1 @@
-from .data_schema import Vessel, VesselStatus, SatPass, TLE, Satellite
\ No newline at end of file
+from .data_schema import Vessel, VesselStatus, SatPass, TLE, Satellite, Detection, PipelineUnit
\ No newline at end of file
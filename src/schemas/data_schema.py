@@ -1,4 +1,4 @@
-from sqlmodel import SQLModel, Field, Relationship, JSON, Column
+from sqlmodel import SQLModel, Field, Relationship, JSON, Column, Index, LargeBinary
 from typing import Optional, List
 from datetime import datetime
 
@@ -29,18 +29,25 @@ class Vessel(SQLModel, table=True):
     imo: int = Field(primary_key=True)
     mmsi: str = Field(default=None)
     vessel_name: Optional[str] = Field(default=None)
-    vessel_type: Optional[str] = Field(default=None)
+    vessel_type: Optional[str] = Field(default=None, index=True)
     vesselfinder_url: Optional[str] = Field(default=None)
     flag: Optional[str] = Field(default=None)
     length: Optional[float] = Field(default=None)
     beam: Optional[float] = Field(default=None)
     year_built: Optional[int] = Field(default=None)
+    latest_status_id: Optional[int] = Field(default=None)
+    pass_latitude: Optional[float] = Field(default=None)
+    pass_longitude: Optional[float] = Field(default=None)
+    pass_freshness: Optional[str] = Field(default=None)
+    passes_dirty: bool = Field(default=True, index=True)
     statuses: List["VesselStatus"] = Relationship(back_populates="vessel")
 
 class VesselStatus(SQLModel, table=True):
+    __table_args__ = (Index("ix_vesselstatus_position", "latitude", "longitude"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    imo: int = Field(foreign_key="vessel.imo")
-    freshness: str
+    imo: int = Field(foreign_key="vessel.imo", index=True)
+    freshness: str = Field(index=True)
     latitude: float
     longitude: float
     speed: Optional[float] = Field(default=None)
@@ -52,15 +59,29 @@ class VesselStatus(SQLModel, table=True):
     passes: List["SatPass"] = Relationship(back_populates="status")
 
 class SatPass(SQLModel, table=True):
+    __table_args__ = (Index("ix_satpass_position", "latitude", "longitude"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    satellite: str
-    timestamp: str
+    satellite: str = Field(index=True)
+    timestamp: str = Field(index=True)
     latitude: float
     longitude: float
     image_url: Optional[str] = Field(default=None)
+    footprint: Optional[str] = Field(default=None) # WKT MultiPolygon of the product
 
     status_id: int = Field(foreign_key="vesselstatus.id")
     status: "VesselStatus" = Relationship(back_populates="passes")
+    detections: List["Detection"] = Relationship(back_populates="sat_pass")
+
+class Detection(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    pass_id: int = Field(foreign_key="satpass.id", index=True)
+    tile_name: str
+    class_id: int
+    points: List[float] = Field(sa_column=Column(JSON))
+    image_path: Optional[str] = Field(default=None)
+
+    sat_pass: "SatPass" = Relationship(back_populates="detections")
 
 class TLE(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -75,8 +96,38 @@ class Satellite(SQLModel, table=True):
     id: int = Field(primary_key=True)
     name: str
     orbit: List[float] = Field(sa_column=Column(JSON))
+    sensor: Optional[str] = Field(default=None)
+    swath_width_km: Optional[float] = Field(default=None)
+    max_off_nadir_deg: Optional[float] = Field(default=None)
+    revisit_days: Optional[float] = Field(default=None)
+    collection_name: Optional[str] = Field(default=None)
+    product_type: Optional[str] = Field(default=None)
+    tle_checked_at: Optional[str] = Field(default=None) # Last fetch of the TLE, also when it was unchanged
 
     tles: List["TLE"] = Relationship(back_populates="satellite")
 
     class Config:
         arbitrary_types_allowed = True
+
+class PipelineUnit(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key: str = Field(index=True, unique=True)
+    stage: str = Field(index=True)
+    state: str = Field(default="pending", index=True)
+    attempts: int = Field(default=0)
+    result: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = Field(default=None)
+    updated_at: str = Field(default_factory=datetime.utcnow)
+
+class Watermark(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    value: int = Field(default=0)
+    updated_at: str = Field(default_factory=datetime.utcnow)
+
+class Track(SQLModel, table=True):
+    imo: int = Field(foreign_key="vessel.imo", primary_key=True)
+    start: str
+    end: str = Field(index=True)
+    points: int = Field(default=0)
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False)) # Compressed track, see src/services/tracks.py
+    updated_at: str = Field(default_factory=datetime.utcnow)
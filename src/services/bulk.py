@@ -0,0 +1,172 @@
+from collections import defaultdict
+from pydantic import ValidationError
+from sqlalchemy import inspect, insert, update
+from src.logger import get_logger
+import json
+
+logger = get_logger(__name__)
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+
+def is_ndjson(content_type):
+    """
+    Check whether a Content-Type header announces newline-delimited JSON
+
+    Args:
+        content_type (str): Content-Type header of the request
+
+    Returns:
+        bool: True for NDJSON
+    """
+    return bool(content_type) and content_type.split(";")[0].strip() in NDJSON_CONTENT_TYPES
+
+
+def parse_ndjson_lines(lines, offset=0):
+    """
+    Parse newline-delimited JSON records, blank lines are skipped
+
+    Args:
+        lines (list): Lines as bytes or str
+        offset (int): Index of the first record in the whole body
+
+    Returns:
+        list: Parsed records, None for the lines that are not valid JSON
+        list: Errors with the index of the record that failed
+    """
+    records = []
+    errors = []
+    for index, line in enumerate((line for line in lines if line.strip()), start=offset):
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            records.append(None)
+            errors.append({"index": index, "error": f"Invalid JSON: {e}"})
+    return records, errors
+
+
+def parse_records(body, content_type):
+    """
+    Parse the body of a bulk request, either a JSON array or newline-delimited JSON
+
+    Args:
+        body (bytes): Request body
+        content_type (str): Content-Type header of the request
+
+    Returns:
+        list: Parsed records, None for the lines that are not valid JSON
+        list: Errors with the index of the record that failed
+    """
+    if is_ndjson(content_type):
+        return parse_ndjson_lines(body.splitlines())
+
+    try:
+        records = json.loads(body)
+    except json.JSONDecodeError as e:
+        return [], [{"index": None, "error": f"Invalid JSON: {e}"}]
+
+    if not isinstance(records, list):
+        return [], [{"index": None, "error": "Expected a JSON array"}]
+
+    return records, []
+
+
+def validate_records(model, records, batch_size=1000, offset=0):
+    """
+    Validate records against a table model
+
+    Args:
+        model (SQLModel): Table model
+        records (list): Records to validate, None entries are skipped
+        batch_size (int): Number of records validated at a time
+        offset (int): Index of the first record in the whole body, added to the error indexes
+
+    Returns:
+        list: (index, values, fields) of the valid records, fields are the names of the fields that were sent
+        list: Errors with the index of the record that failed
+    """
+    valid = []
+    errors = []
+
+    for start in range(0, len(records), batch_size):
+        for index, record in enumerate(records[start:start + batch_size], start=start):
+            if record is None:
+                continue
+            try:
+                instance = model.model_validate(record)
+                valid.append((index, instance.model_dump(), frozenset(instance.model_fields_set)))
+            except ValidationError as e:
+                errors.append({
+                    "index": offset + index,
+                    "error": "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                })
+            except (TypeError, ValueError) as e:
+                errors.append({"index": offset + index, "error": str(e)})
+
+    return valid, errors
+
+
+def upsert_records(session, model, rows, batch_size=1000):
+    """
+    Insert rows or update the existing ones with the same primary key
+
+    New rows are inserted with all their values, existing rows only get the fields that were sent
+    updated. Nothing is committed, the caller owns the transaction.
+
+    Args:
+        session (Session): Database session
+        model (SQLModel): Table model
+        rows (list): (values, fields) of each row
+        batch_size (int): Number of rows per statement
+
+    Returns:
+        dict: Number of rows inserted and updated
+    """
+    primary_key = inspect(model).primary_key[0]
+    inserted = 0
+    updated = 0
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        keys = [values[primary_key.name] for values, _ in batch]
+        existing = {key for key, in session.query(primary_key).filter(primary_key.in_(keys)).all()}
+
+        new_rows = [values for values, _ in batch if values[primary_key.name] not in existing]
+
+        # Rows updating the same fields go through the same executemany statement
+        groups = defaultdict(list)
+        for values, fields in batch:
+            if values[primary_key.name] in existing:
+                groups[fields | {primary_key.name}].append({field: values[field] for field in fields | {primary_key.name}})
+
+        if new_rows:
+            session.execute(insert(model), new_rows)
+        for group in groups.values():
+            session.execute(update(model), group)
+
+        inserted += len(new_rows)
+        updated += len(batch) - len(new_rows)
+
+    return {"inserted": inserted, "updated": updated}
+
+
+def prepare_records(model, records, batch_size=1000, offset=0):
+    """
+    Validate records and keep the last one sent for each primary key
+
+    Args:
+        model (SQLModel): Table model
+        records (list): Records to validate
+        batch_size (int): Number of records validated at a time
+        offset (int): Index of the first record in the whole body
+
+    Returns:
+        list: (values, fields) of the rows to upsert
+        list: Errors with the index of the record that failed
+    """
+    valid, errors = validate_records(model, records, batch_size, offset)
+
+    primary_key = inspect(model).primary_key[0].name
+    rows = list({values[primary_key]: (values, fields) for _, values, fields in valid}.values())
+
+    return rows, errors
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache with an optional time to live
+
+    Args:
+        maxsize (int): Maximum number of entries
+        ttl (float): Seconds an entry stays valid, None to keep entries until they are evicted
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get an entry and mark it as recently used
+
+        Args:
+            key (Hashable): Entry key
+            default (Any): Value returned when the entry is missing or expired
+
+        Returns:
+            Any: Cached value
+        """
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None or (self.ttl is not None and entry[1] < time.monotonic()):
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """
+        Add an entry, evicting the least recently used one when the cache is full
+
+        Args:
+            key (Hashable): Entry key
+            value (Any): Value to cache
+        """
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -1,12 +1,55 @@
 from beyond.dates import Date, timedelta
-from geopy.distance import geodesic
 from src.logger import log_function_call_debug , get_logger
+from src.services.metrics import timed_stage
 from beyond.io.tle import Tle
 import numpy as np
 import math
 
 logger = get_logger(__name__)
 
+DEFAULT_SWATH_WIDTH_KM = 290.0 # Sentinel-2 MSI swath, used for satellites without a sensor definition
+
+@timed_stage("propagation")
+def propagate(sat, t_start, t_stop, t_sample):
+    """
+    Propagate a satellite and return its sub-satellite track as arrays
+
+    The TEME positions are rotated to the Earth-fixed frame with the Greenwich mean sidereal time,
+    which is much faster than converting every point to ITRF with beyond and accurate to a few
+    meters on the ground.
+
+    Args:
+        sat (beyond.TLE): Satellite TLE object
+        t_start (str | datetime.datetime): Start time, as %Y-%m-%d %H:%M:%S if a string
+        t_stop (float): Hours to step through
+        t_sample (float): Seconds between samples
+
+    Returns:
+        np.ndarray: Sample times (datetime64)
+        np.ndarray: Latitudes in degrees
+        np.ndarray: Longitudes in degrees
+        np.ndarray: Altitudes in km
+    """
+    if isinstance(t_start, str):
+        t_start = Date.strptime(t_start[:19], '%Y-%m-%d %H:%M:%S')
+    elif not isinstance(t_start, Date):
+        t_start = Date(t_start)
+
+    ephem = sat.orbit().ephem(start=t_start, stop=timedelta(hours=t_stop), step=timedelta(seconds=t_sample))
+    states = np.asarray([np.asarray(point) for point in ephem])
+    x, y, z = states[:, 0], states[:, 1], states[:, 2]
+
+    offsets = np.arange(len(states)) * t_sample
+    times = np.datetime64(t_start.datetime, "us") + (offsets * 1e6).astype("timedelta64[us]")
+
+    gmst = np.radians((280.46061837 + 360.98564736629 * (t_start.jd + offsets / 86400 - 2451545.0)) % 360)
+
+    lats = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    lons = (np.degrees(np.arctan2(y, x) - gmst) + 180) % 360 - 180
+    alts = np.sqrt(x ** 2 + y ** 2 + z ** 2) / 1000 - 6371.0
+
+    return times, lats, lons, alts
+
 @log_function_call_debug(logger)
 def get_ground_track(sat, t_start, t_stop, t_sample, obs_lat, obs_lon):
     """
@@ -24,62 +67,111 @@ def get_ground_track(sat, t_start, t_stop, t_sample, obs_lat, obs_lon):
         list: List of tuples containing lat/lon coordinates
         list: List of tuples containing lat/lon coordinates, distance from observer, date, and satellite
     """
-    ground_track_coords = []
+    times, lats, lons, _ = propagate(sat, t_start, t_stop, t_sample)
+    ground_track_coords = list(zip(lats, lons))
     points = []
 
-    # Calculate the orbit path from the TLE
-    orbit = sat.orbit()
+    # Calculate distance from observer
+    if (obs_lat):
+        distances = distance_km(obs_lat, obs_lon, lats, lons)
+        dates = np.datetime_as_string(times, unit="s")
 
-    t_start = Date.strptime(t_start, '%Y-%m-%d %H:%M:%S')
+        for i in np.argsort(distances, kind="stable"):
+            points.append([(lats[i], lons[i]), distances[i], dates[i].replace("T", " "), sat.name])
 
-    # Step through the orbit and calculate distance from the observer
-    for point in orbit.ephemeris(start=t_start, stop=timedelta(hours=t_stop), step=timedelta(seconds=t_sample)):
-        point.frame = "ITRF"
-        point.form = "spherical"
-        # Convert to Lat/Lon
-        lon, lat = np.degrees(point[1:3])
-        # Satellite footprint
-        ground_track_coords.append((lat, lon))
+    return ground_track_coords, points
 
-        # Calculate distance from observer
-        if (obs_lat):
-            g = geodesic((obs_lat, obs_lon), (lat, lon)).kilometers
-            points.append([(lat, lon), g, point.date.strftime('%Y-%m-%d %H:%M:%S'), sat.name])
+def swath_half_width_km(satellite, altitudes):
+    """
+    Half width of the area a satellite can image across its ground track
 
-            points.sort(key=lambda x: x[1])
+    Args:
+        satellite (Satellite): Satellite with its sensor definition, None to use the default swath
+        altitudes (np.ndarray): Satellite altitudes in km
 
-    return ground_track_coords, points
+    Returns:
+        np.ndarray: Half width in km for each altitude
+    """
+    swath = getattr(satellite, "swath_width_km", None) or DEFAULT_SWATH_WIDTH_KM
+    half_width = np.full(np.shape(altitudes), swath / 2)
+
+    off_nadir = getattr(satellite, "max_off_nadir_deg", None)
+    if off_nadir:
+        half_width = np.maximum(half_width, np.asarray(altitudes) * np.tan(np.radians(off_nadir)))
+
+    return half_width
+
+def find_passes(obs_lat, obs_lon, times, lats, lons, alts, satellite=None, name=None):
+    """
+    Find the passes of a ground track over an observer that fall inside the sensor swath
+
+    A pass is a local minimum of the distance between the observer and the ground track, its
+    across-track distance is measured against the great circle through the neighbouring samples.
+
+    Args:
+        obs_lat (float): Observer latitude
+        obs_lon (float): Observer longitude
+        times (np.ndarray): Sample times
+        lats (np.ndarray): Ground track latitudes
+        lons (np.ndarray): Ground track longitudes
+        alts (np.ndarray): Satellite altitudes in km
+        satellite (Satellite): Satellite with its sensor definition
+        name (str): Satellite name reported with the passes
+
+    Returns:
+        list: List of passes containing the lat/lon coordinates, across-track distance, date and satellite
+    """
+    distances = distance_km(obs_lat, obs_lon, lats, lons)
+
+    # Closest approach of each pass
+    idx = np.where((distances[1:-1] <= distances[:-2]) & (distances[1:-1] < distances[2:]))[0] + 1
+    if len(idx) == 0:
+        return []
+
+    R = 6371.0
+    segment_bearing = bearing(lats[idx - 1], lons[idx - 1], lats[idx + 1], lons[idx + 1])
+    observer_bearing = bearing(lats[idx - 1], lons[idx - 1], obs_lat, obs_lon)
+    across_track = np.abs(R * np.arcsin(
+        np.sin(distances[idx - 1] / R) * np.sin(np.radians(observer_bearing - segment_bearing))
+    ))
+
+    visible = across_track <= swath_half_width_km(satellite, alts[idx])
+    dates = np.datetime_as_string(times[idx], unit="s")
+    name = name or getattr(satellite, "name", None)
+
+    return [
+        [(lats[i], lons[i]), across_track[k], dates[k].replace("T", " "), name]
+        for k, i in enumerate(idx) if visible[k]
+    ]
 
 @log_function_call_debug(logger)
-def get_closest_pass(lat, lon, timedate, tles):
+def get_closest_pass(lat, lon, timedate, tles, hours=24, step=60):
     """
-    Get the closest pass to a given lat/lon
+    Get the passes over a given lat/lon where it falls inside the swath of the satellite sensor
 
     Args:
         lat (float): Latitude
         lon (float): Longitude
         timedate (datetime.datetime): Time to check
-        tles (list): List of TLEs
+        tles (list): List of TLEs, their satellite relationship holds the sensor definition
+        hours (float): Hours to search
+        step (float): Seconds between ground track samples
 
     Returns:
-        list: List of closest passes
+        list: List of passes sorted by across-track distance
     """
 
     overall_closest = []
 
-    # For each TLE, calculate the closest pass
+    # For each TLE, find the passes inside the swath
     for tle in tles:
+        satellite = tle.satellite
         sat = Tle(tle.line1 + "\n" + tle.line2)
 
-        # Get the ground track 
-        _, points = get_ground_track(sat, timedate, 24, 60, lat, lon)
+        times, lats, lons, alts = propagate(sat, timedate, hours, step)
+        overall_closest.extend(find_passes(lat, lon, times, lats, lons, alts, satellite, satellite.name if satellite else str(tle.satellite_id)))
 
-        if len(overall_closest) < 10:
-            overall_closest.append(points[0])
-        else:
-            overall_closest.sort(key=lambda x: x[1])
-            if points[0][1] < overall_closest[-1][1]:
-                overall_closest[-1] = points[0]
+    overall_closest.sort(key=lambda x: x[1])
 
     return overall_closest
 
@@ -134,4 +226,273 @@ def add_distance_to_gps(lat, lon, distance, bearing):
     new_lat = math.degrees(new_lat)
     new_lon = math.degrees(new_lon)
 
-    return new_lat, new_lon
\ No newline at end of file
+    return new_lat, new_lon
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between coordinates, works on scalars and numpy arrays
+
+    Args:
+        lat1 (float | np.ndarray): Latitude of the first point(s)
+        lon1 (float | np.ndarray): Longitude of the first point(s)
+        lat2 (float | np.ndarray): Latitude of the second point(s)
+        lon2 (float | np.ndarray): Longitude of the second point(s)
+
+    Returns:
+        float | np.ndarray: Distance in km
+    """
+    R = 6371.0 # Mean radius of the Earth
+
+    rlat1, rlon1, rlat2, rlon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+
+    a = np.sin((rlat2 - rlat1) / 2) ** 2 + np.cos(rlat1) * np.cos(rlat2) * np.sin((rlon2 - rlon1) / 2) ** 2
+
+    return 2 * R * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def bearing(lat1, lon1, lat2, lon2):
+    """
+    Initial bearing from the first to the second coordinates, works on scalars and numpy arrays
+
+    Args:
+        lat1 (float | np.ndarray): Latitude of the first point(s)
+        lon1 (float | np.ndarray): Longitude of the first point(s)
+        lat2 (float | np.ndarray): Latitude of the second point(s)
+        lon2 (float | np.ndarray): Longitude of the second point(s)
+
+    Returns:
+        float | np.ndarray: Bearing in degrees
+    """
+    rlat1, rlon1, rlat2, rlon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+
+    y = np.sin(rlon2 - rlon1) * np.cos(rlat2)
+    x = np.cos(rlat1) * np.sin(rlat2) - np.sin(rlat1) * np.cos(rlat2) * np.cos(rlon2 - rlon1)
+
+    return np.degrees(np.arctan2(y, x))
+
+def project_positions(lats, lons, courses, speeds, hours):
+    """
+    Dead reckon vessels along great circles, works on arrays that broadcast together
+
+    Vessels with no course or speed (None, NaN, or the AIS "not available" values 360 and 102.3)
+    keep their position.
+
+    Args:
+        lats (float | np.ndarray): Latitudes of the last reports
+        lons (float | np.ndarray): Longitudes of the last reports
+        courses (float | np.ndarray): Courses over ground in degrees
+        speeds (float | np.ndarray): Speeds over ground in knots
+        hours (float | np.ndarray): Hours since the last reports
+
+    Returns:
+        tuple: Latitudes and longitudes
+    """
+    courses = np.asarray(courses, dtype=float)
+    speeds = np.asarray(speeds, dtype=float)
+    known = np.isfinite(courses) & np.isfinite(speeds) & (courses < 360) & (speeds < 102.3)
+
+    R = 6371.0
+    rdist = np.where(known, speeds, 0) * 1.852 * np.maximum(hours, 0) / R
+    brng = np.radians(np.where(known, courses, 0))
+    rlat, rlon = np.radians(lats), np.radians(lons)
+
+    new_lat = np.arcsin(np.sin(rlat) * np.cos(rdist) + np.cos(rlat) * np.sin(rdist) * np.cos(brng))
+    new_lon = rlon + np.arctan2(np.sin(brng) * np.sin(rdist) * np.cos(rlat), np.cos(rdist) - np.sin(rlat) * np.sin(new_lat))
+
+    return np.degrees(new_lat), (np.degrees(new_lon) + 180) % 360 - 180
+
+def position_uncertainty_km(speeds, hours, base_km=1.0, speed_error=0.1, unknown_speed=12.0):
+    """
+    Radius around a dead reckoned position the vessel is expected in, growing with the distance sailed
+
+    Args:
+        speeds (float | np.ndarray): Speeds over ground in knots
+        hours (float | np.ndarray): Hours since the last reports
+        base_km (float): Radius at the time of the report
+        speed_error (float): Fraction of the distance sailed added to the radius
+        unknown_speed (float): Speed in knots assumed in every direction when the speed is not available
+
+    Returns:
+        float | np.ndarray: Radius in km
+    """
+    speeds = np.asarray(speeds, dtype=float)
+    known = np.isfinite(speeds) & (speeds < 102.3)
+    hours = np.maximum(hours, 0)
+
+    return base_km + np.where(known, speed_error * np.where(known, speeds, 0), unknown_speed) * 1.852 * hours
+
+def dead_reckon(lat, lon, course, speed, hours):
+    """
+    Position of a vessel after sailing on a constant course and speed
+
+    Args:
+        lat (float): Latitude of the last report
+        lon (float): Longitude of the last report
+        course (float): Course over ground in degrees, None or 360 (not available) keeps the position
+        speed (float): Speed over ground in knots, None or 102.3 (not available) keeps the position
+        hours (float): Hours since the last report
+
+    Returns:
+        tuple: Tuple containing the lat/lon coordinates
+    """
+    if course is None or speed is None or course >= 360 or speed >= 102.3 or hours <= 0:
+        return lat, lon
+
+    new_lat, new_lon = project_positions(lat, lon, course, speed, hours)
+
+    return float(new_lat), float(new_lon)
+
+def match_vessel_passes(times, lats, lons, alts, vessels, satellite=None, name=None, hours=24, chunk=256, **uncertainty):
+    """
+    Find the passes of a ground track over moving vessels, for every vessel at once
+
+    Each ground track sample is compared with the dead reckoned position of each vessel at the time
+    of the sample. A pass is a local minimum of that distance within the hours following the report
+    of the vessel, and it is kept when the predicted position is inside the swath. The uncertainty of
+    that position is returned with the pass.
+
+    Args:
+        times (np.ndarray): Sample times (datetime64)
+        lats (np.ndarray): Ground track latitudes
+        lons (np.ndarray): Ground track longitudes
+        alts (np.ndarray): Satellite altitudes in km
+        vessels (dict): Arrays of the vessels' last reports: latitude, longitude, course, speed (knots)
+            and time (datetime64)
+        satellite (Satellite): Satellite with its sensor definition
+        name (str): Satellite name reported with the passes
+        hours (float): Hours after its report a vessel is searched for
+        chunk (int): Vessels matched at a time, bounds the memory to chunk x samples
+        **uncertainty: Arguments of position_uncertainty_km
+
+    Returns:
+        list: Passes of each vessel: the lat/lon of the ground track, across-track distance, date,
+            satellite, predicted lat/lon of the vessel and its uncertainty in km
+    """
+    R = 6371.0
+    name = name or getattr(satellite, "name", None)
+    half_width = swath_half_width_km(satellite, alts)
+    dates = np.datetime_as_string(times, unit="s")
+    passes = [[] for _ in range(len(vessels["latitude"]))]
+
+    for start in range(0, len(passes), chunk):
+        rows = slice(start, start + chunk)
+        elapsed = (times[None, :] - vessels["time"][rows, None]) / np.timedelta64(1, "h")
+
+        v_lat, v_lon = project_positions(
+            vessels["latitude"][rows, None], vessels["longitude"][rows, None],
+            vessels["course"][rows, None], vessels["speed"][rows, None], elapsed
+        )
+        distances = distance_km(v_lat, v_lon, lats[None, :], lons[None, :])
+        distances[(elapsed < 0) | (elapsed > hours)] = np.inf
+
+        # Closest approach of each pass
+        minimum = (distances[:, 1:-1] <= distances[:, :-2]) & (distances[:, 1:-1] < distances[:, 2:]) & np.isfinite(distances[:, :-2])
+        vessel, sample = np.nonzero(minimum)
+        sample = sample + 1
+        if len(sample) == 0:
+            continue
+
+        obs_lat, obs_lon = v_lat[vessel, sample], v_lon[vessel, sample]
+        segment_bearing = bearing(lats[sample - 1], lons[sample - 1], lats[sample + 1], lons[sample + 1])
+        observer_bearing = bearing(lats[sample - 1], lons[sample - 1], obs_lat, obs_lon)
+        across_track = np.abs(R * np.arcsin(
+            np.sin(distance_km(lats[sample - 1], lons[sample - 1], obs_lat, obs_lon) / R)
+            * np.sin(np.radians(observer_bearing - segment_bearing))
+        ))
+
+        radius = position_uncertainty_km(vessels["speed"][rows][vessel], elapsed[vessel, sample], **uncertainty)
+        visible = across_track <= half_width[sample]
+
+        for k in np.flatnonzero(visible):
+            passes[start + vessel[k]].append([
+                (lats[sample[k]], lons[sample[k]]), across_track[k], dates[sample[k]].replace("T", " "), name,
+                (obs_lat[k], obs_lon[k]), radius[k]
+            ])
+
+    return passes
+
+@log_function_call_debug(logger)
+def get_vessel_passes(vessels, tles, hours=24, step=60, chunk=256, bucket_hours=6, **uncertainty):
+    """
+    Get the passes of every satellite over every vessel, each satellite is propagated once per bucket
+
+    The vessels are grouped by report time in buckets of bucket_hours, and each bucket is matched
+    against ground tracks covering its own reports only, so a stale report doesn't stretch the
+    propagation of the vessels reported recently.
+
+    Args:
+        vessels (dict): Arrays of the vessels' last reports, see match_vessel_passes
+        tles (list): List of TLEs, their satellite relationship holds the sensor definition
+        hours (float): Hours after its report a vessel is searched for
+        step (float): Seconds between ground track samples
+        chunk (int): Vessels matched at a time
+        bucket_hours (float): Spread of the report times propagated together
+        **uncertainty: Arguments of position_uncertainty_km
+
+    Returns:
+        list: Passes of each vessel sorted by across-track distance plus uncertainty, the furthest
+            the vessel may be from the ground track
+    """
+    passes = [[] for _ in range(len(vessels["latitude"]))]
+    if not passes:
+        return passes
+
+    order = np.argsort(vessels["time"], kind="stable")
+    report_times = vessels["time"][order]
+    width = np.timedelta64(int(bucket_hours * 3600), "s")
+
+    start = 0
+    while start < len(order):
+        end = int(np.searchsorted(report_times, report_times[start] + width, side="right"))
+        bucket = order[start:end]
+        bucket_vessels = {key: np.asarray(values)[bucket] for key, values in vessels.items()}
+
+        first = report_times[start]
+        span = hours + (report_times[end - 1] - first) / np.timedelta64(1, "h")
+
+        for tle in tles:
+            satellite = tle.satellite
+            sat = Tle(tle.line1 + "\n" + tle.line2)
+
+            times, lats, lons, alts = propagate(sat, first.astype("datetime64[us]").item(), span, step)
+            matched = match_vessel_passes(
+                times, lats, lons, alts, bucket_vessels, satellite, satellite.name if satellite else str(tle.satellite_id), hours, chunk, **uncertainty
+            )
+            for index, found in zip(bucket, matched):
+                passes[index].extend(found)
+
+        start = end
+
+    for vessel_passes in passes:
+        vessel_passes.sort(key=lambda x: x[1] + x[5])
+
+    return passes
+
+def point_in_footprint(lat, lon, footprint):
+    """
+    Check whether a coordinate falls inside a footprint with the even-odd rule, so holes are excluded
+
+    Args:
+        lat (float): Latitude
+        lon (float): Longitude
+        footprint (list): Polygons, each a list of rings of (lon, lat) vertices as parsed by parse_footprint
+
+    Returns:
+        bool: True if the coordinate is inside one of the polygons
+    """
+    for polygon in footprint:
+        inside = False
+        for ring in polygon:
+            ring = np.asarray(ring, dtype=float)
+            x1, y1 = ring[:, 0], ring[:, 1]
+            x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+            # Edges crossed by a ray going east from the coordinate
+            straddles = (y1 > lat) != (y2 > lat)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crossing = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= bool(np.count_nonzero(straddles & (lon < crossing)) % 2)
+
+        if inside:
+            return True
+
+    return False
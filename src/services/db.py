@@ -1,14 +1,250 @@
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from sqlalchemy import event, inspect, literal
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.config.settings import get_settings
+import threading
 
 settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+# Geometry columns derived from the latitude/longitude and footprint columns, with their GiST indexes
+POSTGIS_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    *(
+        statement
+        for table in ("aisdata", "vesselstatus", "satpass")
+        for statement in (
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326) "
+            f"GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)) STORED",
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_geom ON {table} USING GIST (geom)",
+        )
+    ),
+    "ALTER TABLE satpass ADD COLUMN IF NOT EXISTS footprint_geom geometry(MultiPolygon, 4326) "
+    "GENERATED ALWAYS AS (ST_Multi(ST_GeomFromText(footprint, 4326))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_satpass_footprint_geom ON satpass USING GIST (footprint_geom)",
+]
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection: WAL so readers don't block the writer, NORMAL sync (safe with
+    WAL), memory mapped reads and a busy timeout instead of failing at once with "database is locked"
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _pool_args(url):
+    """
+    Pool arguments of the settings that apply to the pool of a database URL
+
+    In-memory SQLite uses a single connection pool (SingletonThreadPool or StaticPool), which
+    doesn't take the size, overflow and timeout of a QueuePool.
+
+    Args:
+        url (str): Database URL
+
+    Returns:
+        dict: Keyword arguments for create_engine
+    """
+    url = make_url(url)
+    args = {"pool_recycle": settings.DB_POOL_RECYCLE, "pool_pre_ping": True}
+
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        args.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW, pool_timeout=settings.DB_POOL_TIMEOUT)
+
+    return args
+
+
+def create_db_engine(url):
+    """
+    Create an engine with the profile of its backend, SQLite connections get the pragmas of
+    _sqlite_pragmas and can be shared between the worker threads
+
+    Args:
+        url (str): Database URL
+
+    Returns:
+        Engine: Engine
+    """
+    sqlite = make_url(url).get_backend_name() == "sqlite"
+
+    engine = create_engine(
+        url,
+        echo=settings.DEBUG,
+        connect_args={"check_same_thread": False} if sqlite else {},
+        **_pool_args(url)
+    )
+    if sqlite:
+        event.listen(engine, "connect", _sqlite_pragmas)
+
+    return engine
+
+
+def uses_postgis(bind=None):
+    """
+    Check whether a database holds the PostGIS geometry columns
+
+    Args:
+        bind (Engine): Engine, defaults to the engine of the settings
+
+    Returns:
+        bool: True on PostgreSQL with DB_POSTGIS set
+    """
+    return (bind or engine).dialect.name == "postgresql" and settings.DB_POSTGIS
+
+
+engine = create_db_engine(settings.DATABASE_URL)
+
+_write_lock = threading.Lock()
+_writing = threading.local()
 
 def get_session():
     with Session(engine) as session:
         yield session
 
 
-def init_db():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+@contextmanager
+def write_session(bind=None):
+    """
+    Session for the jobs writing to the database
+
+    SQLite only has one writer at a time, so on SQLite the writers of a process wait for each other
+    here instead of contending for the database lock. The other backends don't serialize.
+
+    A thread holds at most one write session: opening another one inside it (directly or from a
+    helper) raises instead of waiting forever for the lock the thread already holds. Helpers that
+    write within a caller's transaction take the caller's session as an argument.
+
+    Args:
+        bind (Engine): Engine, defaults to the engine of the settings
+
+    Yields:
+        Session: Session, committing is left to the caller
+
+    Raises:
+        RuntimeError: If the thread already holds a write session
+    """
+    if getattr(_writing, "active", False):
+        raise RuntimeError("write_session is not reentrant, pass the open session to the nested writer")
+
+    bind = bind or engine
+    lock = _write_lock if bind.dialect.name == "sqlite" else nullcontext()
+
+    with lock, Session(bind) as session:
+        _writing.active = True
+        try:
+            yield session
+        finally:
+            _writing.active = False
+
+
+def async_database_url(url):
+    """
+    Derive the async driver URL from a sync database URL
+
+    Args:
+        url (str): Sync database URL (sqlite:///..., postgresql://...)
+
+    Returns:
+        str: URL using aiosqlite or asyncpg
+    """
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+")[0]
+
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+
+    return url
+
+
+@lru_cache(maxsize=None)
+def get_async_engine():
+    """
+    Create the async engine used by the API, on first use so that workers don't need the async drivers
+
+    Returns:
+        AsyncEngine: Async engine
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+
+    async_engine = create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        **_pool_args(url)
+    )
+    if make_url(url).get_backend_name() == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+    return async_engine
+
+
+async def get_async_session():
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+def _add_missing_columns(bind):
+    """
+    Add the model columns missing from existing tables, create_all only creates whole tables
+
+    The columns are added as nullable, with their scalar default as the server default so that the
+    existing rows get it, e.g. passes_dirty is set on every vessel of an older database.
+
+    Args:
+        bind (Engine): Engine
+    """
+    inspector = inspect(bind)
+    statements = []
+
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+
+            statement = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+            if column.default is not None and column.default.is_scalar:
+                default = literal(column.default.arg).compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+                statement += f" DEFAULT {default}"
+            statements.append(statement)
+
+            if column.index:
+                statements.append(f"CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})")
+
+    if statements:
+        with bind.begin() as connection:
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+
+
+def init_db(bind=None):
+    """
+    Create the tables and add the columns missing from older databases, and on PostGIS the
+    geometry columns and their indexes
+
+    Args:
+        bind (Engine): Engine, defaults to the engine of the settings
+    """
+    bind = bind or engine
+    SQLModel.metadata.create_all(bind)
+    _add_missing_columns(bind)
+
+    if uses_postgis(bind):
+        with bind.begin() as connection:
+            for statement in POSTGIS_DDL:
+                connection.exec_driver_sql(statement)
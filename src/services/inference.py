@@ -1,21 +1,52 @@
 from src.logger import get_logger, log_function_call_debug
-from rasterio.windows import Window
 import xml.etree.ElementTree as ET
-import matplotlib.pyplot as plt
 from datetime import datetime
-from ultralytics import YOLO
 from pathlib import Path
-import pandas as pd
 import numpy as np
-import rasterio
+import threading
 import requests
 import json
+import re
 import os 
 
+# ultralytics/torch, rasterio, pillow and pandas are imported where they are used so that
+# importing this module stays cheap, the weights are loaded on the first detection
 model_path = os.path.join("assets" , "s2_ship_detection_yolov8_obb.pt")
-model = YOLO(model_path)
 logger = get_logger(__name__)
 
+_model = None
+_model_lock = threading.Lock()
+_inference_lock = threading.Lock() # YOLO predictors keep per-call state, the shared model runs one image at a time
+
+def get_model():
+    """
+    Get the ship detection model, loading the YOLO weights on first use
+
+    Returns:
+        YOLO: ship detection model
+    """
+    global _model
+
+    with _model_lock:
+        if _model is None:
+            from ultralytics import YOLO
+            logger.debug("Loading model %s", model_path)
+            _model = YOLO(model_path)
+
+    return _model
+
+def set_model(model):
+    """
+    Replace the ship detection model, e.g. with a stand-in for the harness and benchmarks
+
+    Args:
+        model: callable: model taking an image path and returning ultralytics OBB results
+    """
+    global _model
+
+    with _model_lock:
+        _model = model
+
 # Tested successfully 
 @log_function_call_debug(logger=logger)
 def authenticate(auth_url, username, password):
@@ -45,6 +76,52 @@ def authenticate(auth_url, username, password):
     else:
         raise Exception("Error Authenticating\nError {}: {}".format(response.status_code, response.text))
 
+def parse_footprint(footprint):
+    """
+    Parse the footprint of a catalogue product
+
+    Args:
+        footprint: dict | str: GeoFootprint (GeoJSON Polygon or MultiPolygon) or Footprint
+            (geography'SRID=4326;POLYGON ((lon lat, ...))' or MULTIPOLYGON)
+    Returns:
+        list: polygons, each a list of rings of (lon, lat) vertices, None if the footprint cannot be parsed
+    """
+    if isinstance(footprint, dict):
+        if footprint.get("type") == "Polygon":
+            return [footprint["coordinates"]]
+        if footprint.get("type") == "MultiPolygon":
+            return footprint["coordinates"]
+        return None
+
+    if not isinstance(footprint, str) or "POLYGON" not in footprint.upper():
+        return None
+
+    # Each polygon is wrapped in ((...)), each of its rings in (...)
+    body = footprint[footprint.upper().index("POLYGON"):]
+    polygons = []
+    for polygon in re.findall(r"\(\s*(\([^()]*\)(?:\s*,\s*\([^()]*\))*)\s*\)", body):
+        polygons.append([
+            [tuple(float(value) for value in vertex.split()[:2]) for vertex in ring.split(",")]
+            for ring in re.findall(r"\(([^()]*)\)", polygon)
+        ])
+
+    return polygons or None
+
+def footprint_wkt(footprint):
+    """
+    Format a footprint parsed by parse_footprint as WKT
+
+    Args:
+        footprint: list: polygons, each a list of rings of (lon, lat) vertices
+    Returns:
+        str: MULTIPOLYGON WKT
+    """
+    polygons = ", ".join(
+        "(" + ", ".join("(" + ", ".join(f"{lon} {lat}" for lon, lat, *_ in ring) + ")" for ring in polygon) + ")"
+        for polygon in footprint
+    )
+    return f"MULTIPOLYGON ({polygons})"
+
 # Tested successfully 
 @log_function_call_debug(logger=logger)
 def query_catalogue(
@@ -67,11 +144,14 @@ def query_catalogue(
         search_period_start: str: start date of the search period
         search_period_end: str: end date of the search period
     Returns:
-        pd.DataFrame: dataframe with the search results
+        pd.DataFrame: dataframe with the search results, the parsed footprint of each product is in
+            the footprint column and its sensing start (naive UTC) in the sensing_start column
     Raises:
         Exception: if the query fails
     """
-    logger.debug(f"test/{catalogue_odata_url}")
+    import pandas as pd
+
+    logger.debug("test/%s", catalogue_odata_url)
     search_period_start = search_period_start.strftime("%Y-%m-%d")
     search_period_end = search_period_end.strftime("%Y-%m-%d")
 
@@ -92,7 +172,18 @@ def query_catalogue(
     if response.status_code != 200:
         raise Exception("Error Querying Catalogue\nError {}: {}".format(response.status_code, response.text))
 
-    return pd.DataFrame.from_dict(response.json().get("value", []))
+    products = pd.DataFrame.from_dict(response.json().get("value", []))
+
+    if "GeoFootprint" in products or "Footprint" in products:
+        geo = products["GeoFootprint"] if "GeoFootprint" in products else pd.Series(None, index=products.index)
+        wkt = products["Footprint"] if "Footprint" in products else pd.Series(None, index=products.index)
+        products["footprint"] = [parse_footprint(g) or parse_footprint(w) for g, w in zip(geo, wkt)]
+
+    if "ContentDate" in products:
+        starts = [date.get("Start") if isinstance(date, dict) else None for date in products["ContentDate"]]
+        products["sensing_start"] = pd.to_datetime(starts, utc=True, errors="coerce").tz_localize(None)
+
+    return products
 # Tested successfully
 @log_function_call_debug(logger=logger)
 def download_manifest(session, product_id, product_name, catalogue_url):
@@ -189,11 +280,11 @@ def download_bands(session, product_id, product_name, band_locations, catalogue_
             bands.append(str(outfile))
 
         else:
-            logger.debug(f"Error Downloading Band {band_parts[3]}\nError {response.status_code}: {response.text}")
+            logger.debug("Error Downloading Band %s\nError %s: %s", band_parts[3], response.status_code, response.text)
 
     return bands
 @log_function_call_debug(logger=logger)
-def generate_composite_image(jp2_patches_dir, output_dir, output_name):
+def generate_composite_image(jp2_patches_dir, output_dir, output_name, stretch=None):
     """
     Generate a composite image from the bands
 
@@ -201,55 +292,60 @@ def generate_composite_image(jp2_patches_dir, output_dir, output_name):
         jp2_patches_dir: str: path to the JP2 patches directory
         output_dir: str: output directory
         output_name: str: output name
+        stretch: tuple: low and high percentiles stretched over the 8-bit range, None to apply the gain
     Returns:
         str: path to the composite image
     """
+    from src.services.raster import composite_rgb
+    from PIL import Image
+    import rasterio
 
     red = None
     green = None
     blue = None
 
-    # Load the bands
-    blue_path = Path(jp2_patches_dir) / f"{output_name}_B02.jp2"
-    green_path = Path(jp2_patches_dir) / f"{output_name}_B03.jp2"
-    red_path = Path(jp2_patches_dir) / f"{output_name}_B04.jp2"
+    # Patches written by create_cropped_patches hold the bands in a single file
+    tile_path = Path(jp2_patches_dir) / f"{output_name}.tif"
 
-    if blue_path.exists():
-        with rasterio.open(blue_path, driver="JP2OpenJPEG") as blue_band:
-            blue = blue_band.read(1)
-    else:
-        logger.debug("Error: Blue band not found")
+    if tile_path.exists():
+        from src.services.raster import read_tile
+        blue, green, red = read_tile(tile_path)[:3]
 
-    if green_path.exists():
-        with rasterio.open(green_path, driver="JP2OpenJPEG") as green_band:
-            green = green_band.read(1)
     else:
-        logger.debug("Error: Green band not found")
+        # Load the bands saved as separate files
+        blue_path = Path(jp2_patches_dir) / f"{output_name}_B02.jp2"
+        green_path = Path(jp2_patches_dir) / f"{output_name}_B03.jp2"
+        red_path = Path(jp2_patches_dir) / f"{output_name}_B04.jp2"
+
+        if blue_path.exists():
+            with rasterio.open(blue_path, driver="JP2OpenJPEG") as blue_band:
+                blue = blue_band.read(1)
+        else:
+            logger.debug("Error: Blue band not found")
 
-    if red_path.exists():
-        with rasterio.open(red_path, driver="JP2OpenJPEG") as red_band:
-            red = red_band.read(1)
-    else:
-        logger.debug("Error: Red band not found")
+        if green_path.exists():
+            with rasterio.open(green_path, driver="JP2OpenJPEG") as green_band:
+                green = green_band.read(1)
+        else:
+            logger.debug("Error: Green band not found")
+
+        if red_path.exists():
+            with rasterio.open(red_path, driver="JP2OpenJPEG") as red_band:
+                red = red_band.read(1)
+        else:
+            logger.debug("Error: Red band not found")
 
 
     if red is None or green is None or blue is None:
         logger.debug("Error: Bands not found")
         return []
 
-    # Normalize the bands
-    gain = 2
-    red_n = np.clip(red * gain / 10000, 0, 1)
-    green_n = np.clip(green * gain / 10000, 0, 1)
-    blue_n = np.clip(blue * gain / 10000, 0, 1)
-
-    # Create the composite image
-    rgb_composite = np.dstack((red_n, green_n, blue_n))
+    # Normalize the bands straight into an 8-bit RGB buffer
+    rgb_composite = composite_rgb(red, green, blue, gain=2, stretch=stretch)
 
     # Save the composite image
     output_image_path_rgb = Path(output_dir) / f"{output_name}_RGB.jpg"
-    plt.imshow(output_image_path_rgb, rgb_composite)
-    plt.close()
+    Image.fromarray(rgb_composite).save(output_image_path_rgb)
     return output_image_path_rgb
 
 @log_function_call_debug(logger=logger)
@@ -257,63 +353,43 @@ def create_cropped_patches(bands, patch_size=(100,100), output_dir=None, output_
     """
     Create cropped patches from the bands
 
+    Each band is decoded once in block-aligned strips and every patch is written as a single
+    multi-band GeoTIFF holding the bands in the order they were given.
+
     Args:
-        bands: list: list of band paths
+        bands: list: list of band paths (B02, B03, B04)
         patch_size: tuple: size of the patch
         output_dir: str: output directory
         output_name: str: output name
         step_size: tuple: step size
     Returns:
-        list: list of patch names
-    Raises:
-        Exception: if the band is not found or the patch size is larger than the band size
+        list: list of patch names, a patch is saved as {patch_name}.tif
     """
+    from src.services.raster import SceneTiler
+    import rasterio
 
-    # Get the patch size and step size
     x_size, y_size = patch_size
-    vertical_step, horizontal_step = step_size
     patch_names = []
 
-    # Load the bands
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-    # Create the patches
-    for n, band_file in enumerate(bands, start=2):
-        try:
-            # Open the band
-            with rasterio.open(band_file, driver="JP2OpenJPEG") as full_band:
-                # Get the band size
-                full_width, full_height = full_band.width, full_band.height
-
-                # Check if the patch size is larger than the band size
-                if x_size > full_width or y_size > full_height:
-                    logger.debug(f"Error: Patch size is larger than the band size")
-                    continue
-
-                # Create the patches
-                for y_off in range(0, full_height, vertical_step):
-                    for x_off in range(0, full_width, horizontal_step):
-                        window = Window(x_off, y_off, x_size, y_size)
-                        transform = full_band.window_transform(window)
-                        profile = full_band.profile
-                        profile.update({
-                            "height": y_size,
-                            "width": x_size,
-                            "transform": transform
-                        })
-
-                        patch_band_name = f"{output_name}_patch_y{y_off}_x{x_off}_B0{n}.jp2"
-                        patch_file_name = Path(output_dir) / patch_band_name
-
-                        patch_name = patch_file_name.split("_band")[0]
-                        patch_names.append(patch_name)
-
-                        with rasterio.open(patch_file_name, "w", **profile) as patch_band:
-                            patch_band.write(full_band.read(window=window))
-
-        except (rasterio.errors.RasterioIOError, FileNotFoundError) as e:
-            logger.debug(f"Error: Band {n} not found: {e}")
-            continue
+    # Band names (B02, ...) from the downloaded file names
+    descriptions = [Path(band).stem.split("_")[-1] for band in bands]
+
+    try:
+        with SceneTiler(bands, patch_size, step_size) as scene:
+            # Check if the patch size is larger than the band size
+            if x_size > scene.width or y_size > scene.height:
+                logger.debug("Error: Patch size is larger than the band size")
+                return patch_names
+
+            for y_off, x_off, tile, transform in scene.tiles():
+                patch_name = f"{output_name}_patch_y{y_off}_x{x_off}"
+                scene.write_tile(Path(output_dir) / f"{patch_name}.tif", tile, transform, descriptions)
+                patch_names.append(patch_name)
+
+    except (rasterio.errors.RasterioIOError, FileNotFoundError) as e:
+        logger.debug("Error: Band not found: %s", e)
 
     return patch_names
 
@@ -334,6 +410,9 @@ def run_ship_detection(image_path):
     """
     Run ship detection on an image
 
+    The model is shared between the pipeline threads and its predictor is not thread-safe, so the
+    inference call holds a lock. Loading the images and saving the results still run in parallel.
+
     Args:
         image_path: str: path to the image
     Returns:
@@ -348,19 +427,20 @@ def run_ship_detection(image_path):
     os.makedirs(labels_results_dir, exist_ok=True)
     os.makedirs(inference_results_dir, exist_ok=True)
 
-    results = model(image_path)
+    model = get_model()
+    with _inference_lock:
+        results = model(image_path)
 
     result = results[0]
 
-    file_name = image_path.name
+    file_name = Path(image_path).name
 
     result_path = os.path.join(inference_results_dir, file_name)
-    results.save(result_path)
+    result.save(filename=result_path)
 
-    label_file = file_name.replace(".jpg", ".txt").replace(".jpeg", ".txt").replace(".png", ".txt")
-    label_file_path = os.path.join(labels_results_dir, label_file)
+    label_file_path = _label_file_path(image_path)
 
-    width, height = result.orig_shape
+    height, width = result.orig_shape
     with open(label_file_path, "w") as f:
         for box in result.obb:
             class_id = int(box.cls.item())
@@ -373,4 +453,41 @@ def run_ship_detection(image_path):
 
             f.write(f"{class_id} {' '.join(map(str, normalized_points))}\n")
 
-    return result_path
\ No newline at end of file
+    return result_path
+
+def _label_file_path(image_path):
+    """
+    Path of the label file written by run_ship_detection for an image
+
+    Args:
+        image_path: str: path to the image
+    Returns:
+        Path: path to the label file
+    """
+    file_name = Path(image_path).name
+    label_file = file_name.replace(".jpg", ".txt").replace(".jpeg", ".txt").replace(".png", ".txt")
+    return Path.cwd() / "assets" / "results" / "labels" / label_file
+
+@log_function_call_debug(logger=logger)
+def load_detections(image_path):
+    """
+    Load the detections saved by run_ship_detection for an image
+
+    Args:
+        image_path: str: path to the image
+    Returns:
+        list: list of detections with the class id and the normalized corner points of the box
+    """
+    label_file_path = _label_file_path(image_path)
+
+    if not label_file_path.exists():
+        return []
+
+    detections = []
+    for line in label_file_path.read_text().splitlines():
+        values = line.split()
+        if not values:
+            continue
+        detections.append({"class_id": int(values[0]), "points": [float(v) for v in values[1:]]})
+
+    return detections
@@ -1,89 +1,151 @@
 from celery import Celery
-from src.services.db import get_session
+from sqlalchemy import or_, cast, func, String
+from src.services.db import get_session, write_session
+from src.services.pipeline import fan_out, RateLimiter
+from src.services.tle import tle_epoch, latest_tle_subquery
+from src.services.metrics import timed, timed_stage, ROWS, BYTES
 from src.config.settings import get_settings
 from src.schemas.data_schema import AISData, TLE, Satellite
+from src.logger import get_logger
 import json, tempfile, os, bz2
 import urllib.request
-from tqdm import tqdm
-from datetime import datetime
+from datetime import datetime, timedelta
 import requests
 
 settings = get_settings()
+logger = get_logger(__name__)
 app = Celery("ingestion", broker="redis://localhost:6379/0")
 
 
 @app.task
 def ingest_AIS_data():
     try:
-        datafile = tempfile.mkstemp(prefix="aishub-data-")
-        os.write(datafile[0], urllib.request.urlopen(settings.AISHUB_URL).read())
-
-        with bz2.open(datafile[1], "rt", encoding="utf-8") as f:
-            data = json.load(f)
-
-        row_count = 0
-
-        with next(get_session()) as session:
-            #with alive_bar(len(data[1])) as bar:
-                for ship in data[1]:
-                    #ship = data[1][i]
-                    #try:
-                    row_count += 1
-
-                    time = datetime.strptime(ship["TIME"], "%Y-%m-%d %H:%M:%S %Z")
-
-                    ais_data = AISData(
-                        mmsi=ship["MMSI"],
-                        timestamp=time,
-                        latitude=ship["LATITUDE"],
-                        longitude=ship["LONGITUDE"],
-                        cog=ship["COG"],
-                        sog=ship["SOG"],
-                        imo=ship["IMO"],
-                        heading=ship["ROT"],
-                        navstat=ship["NAVSTAT"],
-                        name=ship["NAME"],
-                        callsign=ship["CALLSIGN"],
-                        vessel_type=ship["TYPE"],
-                        a=ship["A"],
-                        b=ship["B"],
-                        c=ship["C"],
-                        d=ship["D"],
-                        draught=ship["DRAUGHT"],
-                        destination=ship["DEST"],
-                        eta=ship["ETA"]
-                    )
-
-                    session.add(ais_data)
-                    session.commit()
-
-        os.unlink(datafile[1])
+        with timed("ingest"):
+            datafile = tempfile.mkstemp(prefix="aishub-data-")
+            payload = urllib.request.urlopen(settings.AISHUB_URL).read()
+            os.write(datafile[0], payload)
+            BYTES.labels("ingest").inc(len(payload))
 
+            with bz2.open(datafile[1], "rt", encoding="utf-8") as f:
+                data = json.load(f)
+
+            row_count = 0
+
+            with write_session() as session:
+                #with alive_bar(len(data[1])) as bar:
+                    for ship in data[1]:
+                        #ship = data[1][i]
+                        #try:
+                        row_count += 1
+
+                        time = datetime.strptime(ship["TIME"], "%Y-%m-%d %H:%M:%S %Z")
+
+                        ais_data = AISData(
+                            mmsi=ship["MMSI"],
+                            timestamp=time,
+                            latitude=ship["LATITUDE"],
+                            longitude=ship["LONGITUDE"],
+                            cog=ship["COG"],
+                            sog=ship["SOG"],
+                            imo=ship["IMO"],
+                            heading=ship["ROT"],
+                            navstat=ship["NAVSTAT"],
+                            name=ship["NAME"],
+                            callsign=ship["CALLSIGN"],
+                            vessel_type=ship["TYPE"],
+                            a=ship["A"],
+                            b=ship["B"],
+                            c=ship["C"],
+                            d=ship["D"],
+                            draught=ship["DRAUGHT"],
+                            destination=ship["DEST"],
+                            eta=ship["ETA"]
+                        )
+
+                        session.add(ais_data)
+                        session.commit()
+
+            os.unlink(datafile[1])
+            ROWS.labels("ingest").inc(row_count)
+
+    except Exception as e:
+        logger.error(f"Error ingesting AIS data: {e}")
+
+def _fetch_tle(satellite_id, limiter):
+    """
+    Fetch the current TLE of a satellite from N2YO
+
+    Args:
+        satellite_id (int): NORAD id of the satellite
+        limiter (RateLimiter): Rate limiter shared by the fetching threads
+
+    Returns:
+        tuple: (line1, line2), None if the request failed
+    """
+    limiter.acquire()
+
+    try:
+        response = requests.get(f"{settings.N2YO_URL}/tle/{satellite_id}&apiKey={settings.N2YO_API_KEY}", timeout=30)
+        response.raise_for_status()
+        lines = response.json()["tle"].splitlines()
+        return lines[0], lines[1]
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error(f"Error fetching TLE for {satellite_id}: {e}")
+        return None
+
 
 @app.task
+@timed_stage("tle")
 def fetch_tles():
+    """
+    Refresh the TLEs of the satellites not checked for TLE_MAX_AGE_HOURS
+
+    The stale satellites are selected with a single query, fetched concurrently over
+    TLE_FETCH_WORKERS threads within the N2YO rate limit, and only element sets with a newer
+    epoch than the stored one are inserted. Every successful fetch records its time on the
+    satellite, so an unchanged element set is not fetched again before TLE_MAX_AGE_HOURS.
+
+    Returns:
+        int: Number of new TLEs
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.TLE_MAX_AGE_HOURS)
+
     with next(get_session()) as session:
-        for satellite in session.query(Satellite).all():
-            print(f"Fetching TLE for {satellite.name}")
-            past_tles = session.query(TLE).filter(TLE.satellite_id == satellite.id).all()
-            for past_tle in past_tles:
-                if datetime.strptime(past_tle.created_at.split(".")[0], "%Y-%m-%d %H:%M:%S").date() == datetime.now().date():
-                    print("TLE already fetched today")
-                    continue
-            tle = requests.get(f"https://api.n2yo.com/rest/v1/satellite/tle/{satellite.id}&apiKey={settings.N2YO_API_KEY}").json()
-            line1 = tle["tle"].splitlines()[0]
-            line2 = tle["tle"].splitlines()[1]
-            new_tle = TLE(
-                    satellite_id=satellite.id,
-                    line1=line1,
-                    line2=line2
-                    )
-
-            update_sat = session.query(Satellite).filter(Satellite.id == satellite.id).first()
-            update_sat.tles.append(new_tle)
-
-            session.add(update_sat)
-            session.add(new_tle)
-            session.commit()
+        latest = latest_tle_subquery()
+        checked_at = func.coalesce(Satellite.tle_checked_at, latest.c.created_at)
+        stale = (
+            session.query(Satellite.id, Satellite.name, latest.c.line1)
+            .outerjoin(latest, latest.c.satellite_id == cast(Satellite.id, String))
+            .filter(or_(checked_at == None, checked_at < str(cutoff)))
+            .all()
+        )
+
+    logger.debug("Fetching TLEs for %d satellites", len(stale))
+
+    limiter = RateLimiter(settings.N2YO_REQUESTS_PER_HOUR / 3600, burst=settings.TLE_FETCH_WORKERS)
+    fetched = fan_out(lambda satellite: _fetch_tle(satellite.id, limiter), stale, workers=settings.TLE_FETCH_WORKERS)
+
+    new_tles = []
+    checked = []
+    for satellite, lines in zip(stale, fetched):
+        if lines is None:
+            continue
+        checked.append(satellite.id)
+
+        # Skip element sets that did not change since the last fetch
+        if satellite.line1 is not None and tle_epoch(lines[0]) <= tle_epoch(satellite.line1):
+            logger.debug("TLE for %s is unchanged", satellite.name)
+            continue
+
+        new_tles.append(TLE(satellite_id=satellite.id, line1=lines[0], line2=lines[1]))
+
+    with write_session() as session:
+        session.add_all(new_tles)
+        session.query(Satellite).filter(Satellite.id.in_(checked)).update({Satellite.tle_checked_at: str(now)}, synchronize_session=False)
+        session.commit()
+
+    ROWS.labels("tle").inc(len(new_tles))
+    logger.debug("Saved %d new TLEs", len(new_tles))
+
+    return len(new_tles)
@@ -0,0 +1,115 @@
+from src.config.settings import get_settings
+from src.logger import get_logger
+from pathlib import Path
+import numpy as np
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+# Water class of the L2A scene classification (SCL), clouds, shadows and land use the other classes
+SCL_WATER = 6
+
+
+def cloud_mask_location(band_location):
+    """
+    Location of the L1C classification mask (opaque clouds, cirrus) of the granule holding a band
+
+    Args:
+        band_location (str): Band location from the manifest, GRANULE/<granule>/IMG_DATA/<file>
+
+    Returns:
+        str: Mask location, GRANULE/<granule>/QI_DATA/MSK_CLASSI_B00.jp2
+    """
+    parts = band_location.split("/")
+    return "/".join(parts[:2] + ["QI_DATA", "MSK_CLASSI_B00.jp2"])
+
+
+def _resample(path, transform, crs, shape):
+    """
+    Read every band of a raster resampled (nearest) onto a grid
+
+    Args:
+        path (str): Raster path
+        transform (Affine): Transform of the grid
+        crs (CRS): CRS of the grid
+        shape (tuple): (height, width) of the grid
+
+    Returns:
+        np.ndarray: (bands, height, width) array, zero outside the raster
+    """
+    import rasterio
+    from rasterio.warp import reproject, Resampling
+
+    with rasterio.open(path) as src:
+        indexes = list(range(1, src.count + 1))
+        out = np.zeros((len(indexes), *shape), dtype=src.dtypes[0])
+        reproject(rasterio.band(src, indexes), out, dst_transform=transform, dst_crs=crs, resampling=Resampling.nearest)
+
+    return out
+
+
+def visible_water_fraction(tile_path, cloud_mask_path=None, land_mask_path=None, grid=None):
+    """
+    Fraction of a tile showing cloud free water, estimated on a coarse grid
+
+    Pixels without data are never visible. The cloud mask is either the L1C MSK_CLASSI raster
+    (any non zero opaque cloud or cirrus flag is cloudy) or an L2A SCL raster (only the water class
+    is kept). Non zero pixels of the land mask are land, the land mask can use any CRS.
+
+    Args:
+        tile_path (str): Multi-band tile written by create_cropped_patches
+        cloud_mask_path (str): MSK_CLASSI or SCL raster of the scene, None to skip cloud masking
+        land_mask_path (str): Static land mask raster, None to skip land masking
+        grid (int): Size of the grid, defaults to MASK_GRID_SIZE
+
+    Returns:
+        float: Fraction between 0 and 1
+    """
+    import rasterio
+    from rasterio.enums import Resampling
+
+    grid = grid or settings.MASK_GRID_SIZE
+
+    with rasterio.open(tile_path) as tile:
+        transform = tile.transform * tile.transform.scale(tile.width / grid, tile.height / grid)
+        crs = tile.crs
+        visible = (tile.read(out_shape=(tile.count, grid, grid), resampling=Resampling.nearest) > 0).all(axis=0)
+
+    if cloud_mask_path:
+        mask = _resample(cloud_mask_path, transform, crs, (grid, grid))
+        if "SCL" in Path(cloud_mask_path).name:
+            visible &= mask[0] == SCL_WATER
+        else:
+            visible &= ~(mask[:2] > 0).any(axis=0)
+
+    if land_mask_path:
+        visible &= ~(_resample(land_mask_path, transform, crs, (grid, grid))[0] > 0)
+
+    return float(visible.mean())
+
+
+def filter_tiles(patch_dir, patch_names, cloud_mask_path=None, land_mask_path=None, min_fraction=None):
+    """
+    Keep the tiles with enough cloud free water to be worth running ship detection on
+
+    Args:
+        patch_dir (str): Directory holding the tiles
+        patch_names (list): Tile names, a tile is saved as {name}.tif
+        cloud_mask_path (str): MSK_CLASSI or SCL raster of the scene
+        land_mask_path (str): Static land mask raster
+        min_fraction (float): Minimum visible water fraction, defaults to MIN_VISIBLE_WATER_FRACTION
+
+    Returns:
+        list: Names of the tiles kept
+    """
+    min_fraction = settings.MIN_VISIBLE_WATER_FRACTION if min_fraction is None else min_fraction
+
+    kept = []
+    for name in patch_names:
+        fraction = visible_water_fraction(Path(patch_dir) / f"{name}.tif", cloud_mask_path, land_mask_path)
+        if fraction >= min_fraction:
+            kept.append(name)
+        else:
+            logger.debug("Skipping tile %s: %.1f%% visible water", name, fraction * 100)
+
+    return kept
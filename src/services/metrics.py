@@ -0,0 +1,131 @@
+from contextlib import contextmanager, nullcontext
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, multiprocess, start_http_server
+from src.config.settings import get_settings
+from src.logger import get_logger
+import functools
+import time
+import os
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+ROWS = Counter("pipeline_rows_total", "Rows processed by each pipeline stage", ["stage"])
+BYTES = Counter("pipeline_bytes_total", "Bytes downloaded or written by each pipeline stage", ["stage"])
+DETECTIONS = Counter("pipeline_detections_total", "Ships detected")
+TILES = Counter("pipeline_tiles_total", "Tiles kept for ship detection or masked out as cloud or land", ["outcome"])
+UNITS = Counter("pipeline_units_total", "Pipeline units by stage and final state", ["stage", "state"])
+
+_tracer = None
+_tracer_unavailable = False # opentelemetry failed to import, warned once
+
+
+def get_tracer():
+    """
+    OpenTelemetry tracer used for the stage spans
+
+    Returns:
+        Tracer: Tracer, None when OTEL_ENABLED is off or opentelemetry is not installed
+    """
+    global _tracer, _tracer_unavailable
+
+    if not settings.OTEL_ENABLED or _tracer_unavailable:
+        return None
+
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            logger.warning("OTEL_ENABLED is set but opentelemetry-api is not installed")
+            _tracer_unavailable = True
+            return None
+        _tracer = trace.get_tracer("processing")
+
+    return _tracer
+
+
+@contextmanager
+def timed(stage, **attributes):
+    """
+    Time a block into the pipeline_stage_seconds histogram and trace it as a span when enabled
+
+    Args:
+        stage (str): Stage label
+        **attributes: Attributes attached to the span
+    """
+    tracer = get_tracer()
+    span = tracer.start_as_current_span(f"pipeline.{stage}", attributes=attributes) if tracer else nullcontext()
+    start = time.perf_counter()
+
+    try:
+        with span:
+            yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def timed_stage(stage):
+    """
+    Decorator timing every call of a function as a pipeline stage
+
+    Args:
+        stage (str): Stage label
+
+    Returns:
+        Callable: Decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _registry():
+    # With PROMETHEUS_MULTIPROC_DIR set, the metrics of every process sharing the directory
+    # (API and workers) are aggregated
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+
+    return REGISTRY
+
+
+def latest_metrics():
+    """
+    Render the metrics in the Prometheus text format
+
+    When PROMETHEUS_MULTIPROC_DIR is set the metrics of every process sharing the directory
+    (API and workers) are aggregated.
+
+    Returns:
+        bytes: Metrics
+    """
+    return generate_latest(_registry())
+
+
+def start_metrics_server(port=None):
+    """
+    Serve the metrics of the process over HTTP, for the worker which has no API
+
+    Args:
+        port (int): Port, defaults to WORKER_METRICS_PORT, nothing is served if 0 or None
+
+    Returns:
+        int: Port served, None if disabled
+    """
+    port = settings.WORKER_METRICS_PORT if port is None else port
+    if not port:
+        return None
+
+    start_http_server(port, registry=_registry())
+    logger.info("Serving metrics on port %d", port)
+    return port
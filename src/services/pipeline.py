@@ -0,0 +1,168 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import time
+from src.services.db import write_session
+from src.schemas.data_schema import PipelineUnit, Watermark
+from src.services.metrics import UNITS
+from src.config.settings import get_settings
+from src.logger import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+
+def run_unit(key, stage, func, *args):
+    """
+    Run an idempotent unit of work and persist its state
+
+    A unit that already finished returns its stored result without running again, and a unit
+    that failed more than PIPELINE_MAX_ATTEMPTS times is skipped, so a cycle can be retried or
+    resumed after a restart without repeating work.
+
+    Args:
+        key (str): Unique key of the unit
+        stage (str): Pipeline stage the unit belongs to
+        func (Callable): Function doing the work, must return a JSON serialisable dict
+        *args: Arguments passed to func
+
+    Returns:
+        dict: Result of the unit, None if the unit failed or was skipped
+    """
+    # The unit state is written in two short transactions around the work so that the database
+    # is not held while the unit runs
+    with write_session() as session:
+        unit = session.query(PipelineUnit).filter(PipelineUnit.key == key).first()
+
+        if unit is None:
+            unit = PipelineUnit(key=key, stage=stage)
+        elif unit.state == "done":
+            return unit.result
+        elif unit.state == "failed" and unit.attempts >= settings.PIPELINE_MAX_ATTEMPTS:
+            logger.debug("Skipping %s: gave up after %d attempts", key, unit.attempts)
+            return None
+
+        unit.state = "running"
+        unit.attempts += 1
+        unit.updated_at = datetime.utcnow()
+        session.add(unit)
+        session.commit()
+        unit_id = unit.id
+
+    try:
+        result = func(*args)
+    except Exception as e:
+        logger.error(f"Unit {key} failed: {e}")
+        state, error, result = "failed", str(e), None
+    else:
+        state, error = "done", None
+
+    with write_session() as session:
+        unit = session.get(PipelineUnit, unit_id)
+        unit.state = state
+        unit.error = error
+        if state == "done":
+            unit.result = result
+        unit.updated_at = datetime.utcnow()
+        session.add(unit)
+        session.commit()
+
+    UNITS.labels(stage, state).inc()
+
+    return result
+
+
+def get_watermark(session, name):
+    """
+    Last id processed by an incremental job
+
+    Args:
+        session (Session): Database session
+        name (str): Name of the watermark
+
+    Returns:
+        int: Last id processed, 0 if the job never ran
+    """
+    watermark = session.get(Watermark, name)
+    return watermark.value if watermark else 0
+
+
+def set_watermark(session, name, value):
+    """
+    Move the watermark of an incremental job, committed with the session
+
+    Args:
+        session (Session): Database session
+        name (str): Name of the watermark
+        value (int): Last id processed
+    """
+    watermark = session.get(Watermark, name) or Watermark(name=name)
+    watermark.value = value
+    watermark.updated_at = datetime.utcnow()
+    session.add(watermark)
+
+
+def fan_out(func, items, workers=None):
+    """
+    Run func over items in parallel and gather the results in order
+
+    Args:
+        func (Callable): Function taking a single item
+        items (list): Items to process
+        workers (int): Number of worker threads, defaults to PIPELINE_WORKERS
+
+    Returns:
+        list: Results of func for each item
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = workers or settings.PIPELINE_WORKERS
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def chord(func, items, callback, workers=None):
+    """
+    Fan out func over items and pass the gathered results to callback
+
+    Args:
+        func (Callable): Function taking a single item
+        items (list): Items to process
+        callback (Callable): Function receiving the list of results
+        workers (int): Number of worker threads, defaults to PIPELINE_WORKERS
+
+    Returns:
+        Any: Result of the callback
+    """
+    return callback(fan_out(func, items, workers))
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting how often a remote API is called
+
+    Args:
+        rate (float): Requests allowed per second
+        burst (int): Requests allowed back to back before the rate applies
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request is allowed"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0
+            self._tokens -= 1
+
+        if wait > 0:
+            time.sleep(wait)
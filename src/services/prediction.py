@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from src.services.cache import LRUCache
+from src.config.settings import get_settings
+
+settings = get_settings()
+
+prediction_cache = LRUCache(maxsize=settings.PREDICTION_CACHE_SIZE, ttl=settings.PREDICTION_CACHE_TTL_SECONDS)
+
+_executor = None
+
+
+def get_executor():
+    """
+    Pool running the pass predictions, a process pool unless PREDICTION_WORKERS is 0
+
+    Returns:
+        Executor: Shared executor
+    """
+    global _executor
+
+    if _executor is None:
+        if settings.PREDICTION_WORKERS > 0:
+            _executor = ProcessPoolExecutor(max_workers=settings.PREDICTION_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=1)
+
+    return _executor
+
+
+def shutdown_executor():
+    """Stop the prediction pool if it was started"""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+def cache_key(lat, lon, start, hours, satellites):
+    """
+    Key of a prediction: location rounded to PREDICTION_LOCATION_DECIMALS, start floored to the
+    PREDICTION_TIME_BUCKET_MINUTES bucket, and for each satellite the id of the TLE used and its
+    sensor definition, so editing a swath invalidates the predictions
+
+    Args:
+        lat (float): Latitude
+        lon (float): Longitude
+        start (datetime): Start of the prediction
+        hours (float): Hours to predict
+        satellites (list): Satellites with the id of their latest TLE and their sensor definition
+
+    Returns:
+        tuple: (key, rounded lat, rounded lon, bucketed start)
+    """
+    lat = round(lat, settings.PREDICTION_LOCATION_DECIMALS)
+    lon = round(lon, settings.PREDICTION_LOCATION_DECIMALS)
+
+    bucket = timedelta(minutes=settings.PREDICTION_TIME_BUCKET_MINUTES)
+    start = datetime.min + (start - datetime.min) // bucket * bucket
+
+    version = tuple(sorted(
+        (satellite["name"], satellite["tle_id"], satellite.get("swath_width_km"), satellite.get("max_off_nadir_deg"))
+        for satellite in satellites
+    ))
+
+    return (lat, lon, start, hours, version), lat, lon, start
+
+
+def predict_passes(lat, lon, start, hours, satellites):
+    """
+    Predict the passes of satellites whose swath covers a location
+
+    Runs in the prediction pool, so it only takes plain values.
+
+    Args:
+        lat (float): Latitude
+        lon (float): Longitude
+        start (datetime): Start of the prediction
+        hours (float): Hours to predict
+        satellites (list): Satellites with their name, TLE lines and sensor definition
+
+    Returns:
+        list: Passes sorted by time
+    """
+    from beyond.io.tle import Tle
+    from src.services.calculations import propagate, find_passes
+
+    passes = []
+
+    for satellite in satellites:
+        sensor = SimpleNamespace(**satellite)
+        times, lats, lons, alts = propagate(Tle(satellite["line1"] + "\n" + satellite["line2"]), start, hours, 30)
+
+        for (pass_lat, pass_lon), across_track, timestamp, name in find_passes(lat, lon, times, lats, lons, alts, sensor):
+            passes.append({
+                "satellite": name,
+                "timestamp": timestamp,
+                "latitude": float(pass_lat),
+                "longitude": float(pass_lon),
+                "across_track_km": float(across_track),
+            })
+
+    return sorted(passes, key=lambda p: p["timestamp"])
@@ -1,14 +1,34 @@
 from celery import Celery
 from datetime import datetime, timedelta
-from src.services.db import get_session
-from src.schemas.data_schema import Vessel, VesselStatus, SatPass, TLE, Satellite, AISData
-from src.services.calculations import get_closest_pass, add_distance_to_gps
-from src.services.inference import generate_composite_image , run_ship_detection
-from src.services.inference import *
+from src.services.db import get_session, write_session
+from src.schemas.data_schema import Vessel, VesselStatus, SatPass, TLE, Satellite, AISData, Detection, Track
+from src.services.calculations import get_vessel_passes, add_distance_to_gps, distance_km, point_in_footprint
+from src.services.inference import (
+    authenticate,
+    query_catalogue,
+    download_manifest,
+    parse_manifest,
+    download_bands,
+    create_cropped_patches,
+    generate_composite_image,
+    run_ship_detection,
+    load_detections,
+    footprint_wkt,
+    save_to_file
+)
+from src.services.masks import cloud_mask_location, filter_tiles
+from src.services.pipeline import run_unit, fan_out, get_watermark, set_watermark
+from src.services.tle import latest_tle_subquery
+from src.services.tracks import position_at
+from src.services.metrics import timed, timed_stage, ROWS, BYTES, DETECTIONS, TILES
+from sqlalchemy.orm import selectinload
 from src.config.settings import get_settings
-from tqdm import tqdm
 from src.logger import get_logger
-import logging
+from pathlib import Path
+import threading
+import requests
+import numpy as np
+import re
 
 
 
@@ -18,6 +38,9 @@ logger = get_logger(__name__)
 
 app = Celery('tasks', broker='redis://localhost:6379/0')
 
+# Watermark of the AISData rows already turned into vessel statuses
+VESSELS_WATERMARK = "process_vessel_data"
+
 
 
 
@@ -25,18 +48,22 @@ def is_data_valid(data):
     pass 
 
 @app.task(bind=True, max_retries=3, default_retry_delay=30)
+@timed_stage("vessels")
 def process_vessel_data(self):
     """
     Process AIS data and parse into Vessel and VesselStatus
+
+    Only the rows ingested since the last run (above the vessels watermark) are read.
     """
 
-    with next(get_session()) as session:
-        ais_data = session.query(AISData).all()
+    with write_session() as session:
+        watermark = get_watermark(session, VESSELS_WATERMARK)
+        ais_data = session.query(AISData).filter(AISData.id > watermark).order_by(AISData.id).all()
         
-        logger.debug(f"Processing {len(ais_data)} AIS data entries")
+        logger.debug("Processing %d AIS data entries", len(ais_data))
 
         for data in ais_data:
-            logger.debug(f"Processing vessel data for {data.name}")
+            logger.debug("Processing vessel data for %s", data.name)
             vessel = session.query(Vessel).filter(Vessel.imo == data.imo).first()
 
             if not vessel:
@@ -52,214 +79,585 @@ def process_vessel_data(self):
                     year_built=None
                     )
 
-                status = VesselStatus(
-                    imo=data.imo,
-                    freshness=data.timestamp,
-                    latitude=data.latitude,
-                    longitude=data.longitude,
-                    speed=data.sog,
-                    course=data.cog,
-                    status=data.navstat,
-                    tonnage=None,
-                    draught=data.draught
-                    )
+            elif vessel.latest_status_id is not None:
+                latest = session.get(VesselStatus, vessel.latest_status_id)
+                if _parse_time(data.timestamp) <= _parse_time(latest.freshness):
+                    continue
 
-            elif datetime.strptime(data.timestamp, "%Y-%m-%d %H:%M:%S") < datetime.strptime(vessel.statuses[-1].freshness, "%Y-%m-%d %H:%M:%S"):
-                status = VesselStatus(
-                    imo=data.imo,
-                    freshness=data.timestamp,
-                    latitude=data.latitude,
-                    longitude=data.longitude,
-                    speed=data.sog,
-                    course=data.cog,
-                    status=data.navstat,
-                    tonnage=None,
-                    draught=data.draught
-                    )
+            status = VesselStatus(
+                imo=data.imo,
+                freshness=data.timestamp,
+                latitude=data.latitude,
+                longitude=data.longitude,
+                speed=data.sog,
+                course=data.cog,
+                status=data.navstat,
+                tonnage=None,
+                draught=data.draught
+                )
 
+            # The status refers to the vessel by imo, appending it to vessel.statuses would load the
+            # whole history of the vessel
             session.add(vessel)
+            session.add(status)
             session.commit()
 
-            vessel.statuses.append(status)
-            session.add(status)
+            vessel.latest_status_id = status.id
+            if _needs_pass_update(vessel, status):
+                vessel.passes_dirty = True
 
+            session.add(vessel)
+            session.commit()
+            ROWS.labels("vessels").inc()
 
+        if ais_data:
+            set_watermark(session, VESSELS_WATERMARK, ais_data[-1].id)
+            session.commit()
 
 
-@app.task(bind=True, max_retries=3, default_retry_delay=30)
-def process_passes(self):
+def _parse_time(timestamp):
+    """
+    Parse a freshness/timestamp string as stored in the database
+
+    Args:
+        timestamp (str): Timestamp such as 2025-01-01 12:00:00 (an optional timezone suffix is ignored)
+
+    Returns:
+        datetime: Parsed timestamp
+    """
+    return datetime.strptime(str(timestamp)[:19], "%Y-%m-%d %H:%M:%S")
+
+
+def _needs_pass_update(vessel, status):
+    """
+    Check whether the passes of a vessel must be recomputed for a new status
+
+    Passes are recomputed when the vessel moved more than PASS_RECOMPUTE_DISTANCE_KM from the
+    position they were computed for, or when that position is older than PASS_RECOMPUTE_MAX_AGE_HOURS.
+
+    Args:
+        vessel (Vessel): Vessel holding the position its passes were computed for
+        status (VesselStatus): New status of the vessel
+
+    Returns:
+        bool: True if the vessel must be queued for pass recomputation
+    """
+    if vessel.pass_freshness is None:
+        return True
+
+    moved = distance_km(vessel.pass_latitude, vessel.pass_longitude, status.latitude, status.longitude)
+    age = _parse_time(status.freshness) - _parse_time(vessel.pass_freshness)
+
+    return moved > settings.PASS_RECOMPUTE_DISTANCE_KM or age > timedelta(hours=settings.PASS_RECOMPUTE_MAX_AGE_HOURS)
+
+
+def _mark_passes_clean(status_ids):
+    """
+    Remove vessels from the dirty set and remember the position their passes were computed for
+
+    A vessel that received a newer status during the cycle stays dirty if that status moved it
+    enough from the computed position, otherwise the move would wait for the age threshold.
+
+    Args:
+        status_ids (list): Ids of the statuses the passes were computed for
+    """
+    with write_session() as session:
+        for status in session.query(VesselStatus).filter(VesselStatus.id.in_(status_ids)).all():
+            vessel = session.get(Vessel, status.imo)
+            vessel.pass_latitude = status.latitude
+            vessel.pass_longitude = status.longitude
+            vessel.pass_freshness = status.freshness
+
+            if vessel.latest_status_id == status.id:
+                vessel.passes_dirty = False
+            else:
+                vessel.passes_dirty = _needs_pass_update(vessel, session.get(VesselStatus, vessel.latest_status_id))
+            session.add(vessel)
+
+        session.commit()
+
+
+_token_lock = threading.Lock()
+_access_token = None
+
+
+def _api_session(refresh=False):
+    """
+    Create a requests session authenticated against the Copernicus Data Space Ecosystem
+
+    The access token is shared between the worker threads and only renewed when refresh is set.
+
+    Args:
+        refresh (bool): Request a new access token
+
+    Returns:
+        requests.Session: Authenticated session
+    """
+    global _access_token
+
+    with _token_lock:
+        if refresh or _access_token is None:
+            logger.debug("Authenticating")
+            _access_token = authenticate(settings.AUTH_URL, settings.USERNAME, settings.PASSWORD)
+        token = _access_token
+
+    api_session = requests.Session()
+    api_session.headers["Authorization"] = f"Bearer {token}"
+    return api_session
+
+
+def _sensing_time(product_name, default):
+    """
+    Extract the sensing time from a Sentinel-2 product name (e.g. S2A_MSIL1C_20250101T103421_...)
+
+    Args:
+        product_name (str): Product name
+        default (str): Value returned when the name holds no date
+
+    Returns:
+        str: Sensing time formatted as %Y-%m-%d %H:%M:%S
+    """
+    match = re.search(r"\d{8}T\d{6}", product_name)
+    if match is None:
+        return default
+    return datetime.strptime(match.group(0), "%Y%m%dT%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+
+
+def predict_candidates(imos):
+    """
+    Predict the pass candidates of several vessels at once
+
+    Every satellite is propagated once and matched against the dead reckoned positions of all the
+    vessels in a single vectorized call, instead of once per vessel.
+
+    Args:
+        imos (list): Vessel IMOs
+
+    Returns:
+        dict: {imo: {"status_id": ..., "candidates": [...]}} for each vessel with a status
+    """
     with next(get_session()) as session:
-        vessels = session.query(Vessel).all()
-
-        # Check the closest passes for each vessel are up to date
-        for i in tqdm(range(len(vessels))):
-        #for vessel in vessels:
-            vessel = vessels[i]
-            logger.debug("Processing passes for {vessel.vessel_name}")
-            last_pass = session.query(SatPass).filter(SatPass.status_id == vessel.statuses[-1].id).order_by(SatPass.timestamp.desc()).first()
-            if last_pass:
-                if datetime.strptime(last_pass.timestamp, "%Y-%m-%d %H:%M:%S %Z") > datetime.strptime(vessel.statuses[-1].freshness, "%Y-%m-%d %H:%M:%S %Z"):
-                    continue
+        statuses = (
+            session.query(Vessel.imo, VesselStatus.id, VesselStatus.latitude, VesselStatus.longitude,
+                          VesselStatus.course, VesselStatus.speed, VesselStatus.freshness)
+            .join(VesselStatus, VesselStatus.id == Vessel.latest_status_id)
+            .filter(Vessel.imo.in_(imos))
+            .all()
+        )
+        if not statuses:
+            return {}
+
+        latest = latest_tle_subquery()
+        tles = (
+            session.query(TLE)
+            .join(latest, TLE.id == latest.c.id)
+            .options(selectinload(TLE.satellite))
+            .all()
+        )
+
+    satellites = {tle.satellite.name: tle.satellite for tle in tles if tle.satellite}
+
+    imos, status_ids, latitudes, longitudes, courses, speeds, freshness = zip(*statuses)
+    vessels = {
+        "latitude": np.array(latitudes, dtype=float),
+        "longitude": np.array(longitudes, dtype=float),
+        "course": np.array(courses, dtype=float),
+        "speed": np.array(speeds, dtype=float),
+        "time": np.array([_parse_time(timestamp) for timestamp in freshness], dtype="datetime64[s]"),
+    }
+
+    logger.debug("Predicting passes for %d vessels", len(imos))
+    vessel_passes = get_vessel_passes(
+        vessels, tles,
+        chunk=settings.PASS_VESSEL_CHUNK,
+        bucket_hours=settings.PASS_TIME_BUCKET_HOURS,
+        base_km=settings.PASS_POSITION_ERROR_KM,
+        speed_error=settings.PASS_SPEED_ERROR,
+        unknown_speed=settings.PASS_UNKNOWN_SPEED_KNOTS,
+    )
+
+    predictions = {}
+    for imo, status_id, passes in zip(imos, status_ids, vessel_passes):
+        predictions[imo] = {"status_id": status_id, "candidates": [
+            {
+                "status_id": status_id,
+                "imo": imo,
+                "latitude": float(pass_[0][0]),
+                "longitude": float(pass_[0][1]),
+                "vessel_latitude": float(pass_[4][0]),
+                "vessel_longitude": float(pass_[4][1]),
+                "uncertainty_km": float(pass_[5]),
+                "distance": float(pass_[1]),
+                "timestamp": pass_[2],
+                "satellite": pass_[3],
+                "collection_name": getattr(satellites.get(pass_[3]), "collection_name", None) or settings.COLLECTION_NAME,
+                "product_type": getattr(satellites.get(pass_[3]), "product_type", None) or settings.PRODUCT_TYPE,
+            }
+            for pass_ in passes[:settings.PASS_CANDIDATES]
+        ]}
+
+    return predictions
+
+
+@app.task
+def process_vessel_passes(imo, prediction=None):
+    """
+    Unit: find the satellite passes whose swath covers the latest status of a vessel
+
+    Args:
+        imo (int): Vessel IMO
+        prediction (dict): Candidates of the vessel from predict_candidates, predicted for this
+            vessel alone if None
+
+    Returns:
+        dict: {"status_id": ..., "candidates": [...]} with one entry per pass candidate
+    """
+    if prediction is None:
+        prediction = predict_candidates([imo]).get(imo)
+
+    if prediction is None:
+        return {"status_id": None, "candidates": []}
+
+    return run_unit(f"vessel:{imo}:{prediction['status_id']}", "vessel", lambda: prediction)
+
+
+def _candidate_position(candidate, when):
+    """
+    Position of the vessel of a pass candidate at the time of the pass
+
+    The products are searched after the pass, by then the vessel has often reported past it and its
+    stored track gives where it actually was. Otherwise the dead reckoned position is used.
+
+    Args:
+        candidate (dict): Pass candidate produced by process_vessel_passes
+        when (datetime): Time of the pass
+
+    Returns:
+        tuple: (latitude, longitude)
+    """
+    if candidate.get("imo") is not None:
+        with next(get_session()) as session:
+            track = session.get(Track, candidate["imo"])
+            position = position_at(track, when) if track is not None else None
+
+        if position is not None:
+            return position
+
+    # Candidates persisted before the vessel position was added fall back to the pass location
+    return candidate.get("vessel_latitude", candidate["latitude"]), candidate.get("vessel_longitude", candidate["longitude"])
+
 
-            ############################
-            ##This code is Error prone##
-            latitude = vessel.statuses[-1].latitude 
-            longitude = vessel.statuses[-1].longitude
-            search_date = vessel.statuses[-1].freshness
-            ############################
-            
-            
-            # Get the closest passes
-            closest_passes = get_closest_pass(latitude, longitude, search_date, session.query(TLE).all())
-
-            #for pass_ in closest_passes[:10]:
-            for j in tqdm(range(len(closest_passes[:10]))):
-                pass_ = closest_passes[j]
-
-                lat = pass_[0][0]
-                lon = pass_[0][1]
-
-                # Calculate the bounding box
-                north_lat, _ = add_distance_to_gps(lat, lon, 10, 0)
-                south_lat, _ = add_distance_to_gps(lat, lon, 10, 180)
-                _, east_lon = add_distance_to_gps(lat, lon, 10, 90)
-                _, west_lon = add_distance_to_gps(lat, lon, 10, 270)
-
-                bbox = (
-                        f"POLYGON(("
-                        f"{west_lon} {south_lat}, {east_lon}  {south_lat},"
-                        f"{east_lon} {north_lat}, {west_lon} {north_lat},"
-                        f"{west_lon} {south_lat}))"
+@app.task
+def process_pass_candidate(candidate):
+    """
+    Unit: find the products acquired around a pass candidate whose footprint covers the vessel
+
+    The products are ranked by the offset between their sensing time and the pass, only the best
+    PRODUCTS_PER_PASS are kept so a pass downloads a single product instead of every overlapping one.
+
+    Args:
+        candidate (dict): Pass candidate produced by process_vessel_passes
+
+    Returns:
+        dict: {"products": [...]} with the id and name of each matching product
+    """
+    def find_products():
+        pass_time = _parse_time(candidate["timestamp"])
+        lat, lon = _candidate_position(candidate, pass_time)
+
+        # Calculate the bounding box
+        north_lat, _ = add_distance_to_gps(lat, lon, 10, 0)
+        south_lat, _ = add_distance_to_gps(lat, lon, 10, 180)
+        _, east_lon = add_distance_to_gps(lat, lon, 10, 90)
+        _, west_lon = add_distance_to_gps(lat, lon, 10, 270)
+
+        bbox = (
+                f"POLYGON(("
+                f"{west_lon} {south_lat}, {east_lon}  {south_lat},"
+                f"{east_lon} {north_lat}, {west_lon} {north_lat},"
+                f"{west_lon} {south_lat}))"
+        )
+
+        ranked = {}
+        current_date = pass_time
+        end_date = current_date + timedelta(days=settings.PASS_SEARCH_DAYS)
+
+        # Query the catalogue one day at a time
+        while current_date < end_date:
+            with timed("catalogue"):
+                result = query_catalogue(
+                        catalogue_odata_url=settings.CATALOGUE_URL,
+                        collection_name=candidate["collection_name"],
+                        product_type=candidate["product_type"],
+                        aoi=bbox,
+                        max_cloud_cover=settings.MAX_CLOUD_COVER,
+                        search_period_start=current_date,
+                        search_period_end=current_date + timedelta(days=1),
                 )
-                logger.debug(f"Authenticating")
-                # Authenticate
-                access_token = authenticate(settings.AUTH_URL, settings.USERNAME, settings.PASSWORD)
-                api_session = requests.Session()
-                api_session.headers["Authorization"] = f"Bearer {access_token}"
-
-                current_date = datetime.strptime(pass_[2], "%Y-%m-%d %H:%M:%S")
-                end_date = current_date + timedelta(days=3)
-
-                # Query the catalogue
-                while current_date < end_date:
-                    result = query_catalogue(
-                            catalogue_odata_url=settings.CATALOGUE_URL,
-                            collection_name=settings.COLLECTION_NAME,
-                            product_type=settings.PRODUCT_TYPE,
-                            aoi=bbox,
-                            max_cloud_cover=100,
-                            search_period_start=current_date,
-                            search_period_end=current_date + timedelta(days=1),
-                    )
+            current_date += timedelta(days=1)
+
+            for _, record in result.iterrows():
+                footprint = record.get("footprint")
+                if footprint is not None and not point_in_footprint(lat, lon, footprint):
+                    continue
+
+                # Missing or NaT (which never equals itself) when the catalogue gave no usable date
+                sensing = record.get("sensing_start")
+                if not isinstance(sensing, datetime) or sensing != sensing:
+                    sensing = _parse_time(_sensing_time(record["Name"], candidate["timestamp"]))
+
+                offset = abs((sensing - pass_time).total_seconds())
+                ranked.setdefault(record["Id"], (offset, {
+                    "id": record["Id"],
+                    "name": record["Name"],
+                    "footprint": footprint_wkt(footprint) if footprint is not None else None,
+                }))
+
+        products = [product for _, product in sorted(ranked.values(), key=lambda item: item[0])]
+        logger.debug("%d products cover the vessel for the pass of %s at %s", len(products), candidate["satellite"], candidate["timestamp"])
+
+        return {"products": products[:settings.PRODUCTS_PER_PASS]}
+
+    key = f"candidate:{candidate['status_id']}:{candidate['satellite']}:{candidate['timestamp']}"
+    return run_unit(key, "candidate", find_products)
+
+
+@app.task
+def process_product(product):
+    """
+    Unit: download the manifest and bands of a product and cut them into tiles
+
+    Args:
+        product (dict): Product id and name
+
+    Returns:
+        dict: {"jp2_dir": ..., "tiles": [...]} with the base name of each tile
+    """
+    def download_and_tile():
+        product_id = product["id"]
+        product_name = product["name"]
+
+        api_session = _api_session()
+        manifest_content = None
+
+        for attempt in range(2):
+            try:
+                with timed("download"):
+                    manifest_content = download_manifest(api_session, product_id, product_name, settings.CATALOGUE_URL)
+                break
+            except Exception as e:
+                # Retry once with a new token if the token is invalid
+                if "401" not in str(e):
+                    raise
+                api_session = _api_session(refresh=True)
+
+        if manifest_content is None:
+            raise Exception(f"Manifest not found for {product_name}")
+
+        manifest_dir = Path.cwd() / "metadata"
+        manifest_dir.mkdir(exist_ok=True)
+        manifest_path = manifest_dir / f"{product_name.replace('.SAFE', '')}_MTD_MSIL1C.xml"
+        save_to_file(manifest_content, manifest_path)
+
+        band_locations = parse_manifest(manifest_path)
+        if band_locations is None:
+            raise Exception(f"Bands not found in the manifest of {product_name}")
+
+        jp2_patches_dir = Path.cwd() / "Assets" / "jp2_patches"
+        jp2_patches_dir.mkdir(parents=True, exist_ok=True)
+        filename = product_id.replace(".SAFE", "")
+
+        logger.debug("Downloading bands for %s", product_name)
+        with timed("download"):
+            bands = download_bands(
+                    api_session,
+                    product_id,
+                    product_name,
+                    band_locations,
+                    settings.CATALOGUE_URL,
+                    jp2_patches_dir,
+                    filename
+            )
+
+        # Older products have no raster cloud mask, their tiles are only checked against the land mask
+        with timed("download"):
+            cloud_masks = download_bands(
+                    api_session,
+                    product_id,
+                    product_name,
+                    [cloud_mask_location(band_locations[0])],
+                    settings.CATALOGUE_URL,
+                    jp2_patches_dir,
+                    filename
+            )
+
+        BYTES.labels("download").inc(
+            len(manifest_content) + sum(Path(path).stat().st_size for path in bands + cloud_masks)
+        )
+
+        logger.debug("Creating patches for %s", product_name)
+        with timed("tiling"):
+            tiles = create_cropped_patches(bands, (1024, 1024), jp2_patches_dir, filename, (1024, 1024))
+
+        with timed("masking"):
+            kept = filter_tiles(
+                jp2_patches_dir, tiles, cloud_masks[0] if cloud_masks else None, settings.LAND_MASK_PATH
+            )
+        TILES.labels("kept").inc(len(kept))
+        TILES.labels("masked").inc(len(tiles) - len(kept))
+        logger.debug("%d of %d tiles of %s show water", len(kept), len(tiles), product_name)
+        tiles = kept
+
+        return {"jp2_dir": str(jp2_patches_dir), "tiles": tiles}
+
+    return run_unit(f"product:{product['id']}", "product", download_and_tile)
+
+
+@app.task
+def process_tile(tile):
+    """
+    Unit: build the composite image of a tile and run ship detection on it
+
+    Args:
+        tile (dict): Tile base name and the directory holding its bands
+
+    Returns:
+        dict: {"rgb_path": ..., "detections": [...]}
+    """
+    def detect():
+        composite_dir = Path.cwd() / "Assets" / "composite_patches"
+        composite_dir.mkdir(parents=True, exist_ok=True)
+
+        with timed("composite"):
+            rgb_path = generate_composite_image(tile["jp2_dir"], composite_dir, tile["name"])
+        if not rgb_path:
+            return {"rgb_path": None, "detections": []}
+
+        logger.debug("Running inference for %s", tile["name"])
+        with timed("inference"):
+            run_ship_detection(rgb_path)
+
+        detections = load_detections(rgb_path)
+        DETECTIONS.inc(len(detections))
+
+        return {"rgb_path": str(rgb_path), "detections": detections}
+
+    return run_unit(f"tile:{tile['name']}", "tile", detect)
+
+
+def _record_passes(links, product_results, tile_results):
+    """
+    Save a SatPass for each candidate/product pair and the detections found in its tiles
 
-                    # Increment the date
-                    current_date += timedelta(days=1)
-
-                    if result.empty:
-                        # Skip if no results
-                        continue
-                    logger.debug(f"Downloading manifest data for {vessel.vessel_name}")
-                    # Download the manifest
-                    for _, record in result.iterrows():
-                        product_id = record.iloc[1]
-                        product_name = record.iloc[2]
-
-                        manifest_content = None
-                        manifest_dir = Path.cwd() / "metadata"
-                        manifest_dir.mkdir(exist_ok=True)
-
-                        for attempt in range(2):
-                            try:
-                                manifest_content = download_manifest(
-                                        api_session,
-                                        product_id,
-                                        product_name,
-                                        settings.CATALOGUE_URL
-                                )
-                                break
-                            except Exception as e:
-                                # Retry if the token is invalid
-                                if "401" in str(e):
-                                    access_token = authenticate(settings.AUTH_URL, settings.USERNAME, settings.PASSWORD)
-                                    api_session.headers["Authorization"] = f"Bearer {access_token}"
-                                else:
-                                    # Retry if the connection is lost
-                                    break
-
-                        # Skip if the manifest is not found
-                        if manifest_content is None:
-                            continue
-
-                        lat_str = f"{float(lat):0.5f}"
-                        lon_str = f"{float(lon):0.5f}"
-
-                        manifest_path = manifest_dir / f"{lat_str}_{lon_str}_MTD_MSIL1C.xml"
-
-                        # Save the manifest
-                        save_to_file(manifest_path, manifest_content)
-
-                        band_locations = parse_manifest(manifest_path)
-
-                        # Create the jp2 patches directory
-                        jp2_patches_dir = Path.cwd() / "Assets" / "jp2_patches"
-                        jp2_patches_dir.mkdir(exist_ok=True)
-
-                        # Create the filename
-                        filename = f"{product_id}"
-                        filename = filename.replace(".SAFE", "")
-                        
-                        logger.debug(f"Downloading bands for {vessel.vessel_name}")
-                        # Download bands
-                        bands = download_bands(
-                                api_session,
-                                product_id,
-                                product_name,
-                                band_locations,
-                                settings.CATALOGUE_URL,
-                                jp2_patches_dir,
-                                filename
-                        )
-                        logger.debug(f"Creating patches for {vessel.vessel_name}")
-                        if not bands is None:
-                            patch_names = create_cropped_patches(
-                                    bands,
-                                    (1024, 1024),
-                                    jp2_patches_dir,
-                                    filename,
-                                    (1024, 1024)
-                            )
-
-                        composite_patches = Path.cwd() / "Assets" / "composite_patches"
-                        composite_patches.mkdir(exist_ok=True)
-
-                        logger.debug(f"Creating composite image for {vessel.vessel_name}")
-                        # Create the composite image
-                        # TODO fix this !!! some variables/functions are not declared 
-                        for patch_name in patch_names:
-                            rgb_path = generate_composite_image(
-                                # TODO is this generate_composite_image from inference.py?
-                                # The function returns a path to the composite image 
-                                    jp2_patches_dir,
-                                    composite_patches,
-                                    filename
-                            )
-                            if rgb_path: 
-                                # Run inference
-                                logger.debug(f"Running inference for {vessel.vessel_name}")
-                                # TODO the result of the ship detection inference isn't being used anywhere 
-                                result_path = run_ship_detection(rgb_path, api_session)
-
-                                # Save the pass
-                                sat_pass = SatPass(
-                                        satellite="Sentinel-2",
-                                        timestamp=datetime.strptime(filename[:15], "%Y%m%dT%H%M%S"),
-                                        latitude=lat,
-                                        longitude=lon,
-                                        image_url=rgb_path
-                                )
-
-                                # Assign pass to status
-                                vessel.statuses[-1].passes.append(sat_pass)
-
-                                session.add(sat_pass)
-                                session.commit()
\ No newline at end of file
+    Args:
+        links (list): (candidate, product) pairs
+        product_results (dict): Result of process_product for each product id
+        tile_results (dict): Result of process_tile for each tile name
+
+    Returns:
+        int: Number of passes saved
+    """
+    saved = 0
+
+    with write_session() as session:
+        for candidate, product in links:
+            product_result = product_results.get(product["id"])
+            if not product_result:
+                continue
+
+            image_url = f"{settings.CATALOGUE_URL}/Products({product['id']})/$value"
+            exists = session.query(SatPass).filter(
+                SatPass.status_id == candidate["status_id"], SatPass.image_url == image_url
+            ).first()
+            if exists:
+                continue
+
+            sat_pass = SatPass(
+                    satellite=candidate["satellite"],
+                    timestamp=_sensing_time(product["name"], candidate["timestamp"]),
+                    latitude=candidate["latitude"],
+                    longitude=candidate["longitude"],
+                    image_url=image_url,
+                    footprint=product.get("footprint"),
+                    status_id=candidate["status_id"]
+            )
+
+            for tile_name in product_result["tiles"]:
+                tile_result = tile_results.get(tile_name)
+                if not tile_result:
+                    continue
+
+                for detection in tile_result["detections"]:
+                    sat_pass.detections.append(Detection(
+                            tile_name=tile_name,
+                            class_id=detection["class_id"],
+                            points=detection["points"],
+                            image_path=tile_result["rgb_path"]
+                    ))
+
+            session.add(sat_pass)
+            saved += 1
+
+        session.commit()
+
+    return saved
+
+
+@app.task(bind=True, max_retries=3, default_retry_delay=30)
+@timed_stage("passes")
+def process_passes(self):
+    """
+    Find the closest satellite passes for each vessel and run ship detection on the matching products
+
+    The cycle is split into idempotent units (vessel -> pass candidate -> product -> tile). Each
+    stage is fanned out over PIPELINE_WORKERS threads and its gathered results feed the next stage,
+    so a slow download only holds up its own unit and a failed or interrupted cycle resumes from the
+    persisted unit state.
+    """
+    # Only the vessels in the dirty set need their passes recomputed
+    with next(get_session()) as session:
+        imos = [imo for imo, in session.query(Vessel.imo).filter(Vessel.passes_dirty == True).all()]
+
+    logger.debug("Processing passes for %d vessels", len(imos))
+
+    # The passes of all the dirty vessels are predicted together, the units then persist them
+    predictions = predict_candidates(imos)
+    vessel_results = [result for result in fan_out(lambda imo: process_vessel_passes(imo, predictions.get(imo)), imos) if result]
+    candidates = [c for result in vessel_results for c in result["candidates"]]
+
+    # Products are shared between candidates, download each one only once
+    links = []
+    products = {}
+    failed = set()
+    for candidate, result in zip(candidates, fan_out(process_pass_candidate, candidates)):
+        if result is None:
+            failed.add(candidate["status_id"])
+            continue
+        for product in result["products"]:
+            links.append((candidate, product))
+            products.setdefault(product["id"], product)
+
+    product_results = dict(zip(products, fan_out(process_product, list(products.values()))))
+
+    tiles = [
+        {"name": name, "jp2_dir": result["jp2_dir"]}
+        for result in product_results.values() if result
+        for name in result["tiles"]
+    ]
+    tile_results = dict(zip([tile["name"] for tile in tiles], fan_out(process_tile, tiles)))
+
+    saved = _record_passes(links, product_results, tile_results)
+
+    # Vessels stay dirty until every unit of their passes went through
+    failed.update(
+        candidate["status_id"] for candidate, product in links
+        if not product_results.get(product["id"])
+        or any(tile_results.get(name) is None for name in product_results[product["id"]]["tiles"])
+    )
+    _mark_passes_clean([
+        result["status_id"] for result in vessel_results
+        if result["status_id"] is not None and result["status_id"] not in failed
+    ])
+    logger.debug("Cycle done: %d candidates, %d products, %d tiles, %d passes saved", len(candidates), len(products), len(tiles), saved)
+
+    return saved
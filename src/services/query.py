@@ -0,0 +1,175 @@
+from datetime import datetime
+from sqlalchemy import and_, or_, func, literal_column
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.services.db import get_async_engine, uses_postgis
+import base64
+import json
+
+
+def parse_bbox(bbox):
+    """
+    Parse a bounding box given as min_lon,min_lat,max_lon,max_lat
+
+    Args:
+        bbox (str): Bounding box, min_lon may be greater than max_lon when it crosses the antimeridian
+
+    Returns:
+        tuple: (min_lon, min_lat, max_lon, max_lat)
+
+    Raises:
+        ValueError: if the bounding box is malformed
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox is out of range")
+
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def bbox_filter(latitude, longitude, bbox, postgis=None):
+    """
+    Filter clause keeping the positions inside a bounding box
+
+    On PostGIS the clause runs on the indexed geometry column of the table instead of the
+    latitude/longitude columns.
+
+    Args:
+        latitude (Column): Latitude column
+        longitude (Column): Longitude column
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat)
+        postgis (bool): Use the geometry column, defaults to uses_postgis()
+
+    Returns:
+        ColumnElement: Filter clause
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+
+    if uses_postgis() if postgis is None else postgis:
+        spans = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180), (-180, max_lon)]
+        geom = literal_column(f"{latitude.class_.__tablename__}.geom")
+        return or_(*(geom.op("&&")(func.ST_MakeEnvelope(west, min_lat, east, max_lat, 4326)) for west, east in spans))
+
+    if min_lon <= max_lon:
+        lon_filter = longitude.between(min_lon, max_lon)
+    else:
+        lon_filter = or_(longitude >= min_lon, longitude <= max_lon)
+
+    return and_(latitude.between(min_lat, max_lat), lon_filter)
+
+
+def time_filter(column, start=None, end=None):
+    """
+    Filter clause keeping the timestamps (stored as %Y-%m-%d %H:%M:%S strings) inside a time range
+
+    Args:
+        column (Column): Timestamp column
+        start (datetime): Inclusive start, ignored if None
+        end (datetime): Exclusive end, ignored if None
+
+    Returns:
+        list: Filter clauses
+    """
+    clauses = []
+    if start is not None:
+        clauses.append(column >= start.strftime("%Y-%m-%d %H:%M:%S"))
+    if end is not None:
+        clauses.append(column < end.strftime("%Y-%m-%d %H:%M:%S"))
+    return clauses
+
+
+def encode_cursor(key):
+    """
+    Encode the key of the last returned row as an opaque cursor
+
+    Args:
+        key (Any): JSON serialisable key
+
+    Returns:
+        str: Cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor
+
+    Args:
+        cursor (str): Cursor, None for the first page
+
+    Returns:
+        Any: Key of the last returned row, None for the first page
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    if cursor is None:
+        return None
+
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _row_to_dict(row):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row._mapping.items()}
+
+
+async def fetch_page(session, stmt, key_column, cursor=None, limit=1000):
+    """
+    Fetch a page of rows with keyset pagination on a unique, indexed column
+
+    Args:
+        session (AsyncSession): Database session
+        stmt (Select): Query selecting the columns to return, including key_column
+        key_column (Column): Unique column the rows are ordered by
+        cursor (str): Cursor returned with the previous page
+        limit (int): Maximum number of rows
+
+    Returns:
+        dict: {"items": [...], "next_cursor": ...}, next_cursor is None on the last page
+    """
+    after = decode_cursor(cursor)
+    if after is not None:
+        stmt = stmt.where(key_column > after)
+
+    result = await session.execute(stmt.order_by(key_column).limit(limit + 1))
+    items = [_row_to_dict(row) for row in result]
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1][key_column.key])
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def stream_ndjson(stmt, key_column, cursor=None, batch_size=1000):
+    """
+    Stream every row of a query as NDJSON, fetching it page by page so memory stays bounded
+
+    The stream uses its own session since it outlives the request handler.
+
+    Args:
+        stmt (Select): Query selecting the columns to return, including key_column
+        key_column (Column): Unique column the rows are ordered by
+        cursor (str): Cursor to resume from
+        batch_size (int): Number of rows fetched at a time
+
+    Yields:
+        bytes: One JSON document per line
+    """
+    async with AsyncSession(get_async_engine()) as session:
+        while True:
+            page = await fetch_page(session, stmt, key_column, cursor, batch_size)
+            if page["items"]:
+                yield "".join(json.dumps(item) + "\n" for item in page["items"]).encode()
+
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
@@ -0,0 +1,248 @@
+from contextlib import ExitStack
+from src.services.cache import LRUCache
+from src.config.settings import get_settings
+import numpy as np
+
+settings = get_settings()
+
+
+class StripReader:
+    """
+    Reads a band in full-width strips aligned on its blocks, decoded strips are kept in an LRU cache
+
+    Args:
+        dataset (rasterio.DatasetReader): Open raster
+        strip_height (int): Rows per strip, rounded up to a multiple of the block height
+        cache (LRUCache): Cache of decoded strips, shared by the bands of a scene
+        band (int): Band index in the raster
+    """
+    def __init__(self, dataset, strip_height, cache, band=1):
+        block_height = dataset.block_shapes[band - 1][0]
+
+        self.dataset = dataset
+        self.band = band
+        self.strip_height = block_height * -(-strip_height // block_height)
+        self.cache = cache
+
+    def strip(self, index):
+        """
+        Decoded rows of a strip
+
+        Args:
+            index (int): Strip index
+
+        Returns:
+            np.ndarray: Rows of the strip, the last strip may be shorter
+        """
+        from rasterio.windows import Window
+
+        key = (self.dataset.name, self.band, index)
+        data = self.cache.get(key)
+
+        if data is None:
+            row = index * self.strip_height
+            height = min(self.strip_height, self.dataset.height - row)
+            data = self.dataset.read(self.band, window=Window(0, row, self.dataset.width, height))
+            self.cache.set(key, data)
+
+        return data
+
+    def read_rows(self, start, out):
+        """
+        Copy rows of the band into a buffer, the rows past the end of the band are zeroed
+
+        Args:
+            start (int): First row
+            out (np.ndarray): Buffer of shape (rows, width or more)
+        """
+        stop = min(start + out.shape[0], self.dataset.height)
+        width = self.dataset.width
+
+        for index in range(start // self.strip_height, (stop - 1) // self.strip_height + 1):
+            data = self.strip(index)
+            first = index * self.strip_height
+            low, high = max(start, first), min(stop, first + data.shape[0])
+            out[low - start:high - start, :width] = data[low - first:high - first]
+
+        out[max(stop - start, 0):, :width] = 0
+
+
+class SceneTiler:
+    """
+    Cuts the bands of a scene into multi-band tiles
+
+    Each band is decoded once, in block-aligned strips, and at most RASTER_CACHE_STRIPS strips are
+    held in memory, so a full scene is tiled with bounded memory. Tiles past the edge of the scene
+    are padded with zeros.
+
+    Args:
+        band_paths (list): Paths of the bands, all with the same size
+        patch_size (tuple): (width, height) of the tiles
+        step_size (tuple): (vertical, horizontal) step between tiles, defaults to the tile size
+        cache_strips (int): Maximum number of decoded strips kept, defaults to RASTER_CACHE_STRIPS
+    """
+    def __init__(self, band_paths, patch_size, step_size=None, cache_strips=None):
+        self.band_paths = [str(path) for path in band_paths]
+        self.x_size, self.y_size = patch_size
+        self.vertical_step, self.horizontal_step = step_size or (self.y_size, self.x_size)
+        self.cache = LRUCache(maxsize=max(cache_strips or settings.RASTER_CACHE_STRIPS, len(self.band_paths)))
+        self._stack = None
+
+    def __enter__(self):
+        import rasterio
+
+        self._stack = ExitStack()
+        try:
+            self.datasets = [self._stack.enter_context(rasterio.open(path)) for path in self.band_paths]
+        except Exception:
+            self._stack.close()
+            raise
+
+        reference = self.datasets[0]
+        if any((dataset.width, dataset.height) != (reference.width, reference.height) for dataset in self.datasets):
+            self._stack.close()
+            raise ValueError("Bands of a scene must have the same size")
+
+        self.width, self.height = reference.width, reference.height
+        self.crs = reference.crs
+        self.dtype = reference.dtypes[0]
+        self.reference = reference
+
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+        self.cache.clear()
+
+    def tiles(self):
+        """
+        Iterate over the tiles row by row
+
+        The tile arrays are views of a row buffer reused for the next row, copy them to keep them.
+
+        Yields:
+            tuple: (y_off, x_off, tile of shape (bands, height, width), affine transform of the tile)
+        """
+        from rasterio.windows import Window
+
+        readers = [StripReader(dataset, self.y_size, self.cache) for dataset in self.datasets]
+
+        # Padded on the right so that the tiles on the edge are views as well
+        rows = np.zeros((len(readers), self.y_size, self.width + self.x_size), dtype=self.dtype)
+
+        for y_off in range(0, self.height, self.vertical_step):
+            for band, reader in enumerate(readers):
+                reader.read_rows(y_off, rows[band])
+
+            for x_off in range(0, self.width, self.horizontal_step):
+                transform = self.reference.window_transform(Window(x_off, y_off, self.x_size, self.y_size))
+                yield y_off, x_off, rows[:, :, x_off:x_off + self.x_size], transform
+
+    def write_tile(self, path, tile, transform, descriptions=None):
+        """
+        Write a tile as a tiled multi-band GeoTIFF
+
+        Args:
+            path (str): Output path
+            tile (np.ndarray): Tile of shape (bands, height, width)
+            transform (Affine): Transform of the tile
+            descriptions (list): Name of each band
+        """
+        import rasterio
+
+        profile = {
+            "driver": "GTiff",
+            "width": tile.shape[2],
+            "height": tile.shape[1],
+            "count": tile.shape[0],
+            "dtype": tile.dtype,
+            "crs": self.crs,
+            "transform": transform,
+            "tiled": True,
+            "blockxsize": 256,
+            "blockysize": 256,
+        }
+        if settings.RASTER_TILE_COMPRESS:
+            profile.update(compress=settings.RASTER_TILE_COMPRESS, predictor=2)
+
+        with rasterio.open(path, "w", **profile) as dst:
+            dst.write(tile)
+            for index, description in enumerate(descriptions or [], start=1):
+                dst.set_band_description(index, description)
+
+
+def read_tile(path):
+    """
+    Read every band of a multi-band tile
+
+    Args:
+        path (str): Path of the tile
+
+    Returns:
+        np.ndarray: Tile of shape (bands, height, width)
+    """
+    import rasterio
+
+    with rasterio.open(path) as src:
+        return src.read()
+
+
+def percentile_range(band, percentiles=(2, 98), sample_step=4):
+    """
+    Value range of a band between two percentiles, estimated on a regular subsample
+
+    Args:
+        band (np.ndarray): Band
+        percentiles (tuple): Low and high percentiles
+        sample_step (int): Keep one pixel every sample_step rows and columns
+
+    Returns:
+        tuple: (low, high) values
+    """
+    low, high = np.percentile(band[::sample_step, ::sample_step], percentiles)
+    return float(low), float(max(high, low + 1))
+
+
+def composite_rgb(red, green, blue, gain=2, stretch=None, out=None, block_rows=512):
+    """
+    Build an 8-bit RGB composite from reflectance bands
+
+    Without a stretch each band is scaled as clip(band * gain / 10000, 0, 1) * 255. The bands are
+    processed by blocks of rows through one float32 buffer and written straight into the output,
+    so no full-size float temporaries are created.
+
+    Args:
+        red (np.ndarray): Red band (B04)
+        green (np.ndarray): Green band (B03)
+        blue (np.ndarray): Blue band (B02)
+        gain (float): Reflectance gain, ignored with a stretch
+        stretch (tuple): Low and high percentiles stretched to 0-255 for each band, None to use the gain
+        out (np.ndarray): Preallocated (height, width, 3) uint8 buffer
+        block_rows (int): Rows processed at a time
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 composite
+    """
+    height, width = red.shape
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+
+    block = np.empty((min(block_rows, height), width), dtype=np.float32)
+
+    for channel, band in enumerate((red, green, blue)):
+        if stretch is None:
+            offset, scale = 0.0, gain * 255 / 10000
+        else:
+            low, high = percentile_range(band, stretch)
+            offset, scale = low, 255 / (high - low)
+
+        for start in range(0, height, block_rows):
+            rows = band[start:start + block_rows]
+            buffer = block[:rows.shape[0]]
+
+            np.subtract(rows, offset, out=buffer, dtype=np.float32)
+            np.multiply(buffer, scale, out=buffer)
+            np.clip(buffer, 0, 255, out=buffer)
+            out[start:start + rows.shape[0], :, channel] = buffer
+
+    return out
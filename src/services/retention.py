@@ -0,0 +1,243 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from src.services.db import get_session, write_session
+from src.schemas.data_schema import AISData, VesselStatus, Vessel, SatPass
+from src.services.pipeline import get_watermark
+from src.services.metrics import timed_stage, ROWS, BYTES
+from src.config.settings import get_settings
+from src.logger import get_logger
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+
+def _rows(records, model):
+    return [{column: getattr(record, column) for column in model.__table__.columns.keys()} for record in records]
+
+
+def archive_schema(table):
+    """
+    Arrow schema of the archive of a table, derived from its columns
+
+    Every file gets the same schema, so a batch where a column is always None still reads back
+    together with the others.
+
+    Args:
+        table (str): Table name
+
+    Returns:
+        pa.Schema: Schema of the archived rows
+    """
+    import pyarrow as pa
+    from sqlalchemy import Boolean, Float, Integer, LargeBinary
+    from sqlmodel import SQLModel
+
+    def arrow_type(column_type):
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, Integer):
+            return pa.int64()
+        if isinstance(column_type, Float):
+            return pa.float64()
+        if isinstance(column_type, LargeBinary):
+            return pa.binary()
+        return pa.string() # Strings, and datetimes which are archived as strings
+
+    return pa.schema([(column.name, arrow_type(column.type)) for column in SQLModel.metadata.tables[table].columns])
+
+
+def write_archive(table, rows, archive_dir=None):
+    """
+    Append rows to the Parquet archive of a table, one file per day and batch
+
+    The files are laid out as {archive_dir}/{table}/date=YYYY-MM-DD/part-{first id}-{last id}.parquet
+    so that read_archive only opens the days it needs.
+
+    Args:
+        table (str): Table name
+        rows (list): Rows as dicts with an id and a timestamp column (timestamp or freshness)
+        archive_dir (str): Archive root, defaults to ARCHIVE_DIR
+
+    Returns:
+        list: Paths of the files written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    root = Path(archive_dir or settings.ARCHIVE_DIR) / table
+    schema = archive_schema(table)
+
+    days = {}
+    for row in rows:
+        timestamp = str(row.get("timestamp") or row.get("freshness"))
+        days.setdefault(timestamp[:10], []).append({key: str(value) if isinstance(value, datetime) else value for key, value in row.items()})
+
+    paths = []
+    for day, day_rows in days.items():
+        directory = root / f"date={day}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"part-{day_rows[0]['id']}-{day_rows[-1]['id']}.parquet"
+
+        pq.write_table(pa.Table.from_pylist(day_rows, schema=schema), path, compression=settings.ARCHIVE_COMPRESSION)
+        BYTES.labels("retention").inc(path.stat().st_size)
+        paths.append(path)
+
+    return paths
+
+
+def read_archive(table, start=None, end=None, archive_dir=None):
+    """
+    Read archived rows of a table
+
+    Args:
+        table (str): Table name
+        start (datetime): First day read, from the start of the archive if None
+        end (datetime): Last day read (inclusive), to the end of the archive if None
+        archive_dir (str): Archive root, defaults to ARCHIVE_DIR
+
+    Returns:
+        pd.DataFrame: Archived rows, with the day of each row in the date column
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    root = Path(archive_dir or settings.ARCHIVE_DIR) / table
+    if not root.exists():
+        return pd.DataFrame()
+
+    # Files written before the schema was fixed may hold null typed columns, read them with the table schema
+    schema = archive_schema(table).append(pa.field("date", pa.string()))
+    dataset = ds.dataset(root, schema=schema, format="parquet", partitioning=ds.partitioning(flavor="hive"))
+
+    # The day partition is inferred as a string (YYYY-MM-DD), which compares in date order
+    expression = None
+    for bound, compare in ((start, lambda field, day: field >= day), (end, lambda field, day: field <= day)):
+        if bound is not None:
+            clause = compare(ds.field("date"), bound.strftime("%Y-%m-%d"))
+            expression = clause if expression is None else expression & clause
+
+    return dataset.to_table(filter=expression).to_pandas()
+
+
+def archive_ais_data(cutoff, batch_size=None):
+    """
+    Move the AIS rows older than the cutoff to the archive, in batches
+
+    Only the rows already turned into vessel statuses (below the watermark of process_vessel_data)
+    are moved. Each batch is archived, then deleted in its own short transaction.
+
+    Args:
+        cutoff (datetime): Rows with an older timestamp are moved
+        batch_size (int): Rows per batch, defaults to RETENTION_BATCH_SIZE
+
+    Returns:
+        int: Number of rows archived
+    """
+    from src.services.process import VESSELS_WATERMARK
+
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    archived = 0
+    last_id = 0
+
+    while True:
+        with write_session() as session:
+            watermark = get_watermark(session, VESSELS_WATERMARK)
+            batch = (
+                session.query(AISData)
+                .filter(AISData.id > last_id, AISData.id <= watermark, AISData.timestamp < cutoff.strftime("%Y-%m-%d %H:%M:%S"))
+                .order_by(AISData.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                break
+
+            write_archive("aisdata", _rows(batch, AISData))
+
+            ids = [record.id for record in batch]
+            session.query(AISData).filter(AISData.id.in_(ids)).delete(synchronize_session=False)
+            session.commit()
+
+        last_id = ids[-1]
+        archived += len(ids)
+
+    logger.debug("Archived %d AIS rows older than %s", archived, cutoff)
+    return archived
+
+
+def downsample_statuses(cutoff, minutes=None, batch_size=None):
+    """
+    Keep one status per vessel every few minutes before the cutoff, the others are archived and deleted
+
+    The first status of each period is kept, as are the latest status of each vessel and the
+    statuses satellite passes refer to. Running it again deletes nothing more.
+
+    Args:
+        cutoff (datetime): Statuses with an older freshness are downsampled
+        minutes (int): Period kept, defaults to RETENTION_DOWNSAMPLE_MINUTES
+        batch_size (int): Rows deleted per transaction, defaults to RETENTION_BATCH_SIZE
+
+    Returns:
+        int: Number of statuses removed
+    """
+    minutes = minutes or settings.RETENTION_DOWNSAMPLE_MINUTES
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    before = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+    with next(get_session()) as session:
+        imos = [imo for imo, in session.query(VesselStatus.imo).filter(VesselStatus.freshness < before).distinct().all()]
+
+    removed = 0
+    for imo in imos:
+        with next(get_session()) as session:
+            statuses = (
+                session.query(VesselStatus.id, VesselStatus.freshness)
+                .filter(VesselStatus.imo == imo, VesselStatus.freshness < before)
+                .order_by(VesselStatus.freshness, VesselStatus.id)
+                .all()
+            )
+            protected = {status_id for status_id, in session.query(SatPass.status_id).join(VesselStatus).filter(VesselStatus.imo == imo)}
+            protected.add(session.query(Vessel.latest_status_id).filter(Vessel.imo == imo).scalar())
+
+        drop = []
+        kept_periods = set()
+        for status_id, freshness in statuses:
+            period = int(datetime.strptime(str(freshness)[:19], "%Y-%m-%d %H:%M:%S").timestamp() // (minutes * 60))
+            if period not in kept_periods:
+                kept_periods.add(period)
+            elif status_id not in protected:
+                drop.append(status_id)
+
+        for start in range(0, len(drop), batch_size):
+            ids = drop[start:start + batch_size]
+            with write_session() as session:
+                records = session.query(VesselStatus).filter(VesselStatus.id.in_(ids)).order_by(VesselStatus.id).all()
+                write_archive("vesselstatus", _rows(records, VesselStatus))
+                session.query(VesselStatus).filter(VesselStatus.id.in_(ids)).delete(synchronize_session=False)
+                session.commit()
+
+        removed += len(drop)
+
+    logger.debug("Downsampled statuses older than %s to one per %d minutes, %d removed", cutoff, minutes, removed)
+    return removed
+
+
+@timed_stage("retention")
+def run_retention(now=None):
+    """
+    Archive the raw AIS rows and downsample the vessel statuses past their retention period
+
+    Args:
+        now (datetime): Current time
+
+    Returns:
+        dict: Number of AIS rows archived and statuses removed
+    """
+    now = now or datetime.utcnow()
+
+    archived = archive_ais_data(now - timedelta(days=settings.RETENTION_RAW_DAYS))
+    removed = downsample_statuses(now - timedelta(days=settings.RETENTION_DOWNSAMPLE_DAYS))
+    ROWS.labels("retention").inc(archived + removed)
+
+    return {"archived": archived, "removed": removed}
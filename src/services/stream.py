@@ -0,0 +1,273 @@
+from datetime import datetime
+from urllib.parse import urlparse
+from src.services.db import write_session
+from src.services.cache import LRUCache
+from src.services.metrics import timed, ROWS, BYTES
+from src.schemas.data_schema import AISData
+from src.config.settings import get_settings
+from src.logger import get_logger
+import socket
+import time
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+POSITION_TYPES = {1, 2, 3, 18, 19, 27} # Class A, class B and long range position reports
+STATIC_TYPES = {5, 19, 24} # Messages carrying the IMO, name, type or dimensions of a vessel
+
+
+def _value(value):
+    # pyais decodes some fields as enums, the database stores their integer value
+    return getattr(value, "value", value)
+
+
+class AISStreamBuffer:
+    """
+    Micro-batch buffer between the decoded AIS messages and the AISData table
+
+    The static data of each vessel (IMO, name, dimensions, destination) is kept from its type 5,
+    19 and 24 messages, and each position report becomes an AISData row completed with it. Only
+    the latest position of a vessel is buffered, so a flush writes at most one row per vessel.
+    Positions of vessels whose IMO is not known yet wait for their static data.
+
+    Args:
+        batch_size (int): Buffered vessels triggering a flush, defaults to AIS_STREAM_BATCH_SIZE
+        flush_seconds (float): Seconds between flushes, defaults to AIS_STREAM_FLUSH_SECONDS
+        static_cache_size (int): Vessels whose static data is kept, defaults to AIS_STREAM_STATIC_CACHE_SIZE
+    """
+    def __init__(self, batch_size=None, flush_seconds=None, static_cache_size=None):
+        self.batch_size = batch_size or settings.AIS_STREAM_BATCH_SIZE
+        self.flush_seconds = flush_seconds or settings.AIS_STREAM_FLUSH_SECONDS
+        static_cache_size = static_cache_size or settings.AIS_STREAM_STATIC_CACHE_SIZE
+
+        self.static = LRUCache(maxsize=static_cache_size)
+        self.pending = LRUCache(maxsize=static_cache_size)
+        self.rows = {}
+        self._last_flush = time.monotonic()
+
+    def add(self, message, received=None):
+        """
+        Add a decoded message
+
+        Args:
+            message (dict): Fields of a decoded message (pyais asdict())
+            received (datetime): Reception time used as the timestamp of positions, now if None
+        """
+        mmsi = str(message["mmsi"])
+
+        if message["msg_type"] in STATIC_TYPES:
+            static = dict(self.static.get(mmsi) or {})
+            static.update({
+                key: _value(message[field]) for key, field in (
+                    ("imo", "imo"), ("name", "shipname"), ("callsign", "callsign"), ("vessel_type", "ship_type"),
+                    ("a", "to_bow"), ("b", "to_stern"), ("c", "to_port"), ("d", "to_starboard"),
+                    ("draught", "draught"), ("destination", "destination"),
+                ) if message.get(field) not in (None, "")
+            })
+            self.static.set(mmsi, static)
+
+        if message["msg_type"] in POSITION_TYPES:
+            lat, lon = message.get("lat"), message.get("lon")
+            if lat is None or lon is None or abs(lat) > 90 or abs(lon) > 180:
+                return
+
+            heading = message.get("heading")
+            self.pending.set(mmsi, {
+                "mmsi": mmsi,
+                "timestamp": (received or datetime.utcnow()).strftime("%Y-%m-%d %H:%M:%S"),
+                "latitude": lat,
+                "longitude": lon,
+                "cog": message.get("course"),
+                "sog": message.get("speed"),
+                "heading": heading if heading is not None and heading < 511 else None,
+                "navstat": _value(message.get("status")),
+            })
+
+        position = self.pending.get(mmsi)
+        static = self.static.get(mmsi) or {}
+        if position is not None and static.get("imo"):
+            self.rows[mmsi] = {**position, **static}
+            self.pending.set(mmsi, None)
+
+    def due(self):
+        """
+        Check whether the buffer must be flushed
+
+        Returns:
+            bool: True when the buffer holds batch_size vessels or flush_seconds went by
+        """
+        if not self.rows:
+            return False
+        return len(self.rows) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds
+
+    def drain(self):
+        """
+        Empty the buffer
+
+        Returns:
+            list: AISData rows as dicts
+        """
+        rows = list(self.rows.values())
+        self.rows = {}
+        self._last_flush = time.monotonic()
+        return rows
+
+
+def flush_rows(rows, process=None):
+    """
+    Write a micro-batch of AIS rows in one transaction and update the vessel statuses from them
+
+    Args:
+        rows (list): AISData rows as dicts
+        process (bool): Run process_vessel_data after the insert, defaults to AIS_STREAM_PROCESS_ON_FLUSH
+
+    Returns:
+        int: Number of rows written
+    """
+    from src.services.process import process_vessel_data
+
+    if not rows:
+        return 0
+
+    with timed("stream"):
+        with write_session() as session:
+            session.add_all([AISData(**row) for row in rows])
+            session.commit()
+
+        ROWS.labels("stream").inc(len(rows))
+
+        # process_vessel_data only reads the rows above its watermark, the statuses are updated
+        # with this batch alone
+        if settings.AIS_STREAM_PROCESS_ON_FLUSH if process is None else process:
+            process_vessel_data()
+
+    logger.debug("Flushed %d streamed AIS positions", len(rows))
+    return len(rows)
+
+
+def read_lines(url, timeout=1.0):
+    """
+    Read NMEA sentences from a TCP server or UDP datagrams
+
+    Args:
+        url (str): tcp://host:port to connect to, or udp://host:port to listen on
+        timeout (float): Seconds without data after which None is yielded, so the caller can flush
+
+    Yields:
+        bytes: One sentence per line, None when idle. Stops when a TCP server closes the connection
+    """
+    address = urlparse(url)
+
+    if address.scheme == "tcp":
+        sock = socket.create_connection((address.hostname, address.port), timeout=settings.AIS_STREAM_RECONNECT_SECONDS)
+    elif address.scheme == "udp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((address.hostname or "0.0.0.0", address.port))
+    else:
+        raise ValueError(f"Unsupported AIS stream {url}, expected tcp://host:port or udp://host:port")
+
+    sock.settimeout(timeout)
+    partial = b""
+
+    with sock:
+        while True:
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                yield None
+                continue
+
+            if not data:
+                break
+
+            BYTES.labels("stream").inc(len(data))
+            *lines, partial = (partial + data).split(b"\n")
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield line
+
+            # Datagrams hold whole sentences, most senders leave out the last line break
+            if address.scheme == "udp" and partial.strip():
+                yield partial.strip()
+                partial = b""
+
+
+def decode_lines(lines):
+    """
+    Decode NMEA sentences, joining the fragments of multi-sentence messages
+
+    Args:
+        lines (Iterable): Sentences as bytes, None entries are passed through
+
+    Yields:
+        dict: Decoded message fields, None for each None entry
+    """
+    from pyais.messages import NMEAMessage
+
+    fragments = {}
+
+    for line in lines:
+        if line is None:
+            yield None
+            continue
+
+        try:
+            sentence = NMEAMessage.from_bytes(line)
+
+            if sentence.is_multi:
+                slot = (sentence.seq_id, sentence.channel, sentence.frag_cnt)
+                if sentence.frag_num == 1:
+                    fragments[slot] = []
+                if slot not in fragments:
+                    continue
+
+                fragments[slot].append(sentence)
+                if sentence.frag_num < sentence.frag_cnt:
+                    continue
+                sentence = NMEAMessage.assemble_from_iterable(fragments.pop(slot))
+
+            yield sentence.decode().asdict()
+        except Exception as e:
+            logger.debug("Skipping AIS sentence %r: %s", line, e)
+
+
+def run_stream(url=None, reconnect=True, buffer=None):
+    """
+    Ingest a real-time AIS stream (NMEA AIVDM/AIVDO) into the AISData table in micro-batches
+
+    An alternative to polling ingest_AIS_data: the positions are flushed every
+    AIS_STREAM_FLUSH_SECONDS or AIS_STREAM_BATCH_SIZE vessels, and each flush updates the vessel
+    statuses, so the write load stays steady instead of arriving as one large snapshot.
+
+    Args:
+        url (str): Stream address, defaults to AIS_STREAM_URL
+        reconnect (bool): Connect again when the stream closes, otherwise return once it is read
+        buffer (AISStreamBuffer): Buffer to use, a new one if None
+
+    Returns:
+        int: Number of rows written
+    """
+    url = url or settings.AIS_STREAM_URL
+    buffer = buffer or AISStreamBuffer()
+    written = 0
+
+    while True:
+        try:
+            timeout = min(1.0, buffer.flush_seconds)
+            for message in decode_lines(read_lines(url, timeout)):
+                if message is not None:
+                    buffer.add(message)
+                if buffer.due():
+                    written += flush_rows(buffer.drain())
+        except OSError as e:
+            logger.error(f"AIS stream {url} failed: {e}")
+
+        written += flush_rows(buffer.drain())
+
+        if not reconnect:
+            return written
+
+        logger.debug("Reconnecting to the AIS stream %s", url)
+        time.sleep(settings.AIS_STREAM_RECONNECT_SECONDS)
@@ -0,0 +1,274 @@
+from sqlalchemy import cast, String
+from src.schemas.data_schema import Satellite, TLE
+import numpy as np
+import struct
+import math
+
+MVT_EXTENT = 4096
+
+
+def tile_bounds(z, x, y):
+    """
+    Bounds of a Web Mercator (XYZ) tile
+
+    Args:
+        z (int): Zoom level
+        x (int): Tile column
+        y (int): Tile row
+
+    Returns:
+        tuple: (min_lon, min_lat, max_lon, max_lat)
+    """
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def to_tile_pixels(z, x, y, lats, lons, extent=MVT_EXTENT):
+    """
+    Project coordinates to the integer pixel grid of a tile
+
+    Args:
+        z (int): Zoom level
+        x (int): Tile column
+        y (int): Tile row
+        lats (np.ndarray): Latitudes
+        lons (np.ndarray): Longitudes
+        extent (int): Size of the tile grid
+
+    Returns:
+        np.ndarray: Pixel columns
+        np.ndarray: Pixel rows
+    """
+    n = 2 ** z
+    lats = np.clip(np.asarray(lats, dtype=float), -85.0511, 85.0511)
+    lons = np.asarray(lons, dtype=float)
+
+    px = ((lons + 180) / 360 * n - x) * extent
+    py = ((1 - np.arcsinh(np.tan(np.radians(lats))) / math.pi) / 2 * n - y) * extent
+
+    return np.rint(px).astype(np.int64), np.rint(py).astype(np.int64)
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number, values):
+    return _bytes_field(number, b"".join(_varint(v) for v in values))
+
+
+def _value(value):
+    """Encode a feature property as an MVT Value message"""
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _field(6, 0) + _varint(_zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return _field(3, 1) + struct.pack("<d", float(value))
+    return _bytes_field(1, str(value).encode())
+
+
+def _geometry(geom_type, coords):
+    """
+    Encode point or line coordinates as MVT geometry commands
+
+    Args:
+        geom_type (int): 1 for a point, 2 for a line string
+        coords (list): (x, y) pixel coordinates
+
+    Returns:
+        list: Command and parameter integers
+    """
+    commands = [(1 & 0x7) | (1 << 3)]
+    cx, cy = 0, 0
+
+    for i, (px, py) in enumerate(coords):
+        if geom_type == 2 and i == 1:
+            commands.append((2 & 0x7) | ((len(coords) - 1) << 3))
+        commands += [_zigzag(int(px) - cx), _zigzag(int(py) - cy)]
+        cx, cy = int(px), int(py)
+
+    return commands
+
+
+def encode_mvt(layers, extent=MVT_EXTENT):
+    """
+    Encode features as a Mapbox Vector Tile
+
+    Args:
+        layers (dict): Layer name -> list of (geom_type, coords, properties), geom_type is 1 for points
+            and 2 for line strings, coords are pixel coordinates on the tile grid
+        extent (int): Size of the tile grid
+
+    Returns:
+        bytes: Protobuf encoded tile
+    """
+    tile = b""
+
+    for name, features in layers.items():
+        keys = {}
+        values = {}
+        encoded_features = b""
+
+        for geom_type, coords, properties in features:
+            tags = []
+            for key, value in properties.items():
+                if value is None:
+                    continue
+                value_key = (type(value).__name__, value)
+                tags += [keys.setdefault(key, len(keys)), values.setdefault(value_key, len(values))]
+
+            feature = _packed(2, tags) + _field(3, 0) + _varint(geom_type) + _packed(4, _geometry(geom_type, coords))
+            encoded_features += _bytes_field(2, feature)
+
+        layer = (
+            _field(15, 0) + _varint(2)
+            + _bytes_field(1, name.encode())
+            + encoded_features
+            + b"".join(_bytes_field(3, key.encode()) for key in keys)
+            + b"".join(_bytes_field(4, _value(value)) for _, value in values)
+            + _field(5, 0) + _varint(extent)
+        )
+        tile += _bytes_field(3, layer)
+
+    return tile
+
+
+def encode_arrow(columns):
+    """
+    Encode columns as an Arrow IPC stream
+
+    Args:
+        columns (dict): Column name -> list of values
+
+    Returns:
+        bytes: Arrow IPC stream
+    """
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def position_features(z, x, y, positions):
+    """
+    Build the point features of the vessel positions falling on a tile
+
+    Args:
+        z (int): Zoom level
+        x (int): Tile column
+        y (int): Tile row
+        positions (list): Rows with latitude, longitude and the properties to attach
+
+    Returns:
+        list: (geom_type, coords, properties) features
+    """
+    if not positions:
+        return []
+
+    px, py = to_tile_pixels(z, x, y, [p["latitude"] for p in positions], [p["longitude"] for p in positions])
+
+    return [
+        (1, [(cx, cy)], {key: value for key, value in position.items() if key not in ("latitude", "longitude")})
+        for cx, cy, position in zip(px, py, positions)
+    ]
+
+
+def track_features(z, x, y, tracks, buffer=64):
+    """
+    Build the line features of the ground tracks crossing a tile
+
+    Tracks are split where they cross the antimeridian and only the parts passing near the tile
+    are kept.
+
+    Args:
+        z (int): Zoom level
+        x (int): Tile column
+        y (int): Tile row
+        tracks (dict): Satellite name -> (latitudes, longitudes) arrays
+        buffer (int): Pixels around the tile kept so lines are not cut at the edge
+
+    Returns:
+        list: (geom_type, coords, properties) features
+    """
+    features = []
+
+    for name, (lats, lons) in tracks.items():
+        breaks = np.where(np.abs(np.diff(lons)) > 180)[0] + 1
+
+        for seg_lats, seg_lons in zip(np.split(lats, breaks), np.split(lons, breaks)):
+            px, py = to_tile_pixels(z, x, y, seg_lats, seg_lons)
+            inside = (px >= -buffer) & (px <= MVT_EXTENT + buffer) & (py >= -buffer) & (py <= MVT_EXTENT + buffer)
+            if len(px) < 2 or not inside.any():
+                continue
+
+            # Keep a point on each side of the visible part so the line enters and leaves the tile
+            idx = np.where(inside)[0]
+            start, stop = max(idx[0] - 1, 0), min(idx[-1] + 2, len(px))
+            if stop - start >= 2:
+                features.append((2, list(zip(px[start:stop], py[start:stop])), {"satellite": name}))
+
+    return features
+
+
+def ground_tracks(start, hours=2, step=60):
+    """
+    Ground tracks of the satellites from their latest TLE
+
+    Args:
+        start (datetime): Start of the tracks
+        hours (float): Length of the tracks in hours
+        step (float): Seconds between samples
+
+    Returns:
+        dict: Satellite name -> (latitudes, longitudes) arrays
+    """
+    from beyond.io.tle import Tle
+    from src.services.calculations import propagate
+    from src.services.db import get_session
+    from src.services.tle import latest_tle_subquery
+
+    tracks = {}
+
+    with next(get_session()) as session:
+        latest = latest_tle_subquery()
+        rows = (
+            session.query(Satellite.name, latest.c.line1, TLE.line2)
+            .join(latest, latest.c.satellite_id == cast(Satellite.id, String))
+            .join(TLE, TLE.id == latest.c.id)
+            .all()
+        )
+
+    for name, line1, line2 in rows:
+        _, lats, lons, _ = propagate(Tle(line1 + "\n" + line2), start, hours, step)
+        tracks[name] = (lats, lons)
+
+    return tracks
@@ -0,0 +1,334 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select
+from src.services.db import write_session
+from src.schemas.data_schema import TLE, Satellite
+from src.logger import get_logger
+from pathlib import Path
+import numpy as np
+import json
+
+logger = get_logger(__name__)
+
+
+def tle_epoch(line1):
+    """
+    Read the epoch of a TLE from its first line
+
+    Args:
+        line1 (str): First line of the TLE
+
+    Returns:
+        datetime: Epoch of the element set
+    """
+    field = line1[18:32].strip()
+    year = int(field[:2])
+    year += 2000 if year < 57 else 1900
+
+    return datetime(year, 1, 1) + timedelta(days=float(field[2:]) - 1)
+
+
+def latest_tle_subquery():
+    """
+    Subquery holding the latest TLE (id, satellite_id, line1, created_at) of each satellite
+
+    Returns:
+        Subquery: Latest TLE of each satellite
+    """
+    latest_ids = (
+        select(func.max(TLE.id).label("id"))
+        .group_by(TLE.satellite_id)
+        .subquery()
+    )
+    return (
+        select(TLE.id, TLE.satellite_id, TLE.line1, TLE.created_at)
+        .join(latest_ids, TLE.id == latest_ids.c.id)
+        .subquery()
+    )
+
+
+def _checksums(lines):
+    """
+    Compute the modulo 10 checksums of TLE lines
+
+    Args:
+        lines (pd.Series): TLE lines, all 69 characters long
+
+    Returns:
+        np.ndarray: Expected checksum of each line
+    """
+    chars = np.frombuffer("".join(lines).encode("ascii", "replace"), dtype=np.uint8).reshape(-1, 69)[:, :68]
+    digits = np.where((chars >= ord("0")) & (chars <= ord("9")), chars.astype(np.int64) - ord("0"), 0)
+
+    return (digits.sum(axis=1) + (chars == ord("-")).sum(axis=1)) % 10
+
+
+def validate_tles(tles):
+    """
+    Drop the malformed rows of a TLE catalogue
+
+    A row is kept when both lines are 69 characters long, start with their line number, carry a
+    valid checksum and refer to the same satellite.
+
+    Args:
+        tles (pd.DataFrame): Catalogue with line1 and line2 columns
+
+    Returns:
+        pd.DataFrame: Valid rows with the norad_id and epoch columns added
+    """
+    # pandas is imported by the catalogue functions only, the API just needs the queries
+    import pandas as pd
+
+    line1 = tles["line1"].str.rstrip()
+    line2 = tles["line2"].str.rstrip()
+
+    valid = (
+        (line1.str.len() == 69) & (line2.str.len() == 69)
+        & line1.str.startswith("1 ") & line2.str.startswith("2 ")
+        & (line1.str[2:7] == line2.str[2:7])
+        & line1.str[2:7].str.strip().str.isdigit()
+    )
+
+    checked = valid.to_numpy().copy()
+    for lines in (line1[valid], line2[valid]):
+        if len(lines):
+            checked[valid.to_numpy()] &= _checksums(lines) == pd.to_numeric(lines.str[68], errors="coerce").fillna(-1).to_numpy()
+
+    if not checked.all():
+        logger.debug("Dropping %d malformed TLEs", (~checked).sum())
+
+    tles = tles.loc[checked].assign(line1=line1[checked], line2=line2[checked])
+
+    year = tles["line1"].str[18:20].astype(int)
+    year = year.where(year >= 57, year + 100) + 1900
+    days = tles["line1"].str[20:32].astype(float)
+
+    return tles.assign(
+        norad_id=tles["line1"].str[2:7].astype(int),
+        epoch=pd.to_datetime(year.astype(str), format="%Y") + pd.to_timedelta(days - 1, unit="D")
+    )
+
+
+def read_tle_file(path):
+    """
+    Read a TLE (2 lines per satellite) or 3LE (name line followed by the 2 lines) text file
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        pd.DataFrame: Catalogue with name, line1 and line2 columns
+    """
+    import pandas as pd
+
+    lines = pd.Series(Path(path).read_text().splitlines()).str.rstrip()
+    lines = lines[lines != ""].reset_index(drop=True)
+
+    is_line1 = lines.str.startswith("1 ") & lines.shift(-1).fillna("").str.startswith("2 ")
+    previous = lines.shift(1).fillna("")
+    has_name = ~previous.str.match(r"^[12] ") & (previous != "")
+
+    names = previous.where(has_name).str.replace(r"^0 ", "", regex=True).str.strip()
+
+    return pd.DataFrame({
+        "name": names[is_line1].to_numpy(),
+        "line1": lines[is_line1].to_numpy(),
+        "line2": lines.shift(-1)[is_line1].to_numpy(),
+    })
+
+
+def _exponent_field(values):
+    """
+    Format values in the TLE assumed decimal point notation (e.g. -0.000011606 -> -11606-4)
+
+    Args:
+        values (pd.Series): Values to format
+
+    Returns:
+        list: 8 character fields
+    """
+    values = values.fillna(0).to_numpy(dtype=float)
+    magnitude = np.abs(values)
+
+    exponent = np.where(magnitude > 0, np.floor(np.log10(np.where(magnitude > 0, magnitude, 1))) + 1, 0).astype(int)
+    mantissa = np.rint(magnitude / 10.0 ** exponent * 1e5).astype(int)
+
+    # Rounding can overflow the 5 digits of the mantissa
+    overflow = mantissa >= 100000
+    mantissa = np.where(overflow, 10000, mantissa)
+    exponent = np.where(overflow, exponent + 1, exponent)
+    exponent = np.where(magnitude > 0, exponent, 0)
+
+    return [
+        f"{'-' if v < 0 else ' '}{m:05d}{'-' if e <= 0 else '+'}{abs(e)}"
+        for v, m, e in zip(values, mantissa, exponent)
+    ]
+
+
+def _with_checksum(lines):
+    """
+    Append the checksum to 68 character TLE lines
+
+    Args:
+        lines (list): TLE lines without checksum
+
+    Returns:
+        list: 69 character TLE lines
+    """
+    import pandas as pd
+
+    padded = pd.Series([line.ljust(69)[:69] for line in lines], dtype=object)
+    return [line + str(checksum) for line, checksum in zip(lines, _checksums(padded))]
+
+
+def omm_to_tles(omm):
+    """
+    Convert a CelesTrak OMM catalogue to TLE lines
+
+    Args:
+        omm (pd.DataFrame): Catalogue using the CCSDS OMM keywords (NORAD_CAT_ID, EPOCH, MEAN_MOTION, ...)
+
+    Returns:
+        pd.DataFrame: Catalogue with name, line1 and line2 columns
+    """
+    import pandas as pd
+
+    omm = omm[omm["NORAD_CAT_ID"].astype(int) <= 99999]
+
+    epoch = pd.to_datetime(omm["EPOCH"])
+    day_of_year = epoch.dt.dayofyear + (epoch - epoch.dt.normalize()).dt.total_seconds() / 86400
+    designator = omm["OBJECT_ID"].fillna("").str.replace(r"^\d{2}(\d{2})-(\d{3})(\w*)$", r"\1\2\3", regex=True)
+
+    mean_motion_dot = [f"{v:.8f}".replace("0.", ".", 1).rjust(10) for v in omm["MEAN_MOTION_DOT"].fillna(0)]
+    eccentricity = [f"{v:.7f}"[2:] for v in omm["ECCENTRICITY"]]
+
+    line1 = [
+        f"1 {norad:05d}{classification} {intl:<8} {year % 100:02d}{doy:012.8f} {ndot} {nddot} {bstar} 0 {elset % 10000:4d}"
+        for norad, classification, intl, year, doy, ndot, nddot, bstar, elset in zip(
+            omm["NORAD_CAT_ID"].astype(int),
+            omm.get("CLASSIFICATION_TYPE", pd.Series("U", index=omm.index)).fillna("U"),
+            designator,
+            epoch.dt.year,
+            day_of_year,
+            mean_motion_dot,
+            _exponent_field(omm["MEAN_MOTION_DDOT"]),
+            _exponent_field(omm["BSTAR"]),
+            omm.get("ELEMENT_SET_NO", pd.Series(999, index=omm.index)).fillna(999).astype(int),
+        )
+    ]
+    line2 = [
+        f"2 {norad:05d} {inc:8.4f} {raan:8.4f} {ecc} {argp:8.4f} {anomaly:8.4f} {motion:11.8f}{rev % 100000:5d}"
+        for norad, inc, raan, ecc, argp, anomaly, motion, rev in zip(
+            omm["NORAD_CAT_ID"].astype(int),
+            omm["INCLINATION"],
+            omm["RA_OF_ASC_NODE"],
+            eccentricity,
+            omm["ARG_OF_PERICENTER"],
+            omm["MEAN_ANOMALY"],
+            omm["MEAN_MOTION"],
+            omm.get("REV_AT_EPOCH", pd.Series(0, index=omm.index)).fillna(0).astype(int),
+        )
+    ]
+
+    return pd.DataFrame({
+        "name": omm["OBJECT_NAME"].to_numpy() if "OBJECT_NAME" in omm else None,
+        "line1": _with_checksum(line1),
+        "line2": _with_checksum(line2),
+    })
+
+
+def read_catalogue(path):
+    """
+    Read a TLE/3LE text file or a CelesTrak OMM JSON/CSV catalogue
+
+    Args:
+        path (str): Path to the catalogue, the format is picked from the extension
+
+    Returns:
+        pd.DataFrame: Valid entries with name, line1, line2, norad_id and epoch columns
+    """
+    import pandas as pd
+
+    suffix = Path(path).suffix.lower()
+
+    if suffix == ".json":
+        tles = omm_to_tles(pd.DataFrame(json.loads(Path(path).read_text())))
+    elif suffix == ".csv":
+        tles = omm_to_tles(pd.read_csv(path))
+    else:
+        tles = read_tle_file(path)
+
+    return validate_tles(tles)
+
+
+def import_catalogue(path, batch_size=1000):
+    """
+    Load a local TLE catalogue into the database
+
+    Satellites missing from the database are created and a TLE is inserted for each entry whose
+    epoch is newer than the latest stored one, in batches of batch_size rows.
+
+    Args:
+        path (str): Path to a TLE/3LE text file or a CelesTrak OMM JSON/CSV catalogue
+        batch_size (int): Number of entries written per transaction
+
+    Returns:
+        dict: Number of entries read, satellites created, TLEs inserted and TLEs skipped
+    """
+    import pandas as pd
+
+    tles = read_catalogue(path)
+
+    # Keep the most recent element set of each satellite
+    tles = tles.sort_values("epoch").drop_duplicates("norad_id", keep="last")
+
+    summary = {"read": len(tles), "satellites": 0, "inserted": 0, "skipped": 0}
+    now = datetime.utcnow()
+
+    with write_session() as session:
+        stored = {
+            int(satellite_id): tle_epoch(line1)
+            for _, satellite_id, line1, _ in session.query(latest_tle_subquery()).all()
+        }
+
+        for start in range(0, len(tles), batch_size):
+            batch = tles.iloc[start:start + batch_size]
+            ids = [int(i) for i in batch["norad_id"]]
+
+            existing = {i for i, in session.query(Satellite.id).filter(Satellite.id.in_(ids)).all()}
+
+            new_satellites = [
+                {"id": norad_id, "name": name if isinstance(name, str) else str(norad_id), "orbit": []}
+                for norad_id, name in zip(ids, batch["name"]) if norad_id not in existing
+            ]
+
+            stored_epoch = pd.to_datetime(batch["norad_id"].map(stored))
+            changed = batch[stored_epoch.isna() | (batch["epoch"] > stored_epoch)]
+
+            if new_satellites:
+                session.execute(insert(Satellite), new_satellites)
+            if len(changed):
+                session.execute(insert(TLE), [
+                    {"satellite_id": int(norad_id), "line1": line1, "line2": line2, "created_at": now}
+                    for norad_id, line1, line2 in zip(changed["norad_id"], changed["line1"], changed["line2"])
+                ])
+            session.commit()
+
+            summary["satellites"] += len(new_satellites)
+            summary["inserted"] += len(changed)
+            summary["skipped"] += len(batch) - len(changed)
+
+    logger.debug("Imported %s: %s", path, summary)
+
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import a local TLE/3LE or OMM catalogue")
+    parser.add_argument("paths", nargs="+", help="Catalogue files")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    for catalogue_path in args.paths:
+        print(catalogue_path, import_catalogue(catalogue_path, args.batch_size))
@@ -0,0 +1,296 @@
+from datetime import datetime
+from sqlalchemy import or_
+from src.services.db import get_session, write_session
+from src.services.metrics import timed_stage, ROWS
+from src.schemas.data_schema import Track, VesselStatus
+from src.config.settings import get_settings
+from src.logger import get_logger
+import numpy as np
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+COORDINATE_SCALE = 1e5 # Encoded coordinates are rounded to 1e-5 degrees, about a meter
+
+
+def to_epoch(timestamps):
+    """
+    Convert timestamps stored as %Y-%m-%d %H:%M:%S strings to epoch seconds
+
+    Args:
+        timestamps (list): Timestamps, an optional suffix after the seconds is ignored
+
+    Returns:
+        np.ndarray: Epoch seconds (int64)
+    """
+    return np.array([str(timestamp)[:19] for timestamp in timestamps], dtype="datetime64[s]").astype(np.int64)
+
+
+def _unwrap(lons):
+    # Continuous longitudes across the antimeridian so that they can be interpolated
+    return np.degrees(np.unwrap(np.radians(np.asarray(lons, dtype=float))))
+
+
+def interpolate_track(times, lats, lons, at):
+    """
+    Positions along a track at the given times, linear in time between the track points
+
+    Args:
+        times (np.ndarray): Epoch seconds of the track points, increasing
+        lats (np.ndarray): Latitudes of the track points
+        lons (np.ndarray): Longitudes of the track points
+        at (float | np.ndarray): Epoch seconds to interpolate at
+
+    Returns:
+        tuple: Latitudes and longitudes, NaN outside of the track
+    """
+    at = np.asarray(at, dtype=float)
+    outside = (at < times[0]) | (at > times[-1])
+
+    lat = np.interp(at, times, lats)
+    lon = (np.interp(at, times, _unwrap(lons)) + 180) % 360 - 180
+
+    return np.where(outside, np.nan, lat), np.where(outside, np.nan, lon)
+
+
+def compress_track(times, lats, lons, tolerance_m=None):
+    """
+    Select the points of a track to keep with the top-down time-ratio algorithm
+
+    A segment between two kept points is split at the point furthest from where linear
+    interpolation in time puts the vessel (the synchronized distance, which accounts for changes of
+    speed as well as heading), until every dropped point is within the tolerance. interpolate_track
+    on the kept points is then never further than the tolerance from a dropped fix.
+
+    Args:
+        times (np.ndarray): Epoch seconds, increasing
+        lats (np.ndarray): Latitudes
+        lons (np.ndarray): Longitudes
+        tolerance_m (float): Maximum synchronized distance in meters, defaults to TRACK_TOLERANCE_M
+
+    Returns:
+        np.ndarray: Indices of the points kept, the first and last points are always kept
+    """
+    from src.services.calculations import distance_km
+
+    tolerance_km = (settings.TRACK_TOLERANCE_M if tolerance_m is None else tolerance_m) / 1000
+
+    times = np.asarray(times, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    lons = _unwrap(lons)
+
+    n = len(times)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+
+    stack = [(0, n - 1)] if n > 2 else []
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        inner = slice(first + 1, last)
+        ratio = (times[inner] - times[first]) / max(times[last] - times[first], 1e-9)
+        expected_lat = lats[first] + ratio * (lats[last] - lats[first])
+        expected_lon = lons[first] + ratio * (lons[last] - lons[first])
+
+        errors = distance_km(lats[inner], lons[inner], expected_lat, expected_lon)
+        worst = int(np.argmax(errors))
+
+        if errors[worst] > tolerance_km:
+            split = first + 1 + worst
+            keep[split] = True
+            stack.extend(((first, split), (split, last)))
+
+    return np.flatnonzero(keep)
+
+
+def _write_varint(out, value):
+    value = (value << 1) ^ (value >> 63) # Zigzag, small negative deltas stay short
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_track(times, lats, lons):
+    """
+    Encode a track as bytes: the delta of each point from the previous one, as zigzag varints
+
+    Args:
+        times (np.ndarray): Epoch seconds
+        lats (np.ndarray): Latitudes
+        lons (np.ndarray): Longitudes
+
+    Returns:
+        bytes: Encoded track, a few bytes per point
+    """
+    columns = (
+        np.asarray(times, dtype=np.int64),
+        np.round(np.asarray(lats, dtype=float) * COORDINATE_SCALE).astype(np.int64),
+        np.round(np.asarray(lons, dtype=float) * COORDINATE_SCALE).astype(np.int64),
+    )
+
+    out = bytearray()
+    _write_varint(out, len(columns[0]))
+    for column in columns:
+        for delta in np.diff(column, prepend=0).tolist():
+            _write_varint(out, delta)
+
+    return bytes(out)
+
+
+def decode_track(data):
+    """
+    Decode a track encoded by encode_track
+
+    Args:
+        data (bytes): Encoded track
+
+    Returns:
+        tuple: Epoch seconds, latitudes and longitudes as arrays
+    """
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            values.append((value >> 1) ^ -(value & 1))
+            value = shift = 0
+
+    n = values[0]
+    deltas = np.array(values[1:], dtype=np.int64).reshape(3, n)
+    times, lats, lons = np.cumsum(deltas, axis=1)
+
+    return times, lats / COORDINATE_SCALE, lons / COORDINATE_SCALE
+
+
+def extend_track(track, times, lats, lons, tolerance_m=None):
+    """
+    Append new fixes to a track, only the new part is compressed
+
+    The last stored point anchors the compression of the new fixes, so the points already stored
+    don't change.
+
+    Args:
+        track (tuple): Epoch seconds, latitudes and longitudes of the stored track, None for a new track
+        times (np.ndarray): Epoch seconds of the new fixes, increasing and after the track
+        lats (np.ndarray): Latitudes of the new fixes
+        lons (np.ndarray): Longitudes of the new fixes
+        tolerance_m (float): Compression tolerance in meters
+
+    Returns:
+        tuple: Epoch seconds, latitudes and longitudes of the extended track
+    """
+    if track is not None and len(track[0]):
+        times = np.concatenate(([track[0][-1]], times))
+        lats = np.concatenate(([track[1][-1]], lats))
+        lons = np.concatenate(([track[2][-1]], lons))
+
+    # Fixes sharing a timestamp can't be interpolated between, keep the first one
+    times, first = np.unique(np.asarray(times, dtype=np.int64), return_index=True)
+    lats, lons = np.asarray(lats, dtype=float)[first], np.asarray(lons, dtype=float)[first]
+
+    kept = compress_track(times, lats, lons, tolerance_m)
+    new = (times[kept], lats[kept], lons[kept])
+
+    if track is None or not len(track[0]):
+        return new
+
+    return tuple(np.concatenate((stored[:-1], added)) for stored, added in zip(track, new))
+
+
+def load_track(track, start=None, end=None):
+    """
+    Points of a stored track, optionally cut to a time range
+
+    Args:
+        track (Track): Stored track
+        start (datetime): Drop the points before
+        end (datetime): Drop the points after
+
+    Returns:
+        tuple: Epoch seconds, latitudes and longitudes
+    """
+    times, lats, lons = decode_track(track.data)
+
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= int(np.datetime64(start, "s").astype(np.int64))
+    if end is not None:
+        mask &= times <= int(np.datetime64(end, "s").astype(np.int64))
+
+    return times[mask], lats[mask], lons[mask]
+
+
+def position_at(track, when):
+    """
+    Interpolated position of a vessel on its stored track
+
+    Args:
+        track (Track): Stored track
+        when (datetime): Time of the position
+
+    Returns:
+        tuple: (latitude, longitude), None outside of the track
+    """
+    times, lats, lons = decode_track(track.data)
+    lat, lon = interpolate_track(times, lats, lons, np.datetime64(when, "s").astype(np.int64))
+
+    if np.isnan(lat):
+        return None
+    return float(lat), float(lon)
+
+
+@timed_stage("tracks")
+def update_tracks(batch_size=None):
+    """
+    Extend the track of every vessel with the statuses received since its last point
+
+    Args:
+        batch_size (int): Vessels updated per transaction, defaults to TRACK_BATCH_SIZE
+
+    Returns:
+        int: Number of vessels whose track was extended
+    """
+    batch_size = batch_size or settings.TRACK_BATCH_SIZE
+
+    with next(get_session()) as session:
+        imos = [
+            imo for imo, in session.query(VesselStatus.imo)
+            .outerjoin(Track, Track.imo == VesselStatus.imo)
+            .filter(or_(Track.end == None, VesselStatus.freshness > Track.end))
+            .group_by(VesselStatus.imo)
+            .all()
+        ]
+
+    for start in range(0, len(imos), batch_size):
+        with write_session() as session:
+            for imo in imos[start:start + batch_size]:
+                track = session.get(Track, imo)
+
+                query = session.query(VesselStatus.freshness, VesselStatus.latitude, VesselStatus.longitude).filter(VesselStatus.imo == imo)
+                if track is not None:
+                    query = query.filter(VesselStatus.freshness > track.end)
+                statuses = query.order_by(VesselStatus.freshness, VesselStatus.id).all()
+
+                freshness, lats, lons = zip(*statuses)
+                times, lats, lons = extend_track(
+                    decode_track(track.data) if track is not None else None, to_epoch(freshness), lats, lons
+                )
+
+                track = track or Track(imo=imo)
+                track.start = str(np.datetime64(int(times[0]), "s")).replace("T", " ")
+                track.end = str(np.datetime64(int(times[-1]), "s")).replace("T", " ")
+                track.points = len(times)
+                track.data = encode_track(times, lats, lons)
+                track.updated_at = datetime.utcnow()
+                session.add(track)
+
+                ROWS.labels("tracks").inc(len(statuses))
+
+            session.commit()
+
+    logger.debug("Extended the tracks of %d vessels", len(imos))
+    return len(imos)
@@ -0,0 +1,133 @@
+"""
+Benchmarks of the ingestion, pass prediction and imagery hot paths
+
+Run them apart from the unit tests and keep the results to compare runs:
+
+    pytest tests/benchmarks --benchmark-autosave
+    pytest tests/benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Results are saved under .benchmarks/, the second command fails when a benchmark got more than
+10% slower than the last saved run. BENCHMARK_SCALE multiplies the size of the synthetic inputs.
+"""
+import bz2
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from types import SimpleNamespace
+
+pytest.importorskip("pytest_benchmark")
+
+SCALE = float(os.environ.get("BENCHMARK_SCALE", 1))
+
+
+def scaled(value):
+    return max(1, int(value * SCALE))
+
+
+@pytest.fixture(scope="session")
+def scale():
+    """Scales a benchmark input size by BENCHMARK_SCALE"""
+    return scaled
+
+
+@pytest.fixture(scope="session")
+def aishub_payload():
+    """bz2 compressed AISHub response (format 1, human readable) with scaled(5000) ships"""
+    rng = np.random.default_rng(0)
+    count = scaled(5000)
+    ships = [
+        {
+            "MMSI": 200000000 + i, "TIME": "2025-01-01 12:00:00 GMT",
+            "LONGITUDE": float(rng.uniform(-180, 180)), "LATITUDE": float(rng.uniform(-80, 80)),
+            "COG": 90.0, "SOG": 12.3, "HEADING": 90, "ROT": 0, "NAVSTAT": 0,
+            "IMO": 9000000 + i, "NAME": f"VESSEL {i}", "CALLSIGN": f"CALL{i}", "TYPE": 70,
+            "A": 100, "B": 20, "C": 10, "D": 10, "DRAUGHT": 8.5, "DEST": "ROTTERDAM", "ETA": "01-02 12:00",
+        }
+        for i in range(count)
+    ]
+    header = {"ERROR": False, "USERNAME": "benchmark", "FORMAT": "HUMAN", "RECORDS": count}
+    return bz2.compress(json.dumps([header, ships]).encode())
+
+
+@pytest.fixture(scope="session")
+def synthetic_tles():
+    """scaled(8) TLEs of sun-synchronous satellites spread over the orbital planes"""
+    from src.services.tle import omm_to_tles
+
+    count = scaled(8)
+    omm = pd.DataFrame({
+        "OBJECT_NAME": [f"SAT-{i}" for i in range(count)],
+        "OBJECT_ID": [f"2025-{i + 1:03d}A" for i in range(count)],
+        "EPOCH": "2025-01-01T00:00:00",
+        "MEAN_MOTION": 14.3,
+        "ECCENTRICITY": 0.0001,
+        "INCLINATION": 98.6,
+        "RA_OF_ASC_NODE": np.linspace(0, 360, count, endpoint=False),
+        "ARG_OF_PERICENTER": 90.0,
+        "MEAN_ANOMALY": np.linspace(0, 360, count, endpoint=False),
+        "NORAD_CAT_ID": np.arange(90000, 90000 + count),
+        "BSTAR": 0.0001,
+        "MEAN_MOTION_DOT": 0.0,
+        "MEAN_MOTION_DDOT": 0.0,
+    })
+    tles = omm_to_tles(omm)
+
+    return [
+        SimpleNamespace(
+            satellite_id=90000 + i, line1=line1, line2=line2,
+            satellite=SimpleNamespace(name=name, swath_width_km=290.0, max_off_nadir_deg=None)
+        )
+        for i, (name, line1, line2) in enumerate(zip(tles["name"], tles["line1"], tles["line2"]))
+    ]
+
+
+@pytest.fixture(scope="session")
+def synthetic_bands(tmp_path_factory):
+    """Blue, green and red JP2 bands of scaled(2048) pixels square (at least one patch), named like the downloaded bands"""
+    import rasterio
+    from rasterio.transform import from_origin
+
+    size = max(1024, scaled(2048))
+    directory = tmp_path_factory.mktemp("bands")
+    rng = np.random.default_rng(0)
+    paths = []
+
+    for band in ("B02", "B03", "B04"):
+        path = directory / f"product_{band}.jp2"
+        with rasterio.open(
+            path, "w", driver="JP2OpenJPEG", width=size, height=size, count=1, dtype="uint16",
+            crs="EPSG:32631", transform=from_origin(500000, 5000000, 10, 10)
+        ) as dst:
+            dst.write(rng.integers(0, 5000, (1, size, size), dtype=np.uint16))
+        paths.append(str(path))
+
+    return paths
+
+
+class StubResult:
+    """Stands in for an ultralytics OBB result with a fixed number of boxes"""
+
+    def __init__(self, boxes=20):
+        self.orig_shape = (1024, 1024)
+        self.obb = [
+            SimpleNamespace(
+                cls=np.array(0.0),
+                xyxyxyxy=SimpleNamespace(cpu=lambda: SimpleNamespace(numpy=lambda: np.arange(8, dtype=float).reshape(4, 2)))
+            )
+            for _ in range(boxes)
+        ]
+
+    def save(self, filename):
+        open(filename, "wb").close()
+
+
+@pytest.fixture(scope="session")
+def inference():
+    """src.services.inference with the YOLO weights replaced by a stub model"""
+    from src.services import inference
+
+    inference.set_model(lambda image_path: [StubResult()])
+    yield inference
+    inference.set_model(None)
@@ -0,0 +1,38 @@
+import numpy as np
+from datetime import datetime
+from src.services.calculations import get_closest_pass, get_vessel_passes, find_passes, propagate
+from beyond.io.tle import Tle
+
+
+def test_get_closest_pass(benchmark, synthetic_tles, scale):
+    rng = np.random.default_rng(0)
+    vessels = list(zip(rng.uniform(-70, 70, scale(4)), rng.uniform(-180, 180, scale(4))))
+
+    def run():
+        return [get_closest_pass(lat, lon, datetime(2025, 1, 1), synthetic_tles, hours=24) for lat, lon in vessels]
+
+    passes = benchmark.pedantic(run, rounds=3)
+    assert len(passes) == len(vessels)
+
+
+def test_find_passes(benchmark, synthetic_tles, scale):
+    tle = synthetic_tles[0]
+    times, lats, lons, alts = propagate(Tle(tle.line1 + "\n" + tle.line2), datetime(2025, 1, 1), 72, 30)
+
+    rng = np.random.default_rng(0)
+    vessels = list(zip(rng.uniform(-70, 70, scale(100)), rng.uniform(-180, 180, scale(100))))
+
+    benchmark(lambda: [find_passes(lat, lon, times, lats, lons, alts, tle.satellite) for lat, lon in vessels])
+
+
+def test_get_vessel_passes(benchmark, synthetic_tles, scale):
+    rng = np.random.default_rng(0)
+    n = scale(100)
+    vessels = {
+        "latitude": rng.uniform(-70, 70, n), "longitude": rng.uniform(-180, 180, n),
+        "course": rng.uniform(0, 360, n), "speed": rng.uniform(0, 20, n),
+        "time": np.full(n, np.datetime64("2025-01-01T00:00:00", "s")),
+    }
+
+    passes = benchmark.pedantic(lambda: get_vessel_passes(vessels, synthetic_tles, hours=24), rounds=3)
+    assert len(passes) == n
@@ -0,0 +1,70 @@
+def test_create_cropped_patches(benchmark, inference, synthetic_bands, tmp_path):
+    patches = benchmark.pedantic(
+        inference.create_cropped_patches,
+        args=(synthetic_bands, (1024, 1024), tmp_path, "product", (1024, 1024)),
+        rounds=3
+    )
+    assert patches
+
+
+def test_generate_composite_image(benchmark, inference, synthetic_bands, tmp_path):
+    inference.create_cropped_patches(synthetic_bands, (1024, 1024), tmp_path, "product", (1024, 1024))
+
+    rgb_path = benchmark(inference.generate_composite_image, tmp_path, tmp_path, "product_patch_y0_x0")
+    assert rgb_path.exists()
+
+
+def test_run_ship_detection(benchmark, inference, synthetic_bands, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    inference.create_cropped_patches(synthetic_bands, (1024, 1024), tmp_path, "product", (1024, 1024))
+    rgb_path = inference.generate_composite_image(tmp_path, tmp_path, "product_patch_y0_x0")
+
+    benchmark(inference.run_ship_detection, rgb_path)
+    assert len(inference.load_detections(rgb_path)) == 20
+
+
+def test_composite_rgb(benchmark, scale):
+    import numpy as np
+    from src.services.raster import composite_rgb
+
+    size = scale(4096)
+    red, green, blue = np.random.default_rng(0).integers(0, 10000, (3, size, size), dtype=np.uint16)
+    out = np.empty((size, size, 3), dtype=np.uint8)
+
+    benchmark(composite_rgb, red, green, blue, out=out)
+
+
+def peak_memory(function, *args, **kwargs):
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_composite_rgb_peak_memory(scale):
+    import numpy as np
+    from src.services.raster import composite_rgb
+
+    # Larger than one block of rows, otherwise the block buffer is a full band
+    size = max(scale(4096), 1024)
+    red, green, blue = np.random.default_rng(0).integers(0, 10000, (3, size, size), dtype=np.uint16)
+    out = np.empty((size, size, 3), dtype=np.uint8)
+
+    def dstack_composite(red, green, blue, gain=2):
+        # The float path composite_rgb replaced: one float64 band per channel, then stacked
+        bands = [np.clip(band * gain / 10000, 0, 1) for band in (red, green, blue)]
+        return (np.dstack(bands) * 255).astype(np.uint8)
+
+    peak = peak_memory(composite_rgb, red, green, blue, out=out)
+    dstack_peak = peak_memory(dstack_composite, red, green, blue)
+
+    # float32 rounding may move a pixel by one level
+    assert np.abs(out.astype(int) - dstack_composite(red, green, blue)).max() <= 1
+    # Only the float32 block buffer (plus numpy's small casting buffers) is allocated, never a
+    # full-size float band
+    assert peak <= 512 * size * 4 + 2 ** 20
+    assert peak * 10 < dstack_peak
@@ -0,0 +1,29 @@
+import io
+import pytest
+from unittest.mock import patch
+from src.services.db import get_session, init_db
+from src.services.ingestion import ingest_AIS_data
+from src.schemas.data_schema import AISData
+
+
+@pytest.fixture
+def empty_ais_table():
+    init_db()
+    yield
+    with next(get_session()) as session:
+        session.query(AISData).delete()
+        session.commit()
+
+
+def clear_ais_table():
+    with next(get_session()) as session:
+        session.query(AISData).delete()
+        session.commit()
+
+
+def test_ingest_ais_data(benchmark, aishub_payload, empty_ais_table):
+    with patch("urllib.request.urlopen", side_effect=lambda url: io.BytesIO(aishub_payload)):
+        benchmark.pedantic(ingest_AIS_data, setup=clear_ais_table, rounds=3)
+
+    with next(get_session()) as session:
+        assert session.query(AISData).count() > 0
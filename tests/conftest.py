@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+# The settings are read when the services are imported, point them at a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+for name in ("CATALOGUE_URL", "AUTH_URL", "COLLECTION_NAME", "PRODUCT_TYPE", "USERNAME", "PASSWORD", "AISHUB_URL", "N2YO_API_KEY"):
+    os.environ.setdefault(name, "test")
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmarks", action="store_true", help="Run the benchmarks in tests/benchmarks")
+
+
+def pytest_ignore_collect(collection_path, config):
+    # The benchmarks are slow, they only run when their directory is passed or with --benchmarks
+    if collection_path.name == "benchmarks" and not config.getoption("--benchmarks"):
+        return True
@@ -0,0 +1,52 @@
+import bz2
+import json
+import xml.etree.ElementTree as ET
+import pandas as pd
+from fastapi.testclient import TestClient
+from src.harness import StandIn, create_app
+from src.services.tle import validate_tles
+
+stand_in = StandIn(vessels=5, satellites=2, band_size=64)
+client = TestClient(create_app(stand_in))
+
+
+def test_aishub_feed():
+    header, ships = json.loads(bz2.decompress(client.get("/aishub").content))
+    assert header["RECORDS"] == 5
+    assert {"MMSI", "IMO", "LATITUDE", "LONGITUDE", "TIME"} <= set(ships[0])
+
+
+def test_n2yo_serves_valid_tles():
+    response = client.get("/n2yo/tle/90001&apiKey=harness").json()
+    line1, line2 = response["tle"].split("\r\n")
+
+    assert len(validate_tles(pd.DataFrame({"line1": [line1], "line2": [line2]}))) == 1
+    assert client.get("/n2yo/tle/12345&apiKey=harness").status_code == 404
+
+
+def test_catalogue_manifest_and_bands():
+    query = (
+        "Collection/Name eq 'SENTINEL-2' and "
+        "OData.CSC.Intersects(area=geography'SRID=4326;POLYGON((2.1 48.9, 2.3 48.9, 2.3 49.1, 2.1 49.1, 2.1 48.9))') and "
+        "ContentDate/Start gt 2025-01-01 and ContentDate/Start lt 2025-01-02"
+    )
+    products = client.get("/odata/v1/Products", params={"$filter": query}).json()["value"]
+    assert len(products) == 1
+    product = products[0]
+
+    manifest = client.get(f"/odata/v1/Products('{product['Id']}')/Nodes({product['Name']})/Nodes(MTD_MSIL1C.xml)/$value")
+    bands = [element.text for element in ET.fromstring(manifest.content)[0][0][12][0][0]]
+    assert [band[-7:] for band in bands] == ["B02.jp2", "B03.jp2", "B04.jp2"]
+
+    parts = bands[0].split("/")
+    band = client.get(
+        f"/odata/v1/Products({product['Id']})/Nodes({product['Name']})/"
+        f"Nodes({parts[0]})/Nodes({parts[1]})/Nodes({parts[2]})/Nodes({parts[3]})/$value"
+    )
+    assert band.status_code == 200
+    assert band.content == stand_in.band("B02")
+
+
+def test_injected_failures():
+    failing = TestClient(create_app(stand_in, failure_rate=1.0))
+    assert failing.post("/auth/token").status_code == 503
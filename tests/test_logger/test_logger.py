@@ -0,0 +1,91 @@
+import json
+import logging
+import numpy as np
+from src.logger.logger import (
+    ArgumentRepr,
+    CustomColourizedFormatter,
+    JsonFormatter,
+    log_function_call_debug,
+)
+
+
+class CountingRepr:
+    calls = 0
+
+    def __repr__(self):
+        CountingRepr.calls += 1
+        return "counted"
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_logger(level):
+    logger = logging.getLogger(f"test_logger.{level}")
+    logger.handlers = []
+    logger.propagate = False
+    logger.setLevel(level)
+    handler = ListHandler()
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def test_decorated_call_formats_nothing_when_debug_is_off():
+    logger, handler = make_logger(logging.INFO)
+    CountingRepr.calls = 0
+
+    @log_function_call_debug(logger)
+    def identity(value):
+        return value
+
+    identity(CountingRepr())
+
+    assert CountingRepr.calls == 0
+    assert handler.records == []
+
+
+def test_decorated_call_caps_large_arguments():
+    logger, handler = make_logger(logging.DEBUG)
+
+    @log_function_call_debug(logger)
+    def total(array):
+        return array.sum()
+
+    total(np.zeros((1000, 1000)))
+
+    message = handler.records[0].getMessage()
+    assert "ndarray(shape=(1000, 1000), dtype=float64)" in message
+    assert handler.records[0].function.endswith("total")
+
+
+def test_sampling_skips_calls():
+    logger, handler = make_logger(logging.DEBUG)
+
+    @log_function_call_debug(logger, sample_rate=0)
+    def identity(value):
+        return value
+
+    assert identity(1) == 1
+    assert handler.records == []
+
+
+def test_argument_repr_truncates_strings():
+    assert len(ArgumentRepr(max_length=20).repr("x" * 1000)) <= 20
+
+
+def test_formatters():
+    record = logging.makeLogRecord({"name": "test", "levelname": "INFO", "levelno": logging.INFO, "msg": "hello %s", "args": ("world",), "function": "f"})
+
+    CustomColourizedFormatter("{levelname} {message}", style="{", use_colors=True).format(record)
+    assert record.levelname == "INFO"
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["function"] == "f"
@@ -0,0 +1,94 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.routers import ingestion
+from src.services.db import get_session, init_db
+from src.schemas.data_schema import Vessel, Satellite
+
+app = FastAPI()
+app.include_router(ingestion.router, prefix="/ingest")
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def db():
+    init_db()
+    yield
+    with next(get_session()) as session:
+        session.query(Vessel).delete()
+        session.query(Satellite).delete()
+        session.commit()
+
+
+def test_bulk_vessels_json_array_upserts_and_reports_errors():
+    response = client.post("/ingest/vessels/bulk", json=[
+        {"imo": 1, "mmsi": "1", "vessel_name": "first"},
+        {"imo": "not a number"},
+        {"imo": 2, "mmsi": "2", "vessel_name": "second"},
+    ])
+    assert response.status_code == 200
+    report = response.json()
+    assert report["received"] == 3
+    assert (report["inserted"], report["updated"]) == (2, 0)
+    assert [error["index"] for error in report["errors"]] == [1]
+
+    # Updating only sends the changed fields, the others are kept
+    report = client.post("/ingest/vessels/bulk", json=[{"imo": 1, "flag": "MT"}]).json()
+    assert (report["inserted"], report["updated"]) == (0, 1)
+
+    with next(get_session()) as session:
+        vessel = session.get(Vessel, 1)
+        assert (vessel.vessel_name, vessel.flag) == ("first", "MT")
+        assert session.query(Vessel).count() == 2
+
+
+def test_bulk_satellites_ndjson():
+    lines = [json.dumps({"id": i, "name": f"sat-{i}", "orbit": [], "swath_width_km": 290}) for i in range(100)]
+    body = "\n".join(lines[:50] + ["{broken"] + lines[50:])
+
+    response = client.post("/ingest/satellites/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    report = response.json()
+
+    assert report["inserted"] == 100
+    assert report["errors"][0]["index"] == 50
+
+    with next(get_session()) as session:
+        assert session.query(Satellite).count() == 100
+        assert session.get(Satellite, 99).swath_width_km == 290
+
+
+def test_bulk_ndjson_is_upserted_in_chunks(monkeypatch):
+    monkeypatch.setattr(ingestion.settings, "BULK_CHUNK_SIZE", 7)
+    chunks = []
+    upsert_records = ingestion.upsert_records
+    monkeypatch.setattr(ingestion, "upsert_records", lambda session, model, rows: chunks.append(len(rows)) or upsert_records(session, model, rows))
+
+    lines = [json.dumps({"imo": i, "mmsi": str(i)}) for i in range(1, 21)]
+    lines[11] = json.dumps({"imo": "not a number"})
+    body = "\n\n".join(lines[:10] + ["{broken"] + lines[10:]) + "\n"
+
+    def stream():
+        # The body arrives in pieces that split the lines
+        for start in range(0, len(body), 23):
+            yield body[start:start + 23].encode()
+
+    report = client.post("/ingest/vessels/bulk", content=stream(), headers={"Content-Type": "application/x-ndjson"}).json()
+
+    assert report["received"] == 21
+    assert (report["inserted"], report["updated"]) == (19, 0)
+    assert [error["index"] for error in report["errors"]] == [10, 12]
+    assert max(chunks) <= 7 and len(chunks) == 3
+
+    with next(get_session()) as session:
+        assert session.query(Vessel).count() == 19
+
+
+def test_single_vessel_uses_async_session():
+    response = client.post("/ingest/vessels/", json={"imo": 3, "mmsi": "3", "vessel_name": "third"})
+
+    assert response.status_code == 200
+    assert response.json()["vessel_name"] == "third"
+
+    with next(get_session()) as session:
+        assert session.get(Vessel, 3).vessel_name == "third"
@@ -0,0 +1,59 @@
+import pytest
+from datetime import datetime
+from beyond.io.tle import Tle
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.routers import passes
+from src.services import prediction
+from src.services.calculations import propagate
+from src.services.db import get_session, init_db
+from src.schemas.data_schema import Satellite, TLE
+
+ISS_LINE1 = "1 25544U 98067A   08264.51782528 -.00002182  00000-0 -11606-4 0  2927"
+ISS_LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537"
+
+app = FastAPI()
+app.include_router(passes.router, prefix="/passes")
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def iss(monkeypatch):
+    monkeypatch.setattr(prediction.settings, "PREDICTION_WORKERS", 0)
+    prediction.prediction_cache.clear()
+    init_db()
+    with next(get_session()) as session:
+        session.add(Satellite(id=25544, name="ISS", orbit=[]))
+        session.add(TLE(satellite_id="25544", line1=ISS_LINE1, line2=ISS_LINE2, created_at=datetime(2008, 9, 20)))
+        session.commit()
+    yield
+    prediction.shutdown_executor()
+    with next(get_session()) as session:
+        session.query(TLE).delete()
+        session.query(Satellite).delete()
+        session.commit()
+
+
+def test_predict_finds_the_pass_over_the_ground_track_and_caches_it():
+    _, lats, lons, _ = propagate(Tle(ISS_LINE1 + "\n" + ISS_LINE2), datetime(2008, 9, 20, 13), 2, 60)
+    params = {"lat": round(lats[30], 2), "lon": round(lons[30], 2), "start": "2008-09-20T12:00:00", "hours": 6}
+
+    first = client.get("/passes/predict", params=params).json()
+    assert not first["cached"]
+    assert any(p["satellite"] == "ISS" and p["timestamp"] == "2008-09-20 13:30:00" for p in first["passes"])
+
+    # Same location bucket and TLE version
+    second = client.get("/passes/predict", params={**params, "start": "2008-09-20T12:05:00"}).json()
+    assert second["cached"]
+    assert second["passes"] == first["passes"]
+
+    # Editing the sensor definition invalidates the cached prediction
+    with next(get_session()) as session:
+        session.get(Satellite, 25544).swath_width_km = 10
+        session.commit()
+    assert not client.get("/passes/predict", params=params).json()["cached"]
+
+
+def test_predict_unknown_satellite():
+    response = client.get("/passes/predict", params={"lat": 0, "lon": 0, "sats": "unknown"})
+    assert response.status_code == 404
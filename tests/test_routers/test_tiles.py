@@ -0,0 +1,82 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.routers import tiles
+from src.services.db import get_session, init_db
+from src.services.tiles import tile_bounds, to_tile_pixels, encode_mvt
+from src.schemas.data_schema import Vessel, VesselStatus
+
+app = FastAPI()
+app.include_router(tiles.router, prefix="/tiles")
+client = TestClient(app)
+
+
+def add_position(imo, latitude, longitude):
+    with next(get_session()) as session:
+        vessel = session.get(Vessel, imo) or Vessel(imo=imo, mmsi=str(imo), vessel_name=f"vessel-{imo}")
+        status = VesselStatus(imo=imo, freshness="2025-01-01 00:00:00", latitude=latitude, longitude=longitude, speed=12.5)
+        vessel.statuses.append(status)
+        session.add(vessel)
+        session.commit()
+        vessel.latest_status_id = status.id
+        session.add(vessel)
+        session.commit()
+
+
+@pytest.fixture(autouse=True)
+def fleet():
+    init_db()
+    tiles.tile_cache.clear()
+    add_position(1, 10.0, 10.0)
+    add_position(2, -10.0, -10.0)
+    yield
+    with next(get_session()) as session:
+        session.query(VesselStatus).delete()
+        session.query(Vessel).delete()
+        session.commit()
+
+
+def test_tile_geometry():
+    assert tile_bounds(0, 0, 0) == pytest.approx((-180, -85.0511, 180, 85.0511), abs=1e-4)
+    px, py = to_tile_pixels(1, 1, 0, [0.0], [0.0])
+    assert (px[0], py[0]) == (0, 4096)
+
+
+def test_mvt_tile_holds_the_positions_of_the_tile():
+    mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+    response = client.get("/tiles/1/1/0.mvt")
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+
+    layer = mapbox_vector_tile.decode(response.content)["vessels"]
+    assert [feature["properties"]["vessel_name"] for feature in layer["features"]] == ["vessel-1"]
+    assert layer["features"][0]["properties"]["speed"] == 12.5
+
+
+def test_tiles_are_cached_until_a_new_status_arrives():
+    first = client.get("/tiles/0/0/0.pbf")
+    assert client.get("/tiles/0/0/0.pbf", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    add_position(3, 20.0, 20.0)
+    second = client.get("/tiles/0/0/0.pbf", headers={"If-None-Match": first.headers["etag"]})
+
+    assert second.status_code == 200
+    assert len(second.content) > len(first.content)
+
+
+def test_arrow_tile():
+    pa = pytest.importorskip("pyarrow")
+
+    response = client.get("/tiles/0/0/0.arrow")
+    table = pa.ipc.open_stream(response.content).read_all()
+
+    assert sorted(table.column("imo").to_pylist()) == [1, 2]
+
+
+def test_encode_line_strings():
+    mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+    tile = encode_mvt({"tracks": [(2, [(0, 0), (10, 20), (-5, 30)], {"satellite": "S2A"})]})
+    feature = mapbox_vector_tile.decode(tile, default_options={"y_coord_down": True})["tracks"]["features"][0]
+
+    assert feature["geometry"] == {"type": "LineString", "coordinates": [[0, 0], [10, 20], [-5, 30]]}
@@ -0,0 +1,75 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.routers import vessels
+from src.services.db import get_session, init_db
+from src.schemas.data_schema import Vessel, VesselStatus, Track
+from src.services.tracks import update_tracks
+
+app = FastAPI()
+app.include_router(vessels.router, prefix="/vessels")
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def fleet():
+    init_db()
+    with next(get_session()) as session:
+        for imo in range(1, 31):
+            vessel = Vessel(imo=imo, mmsi=str(imo), vessel_type="cargo" if imo % 2 else "tanker")
+            session.add(vessel)
+            for hour in range(2):
+                status = VesselStatus(imo=imo, freshness=f"2025-01-01 0{hour}:00:00", latitude=imo, longitude=-imo)
+                vessel.statuses.append(status)
+                session.add(status)
+            session.commit()
+            vessel.latest_status_id = status.id
+            session.add(vessel)
+        session.commit()
+    yield
+    with next(get_session()) as session:
+        session.query(Track).delete()
+        session.query(VesselStatus).delete()
+        session.query(Vessel).delete()
+        session.commit()
+
+
+def test_latest_positions_filters_and_paginates():
+    params = {"bbox": "-20,5,0,25", "vessel_type": "cargo", "limit": 4}
+
+    page = client.get("/vessels/positions", params=params).json()
+    imos = [item["imo"] for item in page["items"]]
+    while page["next_cursor"]:
+        page = client.get("/vessels/positions", params={**params, "cursor": page["next_cursor"]}).json()
+        imos += [item["imo"] for item in page["items"]]
+
+    assert imos == [5, 7, 9, 11, 13, 15, 17, 19]
+    assert all(item["freshness"] == "2025-01-01 01:00:00" for item in page["items"])
+
+
+def test_statuses_stream_ndjson_with_time_filter():
+    response = client.get("/vessels/statuses", params={"start": "2025-01-01T00:30:00", "stream": True, "limit": 7})
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 30
+    assert {row["freshness"] for row in rows} == {"2025-01-01 01:00:00"}
+
+
+def test_bad_parameters_answer_400():
+    assert client.get("/vessels/positions", params={"bbox": "1,2,3"}).status_code == 400
+    assert client.get("/vessels/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_track_and_interpolated_position():
+    update_tracks()
+
+    track = client.get("/vessels/3/track").json()
+    assert [point["timestamp"] for point in track["points"]] == ["2025-01-01 00:00:00", "2025-01-01 01:00:00"]
+
+    position = client.get("/vessels/3/position", params={"at": "2025-01-01T00:30:00"}).json()
+    assert position["latitude"] == pytest.approx(3) and position["longitude"] == pytest.approx(-3)
+
+    assert client.get("/vessels/3/position", params={"at": "2025-01-02T00:00:00"}).status_code == 404
+    assert client.get("/vessels/999/track").status_code == 404
@@ -0,0 +1,154 @@
+import numpy as np
+from datetime import datetime
+from types import SimpleNamespace
+from beyond.io.tle import Tle
+from src.services.calculations import (
+    distance_km, find_passes, propagate, get_closest_pass, dead_reckon, point_in_footprint,
+    project_positions, position_uncertainty_km, match_vessel_passes, get_vessel_passes
+)
+
+ISS_LINE1 = "1 25544U 98067A   08264.51782528 -.00002182  00000-0 -11606-4 0  2927"
+ISS_LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537"
+
+
+def straight_track(lon_offset):
+    # Ground track running north along a meridian, one sample per minute
+    lats = np.linspace(-10, 10, 41)
+    lons = np.full_like(lats, lon_offset)
+    times = np.datetime64("2025-01-01T00:00:00") + np.arange(len(lats)) * np.timedelta64(60, "s")
+    return times, lats, lons, np.full_like(lats, 786.0)
+
+
+def test_distance_km():
+    assert np.isclose(distance_km(0, 0, 0, 1), 111.19, atol=0.01)
+    assert np.allclose(distance_km(0, 0, np.zeros(2), np.array([0, 1])), [0, 111.19], atol=0.01)
+
+
+def test_find_passes_measures_across_track_distance():
+    times, lats, lons, alts = straight_track(1.0)
+
+    passes = find_passes(0.1, 0.0, times, lats, lons, alts, name="sat")
+
+    assert len(passes) == 1
+    assert np.isclose(passes[0][1], 111.19, atol=0.5)
+    assert passes[0][2] == "2025-01-01 00:20:00"
+    assert passes[0][3] == "sat"
+
+
+def test_find_passes_respects_the_sensor_swath():
+    times, lats, lons, alts = straight_track(1.0)
+    narrow = SimpleNamespace(name="narrow", swath_width_km=100, max_off_nadir_deg=None)
+    pointable = SimpleNamespace(name="pointable", swath_width_km=100, max_off_nadir_deg=30)
+
+    assert find_passes(0.1, 0.0, times, lats, lons, alts, narrow) == []
+    assert len(find_passes(0.1, 0.0, times, lats, lons, alts, pointable)) == 1
+
+
+def test_propagate_and_closest_pass():
+    sat = Tle(ISS_LINE1 + "\n" + ISS_LINE2)
+    times, lats, lons, alts = propagate(sat, "2008-09-21 00:00:00", 24, 60)
+
+    assert len(times) == 1441
+    assert times[0] == np.datetime64(datetime(2008, 9, 21))
+    assert np.all(np.abs(lats) <= 52) and np.all((alts > 300) & (alts < 400))
+
+    tle = SimpleNamespace(line1=ISS_LINE1, line2=ISS_LINE2, satellite=None, satellite_id=25544)
+    passes = get_closest_pass(lats[100], lons[100], "2008-09-21 00:00:00", [tle])
+
+    assert passes[0][1] < 1
+    assert passes[0][3] == "25544"
+    assert all(p[1] <= 145 for p in passes)
+
+
+def test_dead_reckon():
+    lat, lon = dead_reckon(0, 0, 90, 10, 6)
+    assert np.isclose(distance_km(0, 0, lat, lon), 111.12, atol=0.5)
+    assert np.isclose(lat, 0, atol=1e-6) and lon > 0
+
+    # Course or speed not available keeps the last position
+    assert dead_reckon(10, 20, 360, 10, 6) == (10, 20)
+    assert dead_reckon(10, 20, 90, 102.3, 6) == (10, 20)
+
+
+def test_project_positions_broadcasts():
+    lats, lons = project_positions(np.array([0, 10]), np.array([0, 20]), np.array([90, np.nan]), np.array([10, 10]), np.array([[6], [12]]))
+
+    assert lats.shape == (2, 2)
+    assert np.allclose((lats[0, 0], lons[0, 0]), dead_reckon(0, 0, 90, 10, 6))
+    assert np.allclose((lats[1, 0], lons[1, 0]), dead_reckon(0, 0, 90, 10, 12))
+    assert np.allclose(lats[:, 1], 10) and np.allclose(lons[:, 1], 20)
+
+    # The uncertainty grows with the distance sailed, faster when the speed is unknown
+    assert np.allclose(position_uncertainty_km(np.array([10, np.nan]), 6), [1 + 0.1 * 111.12, 1 + 12 * 1.852 * 6])
+
+
+def vessels(*rows):
+    lats, lons, courses, speeds, times = zip(*rows)
+    return {
+        "latitude": np.array(lats, dtype=float), "longitude": np.array(lons, dtype=float),
+        "course": np.array(courses, dtype=float), "speed": np.array(speeds, dtype=float),
+        "time": np.array(times, dtype="datetime64[s]"),
+    }
+
+
+def test_match_vessel_passes_uses_the_predicted_position():
+    times, lats, lons, alts = straight_track(1.0)
+    narrow = SimpleNamespace(name="narrow", swath_width_km=100, max_off_nadir_deg=None)
+
+    passes = match_vessel_passes(times, lats, lons, alts, vessels(
+        # Sails east into the swath before the pass at 00:20
+        (0.1, 0.0, 90, 20, "2024-12-31 21:00:00"),
+        # Stays outside of it
+        (0.1, 0.0, None, None, "2024-12-31 21:00:00"),
+        # Reported after the pass
+        (0.1, 1.0, None, None, "2025-01-01 00:30:00"),
+    ), narrow)
+
+    assert [len(found) for found in passes] == [1, 0, 0]
+    (sat_lat, sat_lon), across_track, date, name, (vessel_lat, vessel_lon), radius = passes[0][0]
+    assert across_track < 50 and date == "2025-01-01 00:20:00" and name == "narrow"
+    assert np.isclose(vessel_lon, dead_reckon(0.1, 0.0, 90, 20, 3 + 1 / 3)[1], atol=1e-3)
+    assert np.isclose(radius, position_uncertainty_km(20, 3 + 1 / 3))
+
+
+def test_get_vessel_passes_matches_get_closest_pass_for_still_vessels():
+    tle = SimpleNamespace(line1=ISS_LINE1, line2=ISS_LINE2, satellite=None, satellite_id=25544)
+    sat = Tle(ISS_LINE1 + "\n" + ISS_LINE2)
+    _, lats, lons, _ = propagate(sat, "2008-09-21 00:00:00", 24, 60)
+
+    still = [(lats[i] + 0.3, lons[i], None, None, "2008-09-21 00:00:00") for i in (100, 400, 900)]
+    passes = get_vessel_passes(vessels(*still), [tle])
+
+    for (lat, lon, *_), found in zip(still, passes):
+        expected = get_closest_pass(lat, lon, "2008-09-21 00:00:00", [tle])
+        found, expected = sorted(found, key=lambda p: p[2]), sorted(expected, key=lambda p: p[2])
+        assert [p[2] for p in found] == [p[2] for p in expected]
+        assert np.allclose([p[1] for p in found], [p[1] for p in expected])
+
+
+def test_point_in_footprint_excludes_holes():
+    square = [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+    hole = [(4, 4), (6, 4), (6, 6), (4, 6), (4, 4)]
+    footprint = [[square, hole], [[(20, 20), (30, 20), (25, 30), (20, 20)]]]
+
+    assert point_in_footprint(2, 2, footprint)
+    assert not point_in_footprint(5, 5, footprint)
+    assert point_in_footprint(22, 25, footprint)
+    assert not point_in_footprint(15, 15, footprint)
+
+
+def test_get_vessel_passes_propagates_each_report_time_bucket_apart(monkeypatch):
+    from src.services import calculations
+
+    spans = []
+    original = calculations.propagate
+    monkeypatch.setattr(calculations, "propagate", lambda sat, start, span, step: spans.append(span) or original(sat, start, span, step))
+
+    tle = SimpleNamespace(line1=ISS_LINE1, line2=ISS_LINE2, satellite=None, satellite_id=25544)
+    reports = [(10.0, 20.0, None, None, "2008-09-18 00:00:00"), (10.0, 20.0, None, None, "2008-09-21 00:00:00")]
+    passes = get_vessel_passes(vessels(*reports), [tle], hours=12, bucket_hours=6)
+
+    # A stale report doesn't stretch the propagation of the recent one
+    assert spans == [12, 12]
+    alone = get_vessel_passes(vessels(reports[1]), [tle], hours=12)
+    assert [p[2] for p in passes[1]] == [p[2] for p in alone[0]]
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+import pytest
+from sqlalchemy import select, text
+from sqlmodel import SQLModel, Session
+from src.config.settings import get_settings
+from src.services.db import create_db_engine, init_db, write_session, uses_postgis
+from src.services.query import bbox_filter
+from src.schemas.data_schema import PipelineUnit, Vessel, VesselStatus
+
+settings = get_settings()
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request, tmp_path):
+    # PostgreSQL runs against TEST_POSTGRES_URL, e.g. a local postgis/postgis container
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path}/backend.db"
+    else:
+        url = os.getenv("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("TEST_POSTGRES_URL is not set")
+
+    engine = create_db_engine(url)
+    init_db(engine)
+    yield engine
+
+    SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def test_backend_profile(engine):
+    with engine.connect() as connection:
+        if engine.dialect.name == "sqlite":
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+            assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+        else:
+            indexes = set(connection.execute(text("SELECT indexname FROM pg_indexes WHERE indexdef LIKE '%USING gist%'")).scalars())
+            assert {"ix_aisdata_geom", "ix_vesselstatus_geom", "ix_satpass_geom", "ix_satpass_footprint_geom"} <= indexes
+
+
+def test_concurrent_writers_wait_for_the_lock(engine, tmp_path):
+    def write(worker):
+        for i in range(25):
+            with write_session(engine) as session:
+                session.add(PipelineUnit(key=f"{worker}:{i}", stage="test"))
+                session.commit()
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+
+    if engine.dialect.name == "sqlite":
+        # Another process holding the write lock for a while, the writers wait on the busy timeout
+        other = sqlite3.connect(engine.url.database, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        other.execute("COMMIT")
+        other.close()
+    else:
+        for thread in threads:
+            thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    with Session(engine) as session:
+        assert session.query(PipelineUnit).count() == 8 * 25
+
+
+def test_bbox_filter_matches_on_both_backends(engine):
+    with Session(engine) as session:
+        session.add(Vessel(imo=1, mmsi="1"))
+        for status_id, longitude in ((1, 179.5), (2, -179.5), (3, 0.0)):
+            session.add(VesselStatus(id=status_id, imo=1, freshness="2025-01-01 00:00:00", latitude=10.0, longitude=longitude))
+        session.commit()
+
+        def ids(bbox):
+            stmt = select(VesselStatus.id).where(bbox_filter(VesselStatus.latitude, VesselStatus.longitude, bbox, uses_postgis(engine)))
+            return sorted(session.execute(stmt).scalars())
+
+        assert ids((179, 0, -179, 20)) == [1, 2]
+        assert ids((-1, 0, 1, 20)) == [3]
+        assert ids((-1, 20, 1, 30)) == []
+
+
+def test_nested_write_session_raises(engine):
+    with write_session(engine):
+        with pytest.raises(RuntimeError, match="not reentrant"):
+            with write_session(engine):
+                pass
+
+    # The thread can write again once the outer session is closed
+    with write_session(engine) as session:
+        session.add(PipelineUnit(key="after", stage="test"))
+        session.commit()
+
+
+def test_init_db_adds_the_columns_missing_from_an_older_database(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE vessel (imo INTEGER PRIMARY KEY, mmsi VARCHAR)")
+        connection.exec_driver_sql("CREATE TABLE satellite (id INTEGER PRIMARY KEY, name VARCHAR, orbit JSON)")
+        connection.exec_driver_sql("INSERT INTO vessel (imo, mmsi) VALUES (1, '1')")
+
+    init_db(engine)
+    init_db(engine)
+
+    with Session(engine) as session:
+        vessel = session.get(Vessel, 1)
+        assert vessel.passes_dirty and vessel.latest_status_id is None
+        assert session.execute(text("SELECT swath_width_km, tle_checked_at FROM satellite")).all() == []
+    engine.dispose()
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite+aiosqlite://"])
+def test_in_memory_sqlite_engines(url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from src.services.db import _pool_args
+
+    assert "pool_size" not in _pool_args(url)
+    if url == "sqlite://":
+        engine = create_db_engine(url)
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("SELECT 1").scalar() == 1
+        engine.dispose()
+    else:
+        create_async_engine(url, **_pool_args(url)).sync_engine.dispose()
+
+
+def test_file_databases_keep_the_pool_settings(tmp_path):
+    from src.services.db import _pool_args
+
+    assert _pool_args(f"sqlite:///{tmp_path}/pool.db")["pool_size"] == settings.DB_POOL_SIZE
@@ -10,6 +10,7 @@ import os
 from src.services.inference import (
     authenticate,
     query_catalogue,
+    parse_footprint,
     download_manifest,
     parse_manifest,
     download_bands,
@@ -54,6 +55,35 @@ def test_query_catalogue(mock_get):
     mock_get.assert_called_once()
 
 
+@patch('requests.get')
+def test_query_catalogue_parses_footprints_and_dates(mock_get):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"value": [
+        {
+            "Id": "a", "Name": "product1",
+            "ContentDate": {"Start": "2025-01-01T10:30:24.024Z", "End": "2025-01-01T10:30:24.024Z"},
+            "GeoFootprint": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]},
+        },
+        {
+            "Id": "b", "Name": "product2", "ContentDate": {},
+            "Footprint": "geography'SRID=4326;MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((2 2, 3 2, 3 3, 2 2)))'",
+        },
+    ]}
+    mock_get.return_value = mock_response
+
+    df = query_catalogue('http://example.com', 'collection', 'product_type', 'aoi', 10, datetime(2025, 1, 1), datetime(2025, 1, 2))
+
+    assert df["footprint"][0] == [[[[0, 0], [1, 0], [1, 1], [0, 0]]]]
+    assert len(df["footprint"][1]) == 2
+    assert df["sensing_start"][0] == datetime(2025, 1, 1, 10, 30, 24, 24000)
+    assert pd.isna(df["sensing_start"][1])
+
+def test_parse_footprint():
+    assert parse_footprint("geography'SRID=4326;POLYGON ((1 2, 3 4, 5 6, 1 2))'") == [[[(1, 2), (3, 4), (5, 6), (1, 2)]]]
+    assert parse_footprint(None) is None
+    assert parse_footprint({"type": "Point", "coordinates": [0, 0]}) is None
+
 @patch('requests.Session.get')  
 def test_download_manifest(mock_get):
     mock_response = MagicMock()
@@ -75,3 +105,31 @@ def test_download_manifest(mock_get):
 
 
 
+
+
+def test_run_ship_detection_runs_the_shared_model_one_image_at_a_time(tmp_path, monkeypatch):
+    import threading
+    import time
+    from types import SimpleNamespace
+    from src.services import inference
+    from src.services.pipeline import fan_out
+
+    monkeypatch.chdir(tmp_path)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def model(image_path):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return [SimpleNamespace(orig_shape=(10, 10), obb=[], save=lambda filename: None)]
+
+    inference.set_model(model)
+    try:
+        fan_out(run_ship_detection, [f"patch_{i}.jpg" for i in range(8)], workers=4)
+    finally:
+        inference.set_model(None)
+
+    assert peak[0] == 1
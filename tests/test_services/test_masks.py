@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from src.services.masks import cloud_mask_location, visible_water_fraction, filter_tiles, SCL_WATER
+
+
+def write_raster(path, data, transform, crs="EPSG:32631"):
+    with rasterio.open(
+        path, "w", driver="GTiff", width=data.shape[2], height=data.shape[1], count=data.shape[0],
+        dtype=data.dtype, crs=crs, transform=transform
+    ) as dst:
+        dst.write(data)
+    return str(path)
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    # Two 1280 m tiles side by side, the right one has no data over its bottom half
+    left = np.full((3, 128, 128), 500, dtype=np.uint16)
+    right = left.copy()
+    right[:, 64:, :] = 0
+
+    write_raster(tmp_path / "left.tif", left, from_origin(500000, 5000000, 10, 10))
+    write_raster(tmp_path / "right.tif", right, from_origin(501280, 5000000, 10, 10))
+    return tmp_path
+
+
+def test_cloud_mask_location_is_in_the_granule_of_the_band():
+    location = cloud_mask_location("GRANULE/L1C_T31UDQ_A000000/IMG_DATA/T31UDQ_20250101T103000_B02.jp2")
+    assert location == "GRANULE/L1C_T31UDQ_A000000/QI_DATA/MSK_CLASSI_B00.jp2"
+
+
+def test_fraction_without_masks_counts_pixels_with_data(tiles):
+    assert visible_water_fraction(tiles / "left.tif", grid=16) == 1.0
+    assert visible_water_fraction(tiles / "right.tif", grid=16) == 0.5
+
+
+def test_clouds_and_land_are_not_visible_water(tiles, tmp_path):
+    # 60 m classification mask over both tiles, opaque clouds on the left half of the left tile
+    mask = np.zeros((3, 43, 43), dtype=np.uint8)
+    mask[0, :, :11] = 1
+    cloud_mask = write_raster(tmp_path / "MSK_CLASSI_B00.tif", mask, from_origin(500000, 5000000, 60, 60))
+
+    # Land mask in geographic coordinates covering everything east of the tiles' shared edge
+    with rasterio.open(tiles / "right.tif") as src:
+        from rasterio.warp import transform_bounds
+        west, south, east, north = transform_bounds(src.crs, "EPSG:4326", *src.bounds)
+    land = np.ones((1, 100, 100), dtype=np.uint8)
+    land_mask = write_raster(
+        tmp_path / "land.tif", land, from_origin(west, north + 0.1, 0.01, 0.01), crs="EPSG:4326"
+    )
+
+    assert visible_water_fraction(tiles / "left.tif", cloud_mask, grid=32) == pytest.approx(0.5, abs=0.05)
+    assert visible_water_fraction(tiles / "right.tif", cloud_mask, land_mask, grid=32) == pytest.approx(0, abs=0.05)
+
+    kept = filter_tiles(tiles, ["left", "right"], cloud_mask, land_mask, min_fraction=0.2)
+    assert kept == ["left"]
+
+
+def test_scene_classification_keeps_the_water_class_only(tiles, tmp_path):
+    scl = np.full((1, 64, 128), 4, dtype=np.uint8)
+    scl[0, 32:, :] = SCL_WATER
+    scl_path = write_raster(tmp_path / "T31UDQ_SCL_20m.tif", scl, from_origin(500000, 5000000, 20, 20))
+
+    assert visible_water_fraction(tiles / "left.tif", scl_path, grid=32) == pytest.approx(0.5)
@@ -0,0 +1,84 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from src.routers import metrics
+from src.services.metrics import timed, timed_stage, ROWS
+
+
+def stage_count(stage):
+    return REGISTRY.get_sample_value("pipeline_stage_seconds_count", {"stage": stage}) or 0
+
+
+def test_timed_records_the_stage_even_when_it_fails():
+    before = stage_count("test")
+
+    with timed("test"):
+        pass
+    try:
+        with timed("test"):
+            raise ValueError
+    except ValueError:
+        pass
+
+    assert stage_count("test") == before + 2
+
+
+def test_timed_stage_decorator():
+    @timed_stage("decorated")
+    def work(value):
+        return value * 2
+
+    before = stage_count("decorated")
+    assert work(2) == 4
+    assert stage_count("decorated") == before + 1
+
+
+def test_metrics_endpoint():
+    ROWS.labels("test").inc(3)
+
+    app = FastAPI()
+    app.include_router(metrics.router, prefix="/metrics")
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'pipeline_rows_total{stage="test"}' in response.text
+
+
+def test_worker_metrics_server():
+    import socket
+    import urllib.request
+    from src.services.metrics import start_metrics_server
+
+    assert start_metrics_server(0) is None
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    ROWS.labels("worker").inc()
+    assert start_metrics_server(port) == port
+    body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode()
+    assert 'pipeline_rows_total{stage="worker"}' in body
+
+
+def test_missing_opentelemetry_leaves_the_settings_alone(monkeypatch):
+    import builtins
+    from src.services import metrics as metrics_service
+
+    real_import = builtins.__import__
+
+    def no_opentelemetry(name, *args, **kwargs):
+        if name.startswith("opentelemetry"):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_opentelemetry)
+    monkeypatch.setattr(metrics_service.settings, "OTEL_ENABLED", True)
+    monkeypatch.setattr(metrics_service, "_tracer", None)
+    monkeypatch.setattr(metrics_service, "_tracer_unavailable", False)
+
+    assert metrics_service.get_tracer() is None
+    assert metrics_service.get_tracer() is None
+    assert metrics_service.settings.OTEL_ENABLED
+    assert metrics_service._tracer_unavailable
@@ -0,0 +1,48 @@
+import pytest
+from src.services.db import get_session, init_db
+from src.services.pipeline import run_unit, fan_out, chord
+from src.schemas.data_schema import PipelineUnit
+
+
+@pytest.fixture(autouse=True)
+def setup_db():
+    init_db()
+    yield
+    with next(get_session()) as session:
+        session.query(PipelineUnit).delete()
+        session.commit()
+
+
+def test_run_unit_is_idempotent():
+    calls = []
+
+    def work(value):
+        calls.append(value)
+        return {"value": value}
+
+    assert run_unit("unit:1", "test", work, 1) == {"value": 1}
+    assert run_unit("unit:1", "test", work, 2) == {"value": 1}
+    assert calls == [1]
+
+
+def test_run_unit_retries_failures_until_max_attempts():
+    calls = []
+
+    def work():
+        calls.append(1)
+        raise ValueError("boom")
+
+    for _ in range(5):
+        assert run_unit("unit:failing", "test", work) is None
+
+    with next(get_session()) as session:
+        unit = session.query(PipelineUnit).filter(PipelineUnit.key == "unit:failing").one()
+        assert unit.state == "failed"
+        assert unit.error == "boom"
+
+    assert len(calls) == unit.attempts == 3
+
+
+def test_chord_gathers_results_in_order():
+    assert fan_out(lambda x: x * 2, []) == []
+    assert chord(lambda x: x * 2, [1, 2, 3], sum, workers=2) == 12
@@ -0,0 +1,164 @@
+import pandas as pd
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from src.services.db import get_session, init_db
+from src.services.process import process_pass_candidate, process_vessel_data, process_passes, _mark_passes_clean
+from src.services.tracks import update_tracks
+from src.schemas.data_schema import PipelineUnit, AISData, Track, Vessel, VesselStatus, Watermark
+
+IMOS = (9700201, 9700202)
+START = datetime(2025, 1, 1, 0, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def setup_db():
+    init_db()
+    yield
+    with next(get_session()) as session:
+        session.query(PipelineUnit).delete()
+        session.query(Track).filter(Track.imo.in_(IMOS)).delete()
+        session.query(VesselStatus).filter(VesselStatus.imo.in_(IMOS)).delete()
+        session.query(Vessel).filter(Vessel.imo.in_(IMOS)).delete()
+        session.query(AISData).filter(AISData.imo.in_(IMOS)).delete()
+        session.query(Watermark).delete()
+        session.commit()
+
+
+def square(lon, lat, half=0.5):
+    return [[[(lon - half, lat - half), (lon + half, lat - half), (lon + half, lat + half), (lon - half, lat + half), (lon - half, lat - half)]]]
+
+
+def catalogue(*products):
+    return pd.DataFrame([
+        {"Id": product_id, "Name": f"S2A_MSIL1C_{product_id}", "footprint": footprint, "sensing_start": sensing}
+        for product_id, footprint, sensing in products
+    ])
+
+
+@patch("src.services.process.query_catalogue")
+def test_only_the_closest_product_covering_the_vessel_is_kept(mock_query):
+    mock_query.side_effect = [
+        catalogue(
+            ("far-in-time", square(4, 52), datetime(2025, 1, 1, 22, 0)),
+            ("elsewhere", square(10, 52), datetime(2025, 1, 1, 10, 30)),
+            ("best", square(4, 52), datetime(2025, 1, 1, 10, 31)),
+        ),
+        catalogue(("next-day", square(4, 52), datetime(2025, 1, 2, 10, 30))),
+        pd.DataFrame(),
+    ]
+
+    candidate = {
+        "status_id": 1, "satellite": "SENTINEL-2A", "timestamp": "2025-01-01 10:30:00",
+        "latitude": 52.0, "longitude": 2.5, "vessel_latitude": 52.1, "vessel_longitude": 4.1,
+        "collection_name": "SENTINEL-2", "product_type": "S2MSI1C",
+    }
+    result = process_pass_candidate(candidate)
+
+    assert [(product["id"], product["name"]) for product in result["products"]] == [("best", "S2A_MSIL1C_best")]
+    assert result["products"][0]["footprint"].startswith("MULTIPOLYGON (((3.5 51.5, 4.5 51.5")
+    # The area of interest is centred on the vessel, not on the sub-satellite point
+    assert mock_query.call_args.kwargs["aoi"].startswith("POLYGON((3.95")
+
+
+def report(imo, hours, latitude, longitude=2.0):
+    """Store an AIS row and turn it into vessel statuses"""
+    with next(get_session()) as session:
+        session.add(AISData(
+            mmsi=str(imo), timestamp=(START + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S"),
+            latitude=latitude, longitude=longitude, cog=0.0, sog=10.0, imo=imo, name="DIRTY", a=100, b=20, c=10, d=10
+        ))
+        session.commit()
+    process_vessel_data()
+
+
+@patch("src.services.process.query_catalogue")
+def test_the_vessel_track_replaces_the_dead_reckoned_position(mock_query):
+    mock_query.return_value = pd.DataFrame()
+    report(IMOS[0], 0, 51.0)
+    report(IMOS[0], 2, 53.0)
+    update_tracks()
+
+    candidate = {
+        "status_id": 1, "imo": IMOS[0], "satellite": "SENTINEL-2A", "timestamp": "2025-01-01 01:00:00",
+        "latitude": 52.0, "longitude": 2.5, "vessel_latitude": 55.0, "vessel_longitude": 4.0,
+        "collection_name": "SENTINEL-2", "product_type": "S2MSI1C",
+    }
+    process_pass_candidate(candidate)
+    # Halfway along the track, 10 km west of the vessel
+    assert mock_query.call_args.kwargs["aoi"].startswith("POLYGON((1.85")
+
+    # A pass after the end of the track keeps the dead reckoned position
+    process_pass_candidate({**candidate, "status_id": 2, "timestamp": "2025-01-01 03:00:00"})
+    assert mock_query.call_args.kwargs["aoi"].startswith("POLYGON((3.84")
+
+
+def vessel_state(imo):
+    with next(get_session()) as session:
+        vessel = session.get(Vessel, imo)
+        status = session.get(VesselStatus, vessel.latest_status_id)
+        return vessel.passes_dirty, status.id, status.latitude
+
+
+def test_vessels_get_dirty_when_they_move_or_their_passes_age():
+    report(IMOS[0], 0, 51.0)
+    dirty, status_id, _ = vessel_state(IMOS[0])
+    assert dirty
+
+    _mark_passes_clean([status_id])
+    assert not vessel_state(IMOS[0])[0]
+
+    # Moved about 1 km, below PASS_RECOMPUTE_DISTANCE_KM
+    report(IMOS[0], 1, 51.01)
+    dirty, moved_id, latitude = vessel_state(IMOS[0])
+    assert not dirty and moved_id != status_id and latitude == 51.01
+
+    # An older report doesn't replace the latest status
+    report(IMOS[0], 0.5, 52.0)
+    assert vessel_state(IMOS[0])[1:] == (moved_id, 51.01)
+
+    # Moved about 11 km
+    report(IMOS[0], 2, 51.1)
+    assert vessel_state(IMOS[0])[0]
+
+    # Passes computed for that position get older than PASS_RECOMPUTE_MAX_AGE_HOURS
+    _mark_passes_clean([vessel_state(IMOS[0])[1]])
+    report(IMOS[0], 15, 51.1)
+    assert vessel_state(IMOS[0])[0]
+
+
+def predictions(imos):
+    with next(get_session()) as session:
+        vessels = [session.get(Vessel, imo) for imo in imos]
+        return {vessel.imo: {"status_id": vessel.latest_status_id, "candidates": [{
+            "status_id": vessel.latest_status_id, "imo": vessel.imo, "satellite": "SENTINEL-2A", "timestamp": "2025-01-01 10:30:00",
+        }]} for vessel in vessels}
+
+
+@patch("src.services.process.predict_candidates", side_effect=predictions)
+@patch("src.services.process.process_pass_candidate")
+def test_failed_vessels_stay_dirty(mock_candidate, mock_predict):
+    for imo in IMOS:
+        report(imo, 0, 51.0)
+
+    mock_candidate.side_effect = lambda candidate: {"products": []} if candidate["imo"] == IMOS[0] else None
+    process_passes()
+
+    assert not vessel_state(IMOS[0])[0]
+    assert vessel_state(IMOS[1])[0]
+
+
+@patch("src.services.process.predict_candidates", side_effect=predictions)
+@patch("src.services.process.process_pass_candidate")
+def test_a_move_during_the_cycle_keeps_the_vessel_dirty(mock_candidate, mock_predict):
+    report(IMOS[0], 0, 51.0)
+
+    def move(candidate):
+        report(IMOS[0], 1, 51.2)
+        return {"products": []}
+
+    mock_candidate.side_effect = move
+    process_passes()
+
+    dirty, _, latitude = vessel_state(IMOS[0])
+    assert dirty and latitude == 51.2
@@ -0,0 +1,87 @@
+import tracemalloc
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from src.services.raster import SceneTiler, read_tile, composite_rgb
+from src.services.inference import create_cropped_patches, generate_composite_image
+
+
+@pytest.fixture
+def bands(tmp_path):
+    paths = []
+    for offset, band in enumerate(("B02", "B03", "B04")):
+        path = tmp_path / f"scene_{band}.tif"
+        data = (np.arange(250 * 300, dtype=np.uint16).reshape(250, 300) + offset * 1000)
+        with rasterio.open(
+            path, "w", driver="GTiff", width=300, height=250, count=1, dtype="uint16", crs="EPSG:32631",
+            transform=from_origin(500000, 5000000, 10, 10), tiled=True, blockxsize=64, blockysize=64
+        ) as dst:
+            dst.write(data, 1)
+        paths.append(path)
+    return paths
+
+
+def test_tiles_hold_every_band_and_are_padded_on_the_edges(bands):
+    with rasterio.open(bands[1]) as src:
+        green = src.read(1)
+
+    with SceneTiler(bands, (128, 128)) as scene:
+        tiles = {(y, x): (tile.copy(), transform) for y, x, tile, transform in scene.tiles()}
+
+    assert sorted(tiles) == [(y, x) for y in (0, 128) for x in (0, 128, 256)]
+
+    tile, transform = tiles[(128, 256)]
+    assert tile.shape == (3, 128, 128)
+    assert np.array_equal(tile[1, :122, :44], green[128:, 256:])
+    assert not tile[:, 122:, :].any() and not tile[:, :, 44:].any()
+    assert transform.c == 500000 + 256 * 10
+
+
+def test_each_strip_is_decoded_once(bands):
+    with SceneTiler(bands, (128, 128), step_size=(64, 64)) as scene:
+        for _ in scene.tiles():
+            pass
+        # 2 strips of 128 rows per band, read again for the overlapping rows only while cached
+        assert scene.cache.misses == 3 * 2
+
+
+def test_patches_are_multi_band_tiles(bands, tmp_path):
+    patches = create_cropped_patches(bands, (128, 128), tmp_path / "patches", "scene", (128, 128))
+    assert len(patches) == 6
+
+    tile = read_tile(tmp_path / "patches" / f"{patches[0]}.tif")
+    assert tile.shape == (3, 128, 128)
+
+    rgb_path = generate_composite_image(tmp_path / "patches", tmp_path, patches[0])
+    assert rgb_path.exists()
+
+
+def test_composite_matches_the_reference_scaling():
+    rng = np.random.default_rng(0)
+    red, green, blue = rng.integers(0, 10000, (3, 300, 200), dtype=np.uint16)
+
+    rgb = composite_rgb(red, green, blue, gain=2, block_rows=64)
+
+    reference = (np.dstack([np.clip(band * 2 / 10000, 0, 1) for band in (red, green, blue)]) * 255).astype(np.uint8)
+    assert rgb.dtype == np.uint8 and rgb.shape == (300, 200, 3)
+    assert np.abs(rgb.astype(int) - reference).max() <= 1
+
+
+def test_composite_stretch_spans_the_8_bit_range():
+    band = np.linspace(1000, 2000, 100 * 100).reshape(100, 100).astype(np.uint16)
+
+    rgb = composite_rgb(band, band, band, stretch=(0, 100))
+
+    assert rgb.min() == 0 and rgb.max() >= 254
+
+
+def test_composite_peak_memory_stays_near_the_output_size():
+    red, green, blue = np.full((3, 2048, 2048), 3000, dtype=np.uint16)
+
+    tracemalloc.start()
+    rgb = composite_rgb(red, green, blue)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < 1.5 * rgb.nbytes
@@ -0,0 +1,109 @@
+import pytest
+from datetime import datetime, timedelta
+from src.config.settings import get_settings
+from src.services.db import get_session, init_db
+from src.services.pipeline import set_watermark
+from src.services.process import VESSELS_WATERMARK, process_vessel_data
+from src.services.retention import archive_ais_data, downsample_statuses, read_archive, write_archive
+from src.schemas.data_schema import AISData, Vessel, VesselStatus, SatPass, Watermark
+
+settings = get_settings()
+NOW = datetime(2025, 3, 1, 12, 0, 0)
+IMO = 9700001
+
+
+@pytest.fixture(autouse=True)
+def setup_db(tmp_path, monkeypatch):
+    init_db()
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    yield
+    with next(get_session()) as session:
+        session.query(SatPass).filter(SatPass.satellite == "RETENTION").delete()
+        session.query(VesselStatus).filter(VesselStatus.imo == IMO).delete()
+        session.query(Vessel).filter(Vessel.imo == IMO).delete()
+        session.query(AISData).filter(AISData.imo == IMO).delete()
+        session.query(Watermark).delete()
+        session.commit()
+
+
+def ais_row(timestamp):
+    return AISData(
+        mmsi="970000001", timestamp=timestamp.strftime("%Y-%m-%d %H:%M:%S"), latitude=51.0, longitude=2.0,
+        cog=90.0, sog=10.0, imo=IMO, name="RETENTION", a=100, b=20, c=10, d=10
+    )
+
+
+def test_only_processed_rows_past_the_cutoff_are_archived():
+    with next(get_session()) as session:
+        rows = [ais_row(NOW - timedelta(days=days)) for days in (10, 9, 8, 1)]
+        session.add_all(rows)
+        session.commit()
+        ids = [row.id for row in rows]
+
+        # The row of 8 days ago was not processed yet
+        set_watermark(session, VESSELS_WATERMARK, ids[1])
+        session.commit()
+
+    assert archive_ais_data(NOW - timedelta(days=7), batch_size=1) == 2
+
+    with next(get_session()) as session:
+        remaining = [row_id for row_id, in session.query(AISData.id).filter(AISData.imo == IMO).order_by(AISData.id)]
+    assert remaining == ids[2:]
+
+    archived = read_archive("aisdata")
+    assert sorted(archived["id"]) == ids[:2]
+    assert len(read_archive("aisdata", start=NOW - timedelta(days=9))) == 1
+
+
+def test_statuses_are_downsampled_to_one_per_period():
+    start = NOW - timedelta(days=10)
+    with next(get_session()) as session:
+        session.add(Vessel(imo=IMO, mmsi="970000001"))
+        statuses = [
+            VesselStatus(imo=IMO, freshness=(start + timedelta(minutes=10 * i)).strftime("%Y-%m-%d %H:%M:%S"), latitude=51.0, longitude=2.0)
+            for i in range(18)
+        ]
+        session.add_all(statuses)
+        session.commit()
+
+        # A pass refers to the second status of the first hour
+        session.add(SatPass(satellite="RETENTION", timestamp="2025-02-19 12:10:00", latitude=51.0, longitude=2.0, status_id=statuses[1].id))
+        session.commit()
+        ids = [status.id for status in statuses]
+
+    assert downsample_statuses(NOW - timedelta(days=7), minutes=60) == 18 - 3 - 1
+    assert downsample_statuses(NOW - timedelta(days=7), minutes=60) == 0
+
+    with next(get_session()) as session:
+        kept = [status_id for status_id, in session.query(VesselStatus.id).filter(VesselStatus.imo == IMO).order_by(VesselStatus.id)]
+    assert kept == [ids[0], ids[1], ids[6], ids[12]]
+    assert len(read_archive("vesselstatus")) == 14
+
+
+def test_process_vessel_data_reads_new_rows_only():
+    with next(get_session()) as session:
+        session.add(ais_row(NOW))
+        session.commit()
+
+    process_vessel_data()
+
+    with next(get_session()) as session:
+        first = session.get(Watermark, VESSELS_WATERMARK).value
+        session.add(ais_row(NOW + timedelta(minutes=5)))
+        session.commit()
+
+    process_vessel_data()
+
+    with next(get_session()) as session:
+        assert session.get(Watermark, VESSELS_WATERMARK).value > first
+        assert session.query(VesselStatus).filter(VesselStatus.imo == IMO).count() == 2
+
+
+def test_batches_with_null_columns_read_back_together():
+    day = NOW.strftime("%Y-%m-%d %H:%M:%S")
+    write_archive("aisdata", [{"id": 1, "mmsi": "970000001", "timestamp": day, "name": None, "heading": None}])
+    write_archive("aisdata", [{"id": 2, "mmsi": "970000001", "timestamp": day, "name": "X", "heading": 90.0}])
+
+    archived = read_archive("aisdata").sort_values("id")
+    assert archived["name"].isna().tolist() == [True, False] and archived["name"].iloc[1] == "X"
+    assert archived["heading"].iloc[1] == 90.0
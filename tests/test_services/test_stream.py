@@ -0,0 +1,104 @@
+import socket
+import threading
+import pytest
+from datetime import datetime
+from src.services.db import get_session, init_db
+from src.schemas.data_schema import AISData, Vessel, VesselStatus, Watermark
+from src.services.stream import AISStreamBuffer, decode_lines, run_stream
+
+pytest.importorskip("pyais")
+from pyais import encode_dict
+
+IMOS = (9700101, 9700102)
+RECEIVED = datetime(2025, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def setup_db():
+    init_db()
+    yield
+    with next(get_session()) as session:
+        session.query(VesselStatus).filter(VesselStatus.imo.in_(IMOS)).delete()
+        session.query(Vessel).filter(Vessel.imo.in_(IMOS)).delete()
+        session.query(AISData).filter(AISData.mmsi.like("2110000%")).delete(synchronize_session=False)
+        session.query(Watermark).delete()
+        session.commit()
+
+
+def static(mmsi, imo):
+    return encode_dict({
+        "type": 5, "mmsi": mmsi, "imo": imo, "shipname": f"STREAM {mmsi}", "callsign": "AB", "ship_type": 70,
+        "to_bow": 100, "to_stern": 20, "to_port": 10, "to_starboard": 10, "draught": 7.5, "destination": "ROTTERDAM",
+    })
+
+
+def position(mmsi, lat, lon, msg_type=1):
+    return encode_dict({"type": msg_type, "mmsi": mmsi, "lat": lat, "lon": lon, "course": 90.0, "speed": 10.0, "heading": 90, "status": 0})
+
+
+def decoded(*sentences):
+    return list(decode_lines([line.encode() for sentence in sentences for line in sentence]))
+
+
+def test_positions_wait_for_the_static_data_and_are_coalesced():
+    buffer = AISStreamBuffer(batch_size=2, flush_seconds=60)
+
+    for message in decoded(position(211000001, 51.0, 2.0), position(211000001, 51.1, 2.1)):
+        buffer.add(message, RECEIVED)
+    assert not buffer.due()
+
+    # The type 5 message is split over two sentences
+    for message in decoded(static(211000001, IMOS[0]), position(211000001, 51.2, 2.2)):
+        buffer.add(message, RECEIVED)
+
+    rows = buffer.drain()
+    assert len(rows) == 1
+    assert rows[0]["imo"] == IMOS[0] and rows[0]["latitude"] == pytest.approx(51.2) and rows[0]["a"] == 100
+    assert rows[0]["navstat"] == 0 and rows[0]["timestamp"] == "2025-01-01 12:00:00"
+
+    for message in decoded(static(211000002, IMOS[1]), position(211000002, 52.0, 3.0, msg_type=18), position(211000001, 51.3, 2.3)):
+        buffer.add(message, RECEIVED)
+    assert buffer.due()
+    assert {row["imo"] for row in buffer.drain()} == set(IMOS)
+
+
+def test_replayed_stream_updates_the_vessel_statuses():
+    sentences = [
+        static(211000001, IMOS[0]), static(211000002, IMOS[1]),
+        position(211000001, 51.0, 2.0), position(211000002, 52.0, 3.0),
+        ["!AIVDM,1,1,,A,not a sentence,0*00"],
+        position(211000003, 53.0, 4.0), # No static data, never written
+        position(211000001, 51.1, 2.1),
+    ]
+    payload = "".join(f"{line}\r\n" for sentence in sentences for line in sentence).encode()
+
+    # Local replay server sending the capture in small chunks, then closing the connection
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+
+    def replay():
+        connection, _ = server.accept()
+        with connection:
+            for start in range(0, len(payload), 37):
+                connection.sendall(payload[start:start + 37])
+        server.close()
+
+    thread = threading.Thread(target=replay)
+    thread.start()
+    written = run_stream(f"tcp://127.0.0.1:{port}", reconnect=False, buffer=AISStreamBuffer(batch_size=2, flush_seconds=60))
+    thread.join()
+
+    assert written == 3
+    with next(get_session()) as session:
+        assert session.query(AISData).filter(AISData.mmsi.like("2110000%")).count() == 3
+
+        latest = (
+            session.query(VesselStatus)
+            .join(Vessel, Vessel.latest_status_id == VesselStatus.id)
+            .filter(Vessel.imo == IMOS[0])
+            .one()
+        )
+        # The last report was received within the same second as the first one, it is stored but
+        # does not replace the status
+        assert latest.latitude == pytest.approx(51.0)
+        assert session.get(Vessel, IMOS[1]).vessel_name == "STREAM 211000002"
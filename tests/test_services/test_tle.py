@@ -0,0 +1,93 @@
+import json
+import pytest
+from datetime import datetime
+from src.services.db import get_session, init_db
+from src.schemas.data_schema import TLE, Satellite
+from src.services.tle import tle_epoch, read_catalogue, import_catalogue
+
+ISS_LINE1 = "1 25544U 98067A   08264.51782528 -.00002182  00000-0 -11606-4 0  2927"
+ISS_LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563537"
+
+ISS_OMM = {
+    "OBJECT_NAME": "ISS (ZARYA)",
+    "OBJECT_ID": "1998-067A",
+    "EPOCH": "2008-09-20T12:25:40.104192",
+    "MEAN_MOTION": 15.72125391,
+    "ECCENTRICITY": 0.0006703,
+    "INCLINATION": 51.6416,
+    "RA_OF_ASC_NODE": 247.4627,
+    "ARG_OF_PERICENTER": 130.536,
+    "MEAN_ANOMALY": 325.0288,
+    "EPHEMERIS_TYPE": 0,
+    "CLASSIFICATION_TYPE": "U",
+    "NORAD_CAT_ID": 25544,
+    "ELEMENT_SET_NO": 292,
+    "REV_AT_EPOCH": 56353,
+    "BSTAR": -1.1606e-05,
+    "MEAN_MOTION_DOT": -2.182e-05,
+    "MEAN_MOTION_DDOT": 0,
+}
+
+
+@pytest.fixture
+def db():
+    init_db()
+    yield
+    with next(get_session()) as session:
+        session.query(TLE).delete()
+        session.query(Satellite).delete()
+        session.commit()
+
+
+def test_tle_epoch():
+    assert tle_epoch(ISS_LINE1) == datetime(2008, 9, 20, 12, 25, 40, 104192)
+
+
+def test_read_3le_drops_bad_checksums(tmp_path):
+    broken = ISS_LINE2[:-1] + "0"
+    path = tmp_path / "catalogue.txt"
+    path.write_text(f"0 ISS (ZARYA)\n{ISS_LINE1}\n{ISS_LINE2}\n\nBROKEN\n{ISS_LINE1}\n{broken}\n")
+
+    tles = read_catalogue(path)
+
+    assert tles["name"].tolist() == ["ISS (ZARYA)"]
+    assert tles["norad_id"].tolist() == [25544]
+
+
+def test_read_omm_json_matches_tle(tmp_path):
+    path = tmp_path / "catalogue.json"
+    path.write_text(json.dumps([ISS_OMM]))
+
+    tles = read_catalogue(path)
+
+    assert tles["line1"].tolist() == [ISS_LINE1]
+    assert tles["line2"].tolist() == [ISS_LINE2]
+
+
+def test_import_skips_unchanged_epochs(tmp_path, db):
+    path = tmp_path / "catalogue.tle"
+    path.write_text(f"{ISS_LINE1}\n{ISS_LINE2}\n")
+
+    assert import_catalogue(path) == {"read": 1, "satellites": 1, "inserted": 1, "skipped": 0}
+    assert import_catalogue(path) == {"read": 1, "satellites": 0, "inserted": 0, "skipped": 1}
+
+    with next(get_session()) as session:
+        assert session.get(Satellite, 25544).name == "25544"
+        assert session.query(TLE).count() == 1
+
+
+def test_fetch_tles_records_unchanged_checks(db, monkeypatch):
+    from src.services import ingestion
+
+    with next(get_session()) as session:
+        session.add(Satellite(id=25544, name="ISS", orbit=[]))
+        session.add(TLE(satellite_id="25544", line1=ISS_LINE1, line2=ISS_LINE2, created_at=str(datetime(2008, 9, 20))))
+        session.commit()
+
+    fetched = []
+    monkeypatch.setattr(ingestion, "_fetch_tle", lambda satellite_id, limiter: fetched.append(satellite_id) or (ISS_LINE1, ISS_LINE2))
+
+    assert ingestion.fetch_tles() == 0
+    # The element set was unchanged, the satellite is not fetched again before TLE_MAX_AGE_HOURS
+    assert ingestion.fetch_tles() == 0
+    assert fetched == [25544]
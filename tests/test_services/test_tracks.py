@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from src.services.calculations import distance_km
+from src.services.tracks import compress_track, encode_track, decode_track, extend_track, interpolate_track
+
+
+@pytest.fixture
+def voyage():
+    # A fix every minute for a day, turning and changing speed, with GPS noise
+    rng = np.random.default_rng(0)
+    times = 1735689600 + np.arange(0, 86400, 60)
+    heading = np.radians(np.cumsum(rng.normal(0, 2, len(times))))
+    speed = 0.003 + 0.002 * np.sin(np.arange(len(times)) / 200)
+    lats = 50 + np.cumsum(speed * np.cos(heading)) + rng.normal(0, 1e-5, len(times))
+    lons = 2 + np.cumsum(speed * np.sin(heading)) + rng.normal(0, 1e-5, len(times))
+    return times, lats, lons
+
+
+def test_dropped_fixes_stay_within_the_tolerance(voyage):
+    times, lats, lons = voyage
+    kept = compress_track(times, lats, lons, tolerance_m=50)
+
+    assert kept[0] == 0 and kept[-1] == len(times) - 1
+    assert len(kept) < len(times) / 4
+
+    lat, lon = interpolate_track(times[kept], lats[kept], lons[kept], times)
+    assert distance_km(lats, lons, lat, lon).max() <= 0.05
+
+
+def test_encoding_round_trips_to_a_meter(voyage):
+    times, lats, lons = voyage
+    data = encode_track(times, lats, lons)
+
+    decoded = decode_track(data)
+    assert np.array_equal(decoded[0], times)
+    assert np.abs(decoded[1] - lats).max() <= 0.5e-5 and np.abs(decoded[2] - lons).max() <= 0.5e-5
+    assert len(data) < len(times) * 8
+
+
+def test_extending_keeps_the_stored_points(voyage):
+    times, lats, lons = voyage
+    half = len(times) // 2
+
+    stored = extend_track(None, times[:half], lats[:half], lons[:half], tolerance_m=50)
+    extended = extend_track(stored, times[half:], lats[half:], lons[half:], tolerance_m=50)
+
+    assert np.array_equal(extended[0][:len(stored[0])], stored[0])
+    assert extended[0][-1] == times[-1]
+
+    lat, lon = interpolate_track(*extended, times)
+    assert distance_km(lats, lons, lat, lon).max() <= 0.05
+
+
+def test_interpolation_across_the_antimeridian():
+    lat, lon = interpolate_track(np.array([0, 100]), np.array([10.0, 12.0]), np.array([179.0, -179.0]), [50, 200])
+
+    assert lat[0] == pytest.approx(11) and abs(lon[0]) == pytest.approx(180)
+    assert np.isnan(lat[1]) and np.isnan(lon[1])
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# The worker and ML stack, the API process must not import any of it
+HEAVY_MODULES = ("ultralytics", "torch", "matplotlib", "rasterio", "pandas", "beyond", "celery", "apscheduler", "pyarrow")
+
+# Seconds allowed to import the API, most of it goes to fastapi and sqlmodel
+API_IMPORT_BUDGET_SECONDS = 2.0
+
+
+def import_in_subprocess(module):
+    code = (
+        "import sys, time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - start); print(','.join(sorted(sys.modules)))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=os.environ, capture_output=True, text=True, check=True)
+    seconds, modules = result.stdout.strip().splitlines()[-2:]
+    return float(seconds), set(modules.split(","))
+
+
+def test_api_does_not_import_the_ml_stack():
+    _, modules = import_in_subprocess("main")
+    assert not {module for module in HEAVY_MODULES if module in modules}
+
+
+def test_api_import_time_budget():
+    seconds, _ = import_in_subprocess("main")
+    assert seconds < API_IMPORT_BUDGET_SECONDS
+
+
+def test_inference_loads_the_model_lazily():
+    _, modules = import_in_subprocess("src.services.process")
+    assert "ultralytics" not in modules
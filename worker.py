@@ -0,0 +1,57 @@
+from apscheduler.schedulers.blocking import BlockingScheduler
+from src.services.db import init_db
+from src.config.settings import get_settings
+from src.services.metrics import start_metrics_server
+from src.logger import configure_logging
+from datetime import datetime, timedelta
+
+
+def create_scheduler(scheduler_class=BlockingScheduler):
+    '''
+    Create the scheduler running the ingestion and processing jobs
+
+    The jobs pull in the ML stack (ultralytics/torch, rasterio, pandas), so they are only
+    imported here and the API process stays light.
+
+    Args:
+        scheduler_class (type): APScheduler scheduler class, BackgroundScheduler to run inside the API
+
+    Returns:
+        BaseScheduler: Scheduler with the jobs added, not started
+    '''
+    from src.services.process import process_vessel_data, process_passes
+    from src.services.ingestion import ingest_AIS_data, fetch_tles
+    from src.services.retention import run_retention
+    from src.services.tracks import update_tracks
+
+    settings = get_settings()
+    scheduler = scheduler_class()
+    # Schedule the job
+    if settings.AIS_STREAM_URL:
+        # The stream runs for the life of the worker and updates the vessel statuses after each flush
+        from src.services.stream import run_stream
+        scheduler.add_job(run_stream, next_run_time=datetime.now())
+    else:
+        scheduler.add_job(ingest_AIS_data, "interval", minutes=30, next_run_time=datetime.now()) # This looks fine 
+        scheduler.add_job(process_vessel_data, "interval", minutes=30, next_run_time=datetime.now() + timedelta(minutes=2)) # This looks fine
+    scheduler.add_job(update_tracks, "interval", minutes=30, next_run_time=datetime.now() + timedelta(minutes=3))
+    scheduler.add_job(process_passes, "interval", minutes=30, next_run_time=datetime.now() + timedelta(minutes=4)) # TODO The code for this from the eofusion repo looks odd with typos and missing code
+    scheduler.add_job(fetch_tles, "interval", days=1, next_run_time=datetime.now()) # This one looks fine 
+    scheduler.add_job(run_retention, "interval", days=1, next_run_time=datetime.now() + timedelta(minutes=10))
+
+    return scheduler
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+    configure_logging(
+        level=settings.LOG_LEVEL,
+        json_format=settings.LOG_JSON,
+        use_queue=settings.LOG_QUEUE,
+        sample_rate=settings.LOG_CALL_SAMPLE_RATE,
+        max_arg_length=settings.LOG_MAX_ARG_LENGTH
+    )
+
+    init_db()
+    start_metrics_server()
+    create_scheduler().start()